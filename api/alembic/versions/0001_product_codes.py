@@ -0,0 +1,113 @@
+"""Tabela product_codes com os códigos OEM explodidos e indexados
+
+Revision ID: 0001_product_codes
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0001_product_codes"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Mesma função de scripts/init-db.sql (espelha app/utils/text.normalize_code)
+    op.execute(r"""
+        CREATE OR REPLACE FUNCTION normalize_code(input_code TEXT)
+        RETURNS TEXT AS $$
+        BEGIN
+            RETURN REGEXP_REPLACE(UPPER(COALESCE(input_code, '')), '[-\s\.]', '', 'g');
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE
+    """)
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS product_codes (
+            id BIGSERIAL PRIMARY KEY,
+            product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+            code TEXT NOT NULL,
+            code_type VARCHAR(10) NOT NULL DEFAULT 'OEM',
+            normalized_code TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            UNIQUE (product_id, position)
+        )
+    """)
+
+    # B-tree com text_pattern_ops atende "=" e "LIKE 'X%'" independente da collation;
+    # o GIN de trigramas atende os "LIKE '%X%'".
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_product_codes_normalized_code
+        ON product_codes (normalized_code text_pattern_ops)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_product_codes_normalized_code_trgm
+        ON product_codes USING gin (normalized_code gin_trgm_ops)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_product_codes_product_id
+        ON product_codes (product_id)
+    """)
+
+    # SKU normalizado participa da mesma busca por código
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_products_sku_normalized
+        ON products (normalize_code(sku) text_pattern_ops)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_products_sku_normalized_trgm
+        ON products USING gin (normalize_code(sku) gin_trgm_ops)
+    """)
+
+    # Mantém product_codes em sincronia com products.original_codes
+    op.execute("""
+        CREATE OR REPLACE FUNCTION sync_product_codes()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW.original_codes IS NOT DISTINCT FROM OLD.original_codes THEN
+                RETURN NULL;
+            END IF;
+
+            DELETE FROM product_codes WHERE product_id = NEW.id;
+
+            INSERT INTO product_codes (product_id, code, code_type, normalized_code, position)
+            SELECT NEW.id, btrim(c.code), 'OEM', normalize_code(btrim(c.code)), c.position
+            FROM regexp_split_to_table(COALESCE(NEW.original_codes, ''), ' / ')
+                 WITH ORDINALITY AS c(code, position)
+            WHERE btrim(c.code) <> '';
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("DROP TRIGGER IF EXISTS trg_products_sync_codes ON products")
+    op.execute("""
+        CREATE TRIGGER trg_products_sync_codes
+        AFTER INSERT OR UPDATE OF original_codes ON products
+        FOR EACH ROW EXECUTE FUNCTION sync_product_codes()
+    """)
+
+    # Backfill dos produtos existentes
+    op.execute("""
+        INSERT INTO product_codes (product_id, code, code_type, normalized_code, position)
+        SELECT p.id, btrim(c.code), 'OEM', normalize_code(btrim(c.code)), c.position
+        FROM products p
+        CROSS JOIN LATERAL regexp_split_to_table(p.original_codes, ' / ')
+             WITH ORDINALITY AS c(code, position)
+        WHERE p.original_codes IS NOT NULL
+          AND btrim(c.code) <> ''
+        ON CONFLICT (product_id, position) DO NOTHING
+    """)
+    op.execute("ANALYZE product_codes")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_products_sync_codes ON products")
+    op.execute("DROP FUNCTION IF EXISTS sync_product_codes()")
+    op.execute("DROP INDEX IF EXISTS ix_products_sku_normalized_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_products_sku_normalized")
+    op.execute("DROP TABLE IF EXISTS product_codes")
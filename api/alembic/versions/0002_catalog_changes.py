@@ -0,0 +1,66 @@
+"""Contador de alterações do catálogo (catalog_changes)
+
+Revision ID: 0002_catalog_changes
+Revises: 0001_product_codes
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0002_catalog_changes"
+down_revision = "0001_product_codes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Log append-only: MAX(seq) é a versão do catálogo e
+    # "seq > versão_anterior" diz quais produtos mudaram desde então.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_changes (
+            seq BIGSERIAL PRIMARY KEY,
+            product_id INTEGER NOT NULL,
+            changed_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+    """)
+
+    # Triggers por statement com transition tables: um UPDATE em massa
+    # (importação de preços, reset) vira um único INSERT ... SELECT.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION log_catalog_changes()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO catalog_changes (product_id) SELECT id FROM old_rows;
+            ELSE
+                INSERT INTO catalog_changes (product_id) SELECT id FROM new_rows;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_products_catalog_insert
+        AFTER INSERT ON products
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION log_catalog_changes()
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_products_catalog_update
+        AFTER UPDATE ON products
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION log_catalog_changes()
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_products_catalog_delete
+        AFTER DELETE ON products
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION log_catalog_changes()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_products_catalog_delete ON products")
+    op.execute("DROP TRIGGER IF EXISTS trg_products_catalog_update ON products")
+    op.execute("DROP TRIGGER IF EXISTS trg_products_catalog_insert ON products")
+    op.execute("DROP FUNCTION IF EXISTS log_catalog_changes()")
+    op.execute("DROP TABLE IF EXISTS catalog_changes")
@@ -0,0 +1,50 @@
+"""Busca textual: coluna gerada search_vector (portuguese + unaccent) com GIN
+
+Revision ID: 0003_products_search_vector
+Revises: 0002_catalog_changes
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0003_products_search_vector"
+down_revision = "0002_catalog_changes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+
+    # unaccent() não é IMMUTABLE e não pode entrar numa coluna gerada; como
+    # dicionário de uma configuração de text search ele pode.
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'portuguese_unaccent') THEN
+                CREATE TEXT SEARCH CONFIGURATION portuguese_unaccent (COPY = portuguese);
+                ALTER TEXT SEARCH CONFIGURATION portuguese_unaccent
+                    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+            END IF;
+        END
+        $$
+    """)
+
+    # Peso A = título, B = marca/categoria, C = descrição
+    op.execute("""
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('portuguese_unaccent', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('portuguese_unaccent', coalesce(brand, '') || ' ' || coalesce(category, '')), 'B') ||
+            setweight(to_tsvector('portuguese_unaccent', coalesce(description, '')), 'C')
+        ) STORED
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_products_search_vector
+        ON products USING gin (search_vector)
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_products_search_vector")
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS search_vector")
+    op.execute("DROP TEXT SEARCH CONFIGURATION IF EXISTS portuguese_unaccent")
@@ -0,0 +1,53 @@
+"""Busca por trechos: title_norm/description_norm com índices de trigramas
+
+Revision ID: 0004_products_trigram_norm
+Revises: 0003_products_search_vector
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0004_products_trigram_norm"
+down_revision = "0003_products_search_vector"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+
+    # Espelha app/utils/text.normalize_text (minúsculas, sem acentos). O
+    # dicionário é passado explicitamente para a função poder ser IMMUTABLE.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION normalize_text(input_text TEXT)
+        RETURNS TEXT AS $$
+            SELECT lower(public.unaccent('public.unaccent'::regdictionary, COALESCE(input_text, '')))
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    """)
+
+    op.execute("""
+        ALTER TABLE products
+            ADD COLUMN IF NOT EXISTS title_norm TEXT GENERATED ALWAYS AS (normalize_text(title)) STORED,
+            ADD COLUMN IF NOT EXISTS description_norm TEXT GENERATED ALWAYS AS (normalize_text(description)) STORED
+    """)
+
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_products_title_norm_trgm
+        ON products USING gin (title_norm gin_trgm_ops)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_products_description_norm_trgm
+        ON products USING gin (description_norm gin_trgm_ops)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_products_brand_norm_trgm
+        ON products USING gin (normalize_text(brand) gin_trgm_ops)
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_products_brand_norm_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_products_description_norm_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_products_title_norm_trgm")
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS description_norm, DROP COLUMN IF EXISTS title_norm")
+    op.execute("DROP FUNCTION IF EXISTS normalize_text(TEXT)")
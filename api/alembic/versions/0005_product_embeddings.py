@@ -0,0 +1,40 @@
+"""Embeddings de produtos (pgvector) com índice HNSW
+
+Revision ID: 0005_product_embeddings
+Revises: 0004_products_trigram_norm
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+from app.core.config import settings
+
+revision = "0005_product_embeddings"
+down_revision = "0004_products_trigram_norm"
+branch_labels = None
+depends_on = None
+
+# Lido da configuração: o modelo e o encoder usam o mesmo valor
+EMBEDDING_DIM = settings.embedding_dim
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+
+    # Tabela à parte: atualizar embeddings não dispara os triggers de
+    # catalog_changes nem aumenta as linhas de products
+    op.execute(f"""
+        CREATE TABLE IF NOT EXISTS product_embeddings (
+            product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+            embedding vector({EMBEDDING_DIM}) NOT NULL,
+            content_hash TEXT NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_product_embeddings_hnsw
+        ON product_embeddings USING hnsw (embedding vector_cosine_ops)
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS product_embeddings")
@@ -0,0 +1,34 @@
+"""Características de imagens (pHash, dHash, descritor) para busca por imagem
+
+Revision ID: 0006_image_features
+Revises: 0005_product_embeddings
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0006_image_features"
+down_revision = "0005_product_embeddings"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # source = caminho em uploads/ ou URL de products.image_urls; os hashes
+    # de 64 bits são gravados como BIGINT (com sinal)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS image_features (
+            id BIGSERIAL PRIMARY KEY,
+            source TEXT NOT NULL UNIQUE,
+            product_id INTEGER REFERENCES products(id) ON DELETE CASCADE,
+            phash BIGINT NOT NULL,
+            dhash BIGINT NOT NULL,
+            descriptor REAL[] NOT NULL,
+            content_hash TEXT NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_image_features_product_id ON image_features (product_id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS image_features")
@@ -0,0 +1,100 @@
+"""Documento JSON pronto do produto (product_doc)
+
+Revision ID: 0007_product_doc
+Revises: 0006_image_features
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0007_product_doc"
+down_revision = "0006_image_features"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Espelha app/utils/images.parse_image_urls: array JSON ou lista separada
+    # por vírgula (aspas e %22/%27 removidos); JSON inválido cai na vírgula.
+    op.execute(r"""
+        CREATE OR REPLACE FUNCTION parse_image_urls(input_text TEXT)
+        RETURNS TEXT[] AS $$
+        DECLARE
+            urls TEXT[];
+        BEGIN
+            IF input_text IS NULL OR input_text = '' THEN
+                RETURN ARRAY[]::TEXT[];
+            END IF;
+
+            IF left(input_text, 1) = '[' AND right(input_text, 1) = ']' THEN
+                BEGIN
+                    SELECT COALESCE(array_agg(u ORDER BY n), ARRAY[]::TEXT[]) INTO urls
+                    FROM (
+                        SELECT regexp_replace(e, '^\s+|\s+$', '', 'g') AS u, n
+                        FROM json_array_elements_text(input_text::json) WITH ORDINALITY AS j(e, n)
+                    ) t
+                    WHERE u <> '';
+                    RETURN urls;
+                EXCEPTION WHEN others THEN
+                    NULL;
+                END;
+            END IF;
+
+            SELECT COALESCE(array_agg(u ORDER BY n), ARRAY[]::TEXT[]) INTO urls
+            FROM (
+                SELECT replace(replace(
+                           regexp_replace(btrim(btrim(regexp_replace(e, '^\s+|\s+$', '', 'g'), '"'), ''''), '^\s+|\s+$', '', 'g'),
+                           '%22', ''), '%27', '') AS u,
+                       n
+                FROM regexp_split_to_table(input_text, ',') WITH ORDINALITY AS s(e, n)
+            ) t
+            WHERE u <> '';
+            RETURN urls;
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE
+    """)
+
+    # Mesmo formato de row_to_product (endpoints de busca): o documento é
+    # enviado como está, sem montar dicts por linha
+    op.execute(r"""
+        CREATE OR REPLACE FUNCTION build_product_doc(
+            p_id INTEGER, p_sku TEXT, p_title TEXT, p_description TEXT, p_brand TEXT,
+            p_original_codes TEXT, p_image_urls TEXT, p_base_price NUMERIC
+        )
+        RETURNS JSON AS $$
+            SELECT json_build_object(
+                'id', p_id::text,
+                'sku', p_sku,
+                'title', p_title,
+                'description', p_description,
+                'brand', CASE WHEN p_brand <> '' THEN json_build_object('name', p_brand) END,
+                'original_codes', p_original_codes,
+                'images', COALESCE((
+                    SELECT json_agg(json_build_object('url', u) ORDER BY n)
+                    FROM unnest(parse_image_urls(p_image_urls)) WITH ORDINALITY AS i(u, n)
+                ), '[]'::json),
+                'codes', COALESCE((
+                    SELECT json_agg(json_build_object('code', code, 'type', 'OEM') ORDER BY n)
+                    FROM (
+                        SELECT regexp_replace(c, '^\s+|\s+$', '', 'g') AS code, n
+                        FROM regexp_split_to_table(p_original_codes, ' / ') WITH ORDINALITY AS s(c, n)
+                    ) c
+                    WHERE code <> ''
+                ), '[]'::json),
+                'base_price', NULLIF(p_base_price, 0)::float8
+            )
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    """)
+
+    # Coluna gerada: recalculada pelo próprio Postgres em qualquer escrita
+    op.execute("""
+        ALTER TABLE products
+            ADD COLUMN IF NOT EXISTS product_doc JSON GENERATED ALWAYS AS (
+                build_product_doc(id, sku, title, description, brand, original_codes, image_urls, base_price)
+            ) STORED
+    """)
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS product_doc")
+    op.execute("DROP FUNCTION IF EXISTS build_product_doc(INTEGER, TEXT, TEXT, TEXT, TEXT, TEXT, TEXT, NUMERIC)")
+    op.execute("DROP FUNCTION IF EXISTS parse_image_urls(TEXT)")
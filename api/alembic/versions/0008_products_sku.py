@@ -0,0 +1,22 @@
+"""Índice em products.sku para o detalhe do produto por SKU
+
+Revision ID: 0008_products_sku
+Revises: 0007_product_doc
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0008_products_sku"
+down_revision = "0007_product_doc"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # GET /products/{sku}: igualdade exata no SKU (ix_products_sku_normalized
+    # só atende consultas sobre normalize_code(sku))
+    op.execute("CREATE INDEX IF NOT EXISTS ix_products_sku ON products (sku)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_products_sku")
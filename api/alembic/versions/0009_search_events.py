@@ -0,0 +1,74 @@
+"""Log de eventos de busca (search_events) e agregados por hora/dia
+
+Revision ID: 0009_search_events
+Revises: 0008_products_sku
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0009_search_events"
+down_revision = "0008_products_sku"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Append-only, gravado em lotes pelo flush em background
+    # (app/services/search_events.py). occurred_at é a hora do evento;
+    # inserted_at (hora da transação do lote) limita o que o rollup lê.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS search_events (
+            id BIGSERIAL PRIMARY KEY,
+            occurred_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            inserted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            event_type TEXT NOT NULL,
+            query TEXT,
+            query_norm TEXT,
+            target TEXT,
+            product_id INTEGER,
+            results INTEGER,
+            source TEXT
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_search_events_occurred_at ON search_events USING brin (occurred_at)")
+
+    # Agregados incrementais: o rollup soma os eventos com id acima de
+    # search_rollup_state.last_event_id e avança o marcador
+    for table, bucket in (("search_stats_hourly", "bucket TIMESTAMP WITH TIME ZONE"), ("search_stats_daily", "day DATE")):
+        key = bucket.split()[0]
+        op.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                {bucket} NOT NULL,
+                query_norm TEXT NOT NULL,
+                query TEXT NOT NULL,
+                searches INTEGER NOT NULL DEFAULT 0,
+                zero_results INTEGER NOT NULL DEFAULT 0,
+                clicks INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY ({key}, query_norm)
+            )
+        """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS product_stats_daily (
+            day DATE NOT NULL,
+            product_id INTEGER NOT NULL,
+            views INTEGER NOT NULL DEFAULT 0,
+            clicks INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, product_id)
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS search_rollup_state (
+            id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+            last_event_id BIGINT NOT NULL DEFAULT 0,
+            rolled_at TIMESTAMP WITH TIME ZONE
+        )
+    """)
+    op.execute("INSERT INTO search_rollup_state (id, last_event_id) VALUES (1, 0) ON CONFLICT (id) DO NOTHING")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS search_rollup_state")
+    op.execute("DROP TABLE IF EXISTS product_stats_daily")
+    op.execute("DROP TABLE IF EXISTS search_stats_daily")
+    op.execute("DROP TABLE IF EXISTS search_stats_hourly")
+    op.execute("DROP TABLE IF EXISTS search_events")
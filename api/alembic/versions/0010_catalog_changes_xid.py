@@ -0,0 +1,29 @@
+"""catalog_changes.xid: transação de cada alteração, para leitura incremental segura
+
+Revision ID: 0010_catalog_changes_xid
+Revises: 0009_search_events
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0010_catalog_changes_xid"
+down_revision = "0009_search_events"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # seq (BIGSERIAL) é reservado no INSERT e não segue a ordem de commit:
+    # ler "seq > último lido" pula transações que commitam atrasadas. Com o
+    # xid de cada linha os índices em memória leem "xid >= xmin do snapshot
+    # da leitura anterior" (app/services/code_index.py, get_catalog_cursor).
+    op.execute("""
+        ALTER TABLE catalog_changes
+        ADD COLUMN IF NOT EXISTS xid xid8 NOT NULL DEFAULT pg_current_xact_id()
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_catalog_changes_xid ON catalog_changes (xid)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_catalog_changes_xid")
+    op.execute("ALTER TABLE catalog_changes DROP COLUMN IF EXISTS xid")
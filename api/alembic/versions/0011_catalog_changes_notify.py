@@ -0,0 +1,48 @@
+"""NOTIFY catalog_changes a cada escrita em products
+
+Revision ID: 0011_catalog_changes_notify
+Revises: 0010_catalog_changes_xid
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0011_catalog_changes_notify"
+down_revision = "0010_catalog_changes_xid"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # O NOTIFY só é entregue no commit (e uma vez por transação), então a
+    # API invalida os caches quando a alteração já está visível
+    # (app/services/catalog_watch.py)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION log_catalog_changes()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO catalog_changes (product_id) SELECT id FROM old_rows;
+            ELSE
+                INSERT INTO catalog_changes (product_id) SELECT id FROM new_rows;
+            END IF;
+            PERFORM pg_notify('catalog_changes', '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        CREATE OR REPLACE FUNCTION log_catalog_changes()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO catalog_changes (product_id) SELECT id FROM old_rows;
+            ELSE
+                INSERT INTO catalog_changes (product_id) SELECT id FROM new_rows;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
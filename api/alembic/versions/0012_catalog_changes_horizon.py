@@ -0,0 +1,31 @@
+"""Horizonte da poda de catalog_changes
+
+Revision ID: 0012_catalog_changes_horizon
+Revises: 0011_catalog_changes_notify
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0012_catalog_changes_horizon"
+down_revision = "0011_catalog_changes_notify"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Maior xid já apagado de catalog_changes (prune_catalog_changes): um
+    # índice em memória com cursor abaixo dele perdeu alterações e recarrega
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_changes_horizon (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+            horizon xid8 NOT NULL
+        )
+    """)
+    op.execute("""
+        INSERT INTO catalog_changes_horizon (horizon) VALUES ('0'::xid8)
+        ON CONFLICT DO NOTHING
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS catalog_changes_horizon")
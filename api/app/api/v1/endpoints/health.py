@@ -1,7 +1,45 @@
-﻿from fastapi import APIRouter
+﻿from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_async_db
+from app.services.autocomplete import autocomplete
+from app.services.catalog_watch import catalog_watch
+from app.services.code_index import code_index
+from app.services.image_index import image_index
+from app.services.product_cache import product_cache
+from app.services.search_cache import search_cache
+from app.services.search_engine import search_engine
+from app.services.search_events import search_events
+from app.services.sku_correction import sku_corrector
+from app.services.spell_index import spell_index
+from app.services.statement_cache import prepared_plan_stats, statement_cache_stats
+from app.services.trending import trending
 
 router = APIRouter()
 
 @router.get("/healthz")
 async def health_check():
     return {"status": "ok", "version": "1.0.0", "service": "log-parts-api"}
+
+@router.get("/stats")
+async def get_stats(db: AsyncSession = Depends(get_async_db)):
+    """Métricas das estruturas em memória da API"""
+    try:
+        prepared_plans = await prepared_plan_stats(db)
+    except Exception as e:
+        prepared_plans = {"error": str(e)}
+    
+    return {
+        "code_index": code_index.stats(),
+        "search_cache": search_cache.stats(),
+        "catalog_watch": catalog_watch.stats(),
+        "product_cache": product_cache.stats(),
+        "image_index": image_index.stats(),
+        "search_engine": search_engine.stats(),
+        "spell_index": spell_index.stats(),
+        "autocomplete": autocomplete.stats(),
+        "sku_correction": sku_corrector.stats(),
+        "search_events": search_events.stats(),
+        "trending": trending.stats(),
+        "statement_cache": {**statement_cache_stats.stats(), "prepared_plans": prepared_plans},
+    }
@@ -1,15 +1,17 @@
 # app/api/v1/endpoints/pricing.py - VERSÃO COMPLETA CORRIGIDA
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, text
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
 import logging
 
-from app.core.database import get_db
+from app.core.database import SessionLocal, get_async_db
 from app.models.product import Product
 from app.services.pricing_import import PricingDataImporter
+from app.services.search_cache import bump_catalog_version
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -98,12 +100,12 @@ STATE_RATES = {
 }
 
 @router.get("/product-pricing/{sku}")
-async def get_product_pricing_data(sku: str, db: Session = Depends(get_db)):
+async def get_product_pricing_data(sku: str, db: AsyncSession = Depends(get_async_db)):
     """Obter dados do produto necessários para cálculo de preços"""
     
     try:
         # Buscar produto no banco
-        product = db.query(Product).filter(Product.sku == sku).first()
+        product = (await db.execute(select(Product).where(Product.sku == sku))).scalars().first()
         if not product:
             raise HTTPException(status_code=404, detail=f"Produto {sku} não encontrado")
         
@@ -123,10 +125,10 @@ async def get_product_pricing_data(sku: str, db: Session = Depends(get_db)):
             else:
                 # Depois tentar buscar na tabela se existir
                 try:
-                    ncm_result = db.execute(
+                    ncm_result = (await db.execute(
                         text("SELECT has_tax FROM ncm_tax_rules WHERE ncm = :ncm"), 
                         {'ncm': product.ncm}
-                    ).fetchone()
+                    )).fetchone()
                     has_tax = ncm_result[0] if ncm_result else True
                 except Exception as e:
                     logger.warning(f"Tabela ncm_tax_rules não existe ou erro: {e}")
@@ -147,7 +149,7 @@ async def get_product_pricing_data(sku: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
 @router.post("/calculate-price")
-async def calculate_price(request: PriceCalculationRequest, db: Session = Depends(get_db)):
+async def calculate_price(request: PriceCalculationRequest, db: AsyncSession = Depends(get_async_db)):
     """Calcular preço final baseado nos parâmetros fornecidos - LÓGICA CORRIGIDA BASEADA NO EXCEL"""
     
     try:
@@ -276,10 +278,26 @@ async def calculate_price(request: PriceCalculationRequest, db: Session = Depend
         logger.error(f"Erro no cálculo de preço: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro no cálculo: {str(e)}")
 
+def _run_pricing_import(file_path: str) -> dict:
+    """Importação síncrona (PricingDataImporter), com sessão própria, fora do event loop"""
+    db = SessionLocal()
+    try:
+        importer = PricingDataImporter(db)
+        
+        # Criar tabelas se necessário
+        importer.create_tables_if_not_exist()
+        
+        # Popular dados de estados
+        importer.populate_state_rates()
+        
+        # Importar da planilha
+        return importer.import_from_excel(file_path)
+    finally:
+        db.close()
+
 @router.post("/import-pricing-data")
 async def import_pricing_data(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    file: UploadFile = File(...)
 ):
     """Importar dados de precificação via planilha Excel"""
     
@@ -298,16 +316,7 @@ async def import_pricing_data(
             tmp_file_path = tmp_file.name
         
         # Importar dados
-        importer = PricingDataImporter(db)
-        
-        # Criar tabelas se necessário
-        importer.create_tables_if_not_exist()
-        
-        # Popular dados de estados
-        importer.populate_state_rates()
-        
-        # Importar da planilha
-        result = importer.import_from_excel(tmp_file_path)
+        result = await asyncio.to_thread(_run_pricing_import, tmp_file_path)
         
         # Limpar arquivo temporário
         os.unlink(tmp_file_path)
@@ -319,46 +328,46 @@ async def import_pricing_data(
         raise HTTPException(status_code=500, detail=f"Erro na importação: {str(e)}")
 
 @router.get("/pricing-stats")
-async def get_pricing_stats(db: Session = Depends(get_db)):
+async def get_pricing_stats(db: AsyncSession = Depends(get_async_db)):
     """Obter estatísticas dos dados de precificação"""
     
     try:
         # Contar produtos com dados de precificação
-        products_with_pricing = db.execute(text("""
+        products_with_pricing = (await db.execute(text("""
             SELECT COUNT(*) FROM products 
             WHERE base_price IS NOT NULL AND base_price > 0
-        """)).scalar()
+        """))).scalar()
         
         # Contar produtos por tipo
-        products_by_type = db.execute(text("""
+        products_by_type = (await db.execute(text("""
             SELECT product_type, COUNT(*) 
             FROM products 
             WHERE base_price IS NOT NULL AND base_price > 0
             GROUP BY product_type
-        """)).fetchall()
+        """))).fetchall()
         
         # Contar NCMs únicos
-        unique_ncms = db.execute(text("""
+        unique_ncms = (await db.execute(text("""
             SELECT COUNT(DISTINCT ncm) 
             FROM products 
             WHERE ncm IS NOT NULL AND ncm != ''
-        """)).scalar()
+        """))).scalar()
         
         # Contar NCMs com tributação (se tabela existir)
         ncms_with_tax = 0
         try:
-            ncms_with_tax = db.execute(text("""
+            ncms_with_tax = (await db.execute(text("""
                 SELECT COUNT(*) FROM ncm_tax_rules WHERE has_tax = TRUE
-            """)).scalar()
+            """))).scalar()
         except:
-            pass
+            await db.rollback()
         
         # Faixa de preços
-        price_range = db.execute(text("""
+        price_range = (await db.execute(text("""
             SELECT MIN(base_price), MAX(base_price), AVG(base_price)
             FROM products 
             WHERE base_price IS NOT NULL AND base_price > 0
-        """)).fetchone()
+        """))).fetchone()
         
         return {
             'products_with_pricing': products_with_pricing or 0,
@@ -377,17 +386,17 @@ async def get_pricing_stats(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/states")
-async def get_states(db: Session = Depends(get_db)):
+async def get_states(db: AsyncSession = Depends(get_async_db)):
     """Listar estados com alíquotas configuradas"""
     
     try:
         # Tentar buscar da tabela se existir
         try:
-            states = db.execute(text("""
+            states = (await db.execute(text("""
                 SELECT state_code, state_name, difal_imp, difal_normal
                 FROM state_tax_rates
                 ORDER BY state_name
-            """)).fetchall()
+            """))).fetchall()
             
             return [
                 {
@@ -411,29 +420,30 @@ async def get_states(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/reset-pricing-data")
-async def reset_pricing_data(db: Session = Depends(get_db)):
+async def reset_pricing_data(db: AsyncSession = Depends(get_async_db)):
     """Resetar todos os dados de precificação (usar com cuidado!)"""
     
     try:
         # Limpar dados de precificação dos produtos
-        db.execute(text("UPDATE products SET base_price = NULL, ncm = NULL, product_type = NULL"))
+        await db.execute(text("UPDATE products SET base_price = NULL, ncm = NULL, product_type = NULL"))
         
         # Limpar tabelas auxiliares se existirem
         try:
-            db.execute(text("DELETE FROM ncm_tax_rules"))
+            await db.execute(text("DELETE FROM ncm_tax_rules"))
         except:
             pass
             
         try:
-            db.execute(text("DELETE FROM state_tax_rates"))
+            await db.execute(text("DELETE FROM state_tax_rates"))
         except:
             pass
         
-        db.commit()
+        await db.commit()
+        await asyncio.to_thread(bump_catalog_version)
         
         return {'message': 'Dados de precificação resetados com sucesso'}
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Erro ao resetar dados: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,189 +1,75 @@
+import logging
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Path
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-import json
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_async_db
+from app.services.confidence import EMPTY_STATS, check_search_query, confidence_params, ranked_search_sql, score_rows, stats_from_counts
+from app.schemas.search import ProductBatchRequest, SearchFilters
+from app.services.facets import apply_filters, facet_counts_sql, facets_from_rows, search_filters
+from app.services.export import check_export_format, export_products, export_search
+from app.services.product_cache import load_product_docs, product_cache
+from app.services.search_events import search_events
+from app.services.statement_cache import statement
+from app.services.product_codes import CODE_MATCH_CTE, code_match_params
+from app.utils.pagination import clamp_limit, decode_cursor, encode_cursor
+from app.utils.product_doc import PRODUCT_DOC_COLUMN, product_json
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# Sistema de confiança (copie do arquivo confidence.py)
-def calculate_confidence_score(product, search_query, search_type):
-    score = 0
-    reasons = []
-    search_lower = search_query.lower().strip()
-    
-    # Verificar SKU
-    sku = str(product.get("sku", "")).lower()
-    if search_type == "codigo" or search_type == "CODIGO":
-        if sku == search_lower:
-            score += 45
-            reasons.append("SKU exato")
-        elif search_lower in sku or sku in search_lower:
-            score += 25
-            reasons.append("SKU parcial")
-    
-    # Verificar códigos originais
-    original_codes = str(product.get("original_codes", "")).lower()
-    if original_codes and search_lower in original_codes:
-        if f" {search_lower} " in f" {original_codes} ":  # Match exato
-            score += 50
-            reasons.append("Código OEM exato")
-        else:  # Match parcial
-            score += 35
-            reasons.append("Código OEM parcial")
-    
-    title = str(product.get("title", "")).lower()
-    description = str(product.get("description", "")).lower()
-    
-    if search_type == "texto" or search_type == "TEXTO":
-        if search_lower == title:
-            score += 40
-            reasons.append("Título exato")
-        elif search_lower in title:
-            if len(search_lower) > 3:
-                score += 25
-                reasons.append("Título contém termo")
-            else:
-                score += 15
-                reasons.append("Termo encontrado no título")
-        
-        if search_lower in description:
-            if len(search_lower) > 5:
-                score += 15
-                reasons.append("Descrição contém termo")
-            else:
-                score += 8
-                reasons.append("Termo na descrição")
-        
-        if search_lower in sku:
-            score += 20
-            reasons.append("SKU relacionado")
-    
-    brand = product.get("brand")
-    if brand:
-        brand_name = ""
-        if isinstance(brand, dict):
-            brand_name = str(brand.get("name", "")).lower()
-        elif isinstance(brand, str):
-            brand_name = brand.lower()
-        
-        if search_lower in brand_name or brand_name in search_lower:
-            score += 12
-            reasons.append("Marca correspondente")
-    
-    if product.get("images") and len(product["images"]) > 0:
-        score += 8
-        reasons.append("Tem imagens")
-    
-    if description and len(description) > 100:
-        score += 5
-        reasons.append("Descrição detalhada")
-    
-    if not title or len(title) < 10:
-        score -= 10
-        reasons.append("Título incompleto")
-    
-    if score >= 70:
-        level = "alto"
-    elif score >= 40:
-        level = "medio"
-    else:
-        level = "baixo"
-    
-    return {
-        "level": level,
-        "score": min(max(score, 0), 100),
-        "reasons": reasons
-    }
-
-def enhance_products_with_confidence(products, search_query, search_type):
-    enhanced_products = []
-    
-    for product in products:
-        confidence = calculate_confidence_score(product, search_query, search_type)
-        enhanced_product = {
-            **product,
-            "confidence": confidence
-        }
-        enhanced_products.append(enhanced_product)
-    
-    priority_order = {"alto": 3, "medio": 2, "baixo": 1}
-    enhanced_products.sort(
-        key=lambda x: (
-            priority_order.get(x["confidence"]["level"], 0),  
-            x["confidence"]["score"],
-            x.get("title", "")
-        ), 
-        reverse=True
-    )
-    
-    return enhanced_products
-
-def get_confidence_stats(products):
-    if not products:
-        return {"total": 0, "alto": 0, "medio": 0, "baixo": 0}
-    
-    stats = {"total": len(products), "alto": 0, "medio": 0, "baixo": 0}
-    
-    for product in products:
-        confidence_level = product.get("confidence", {}).get("level", "baixo")
-        if confidence_level in stats:
-            stats[confidence_level] += 1
-    
-    return stats
-
-def parse_image_urls(image_urls_str):
-    if not image_urls_str:
-        return []
-    
-    try:
-        if image_urls_str.startswith('[') and image_urls_str.endswith(']'):
-            urls = json.loads(image_urls_str)
-            return [url.strip() for url in urls if url.strip()]
-        else:
-            return [url.strip().strip('"').strip("'") for url in image_urls_str.split(',') if url.strip()]
-            
-    except json.JSONDecodeError:
-        return [url.strip().strip('"').strip("'") for url in image_urls_str.split(',') if url.strip()]
-
-def parse_original_codes_to_array(original_codes_str):
-    """Converte string 'HY 1534017 / YA 580039672' em array de objetos"""
-    if not original_codes_str or original_codes_str.strip() == '':
-        return []
-    
-    codes = [code.strip() for code in original_codes_str.split(' / ') if code.strip()]
-    return [{"code": code, "type": "OEM"} for code in codes]
+SEARCH_COLUMNS = "p.id, p.sku, p.title, p.description, p.brand, p.category, p.image_urls, p.original_codes"
+# O produto já montado pelo banco (products.product_doc, migração 0007)
+DOC_COLUMNS = f"p.id, {PRODUCT_DOC_COLUMN}"
 
 @router.get("/")
 async def get_products(
+    response: Response,
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    format: str = "json",
+    db: AsyncSession = Depends(get_async_db)
 ):
+    """
+    Lista produtos por id. Paginação por cursor (keyset): passe o valor do
+    header X-Next-Cursor da página anterior em `cursor`. `skip` é mantido
+    apenas por compatibilidade.
+    """
+    limit = clamp_limit(limit)
+    after_id = None
+    if cursor:
+        try:
+            after_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    if format != "json":
+        check_export_format(format)
+        return export_products(format, after_id, skip)
+    
     try:
-        print(f"Buscando produtos: skip={skip}, limit={limit}")
+        print(f"Buscando produtos: skip={skip}, limit={limit}, cursor={after_id}")
         # INCLUINDO original_codes na query
-        query = text("SELECT id, sku, title, description, brand, category, image_urls, original_codes FROM products ORDER BY id LIMIT :limit OFFSET :offset")
-        result = db.execute(query, {"limit": limit, "offset": skip})
+        if after_id is not None:
+            # Range scan na PK, custo constante em qualquer profundidade
+            query = text(f"SELECT {DOC_COLUMNS} FROM products p WHERE p.id > :after_id ORDER BY p.id LIMIT :limit")
+            result = await db.execute(query, {"after_id": after_id, "limit": limit + 1})
+        else:
+            query = text(f"SELECT {DOC_COLUMNS} FROM products p ORDER BY p.id LIMIT :limit OFFSET :offset")
+            result = await db.execute(query, {"limit": limit + 1, "offset": skip})
+        
+        rows = result.fetchall()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].id)
         
-        products = []
-        count = 0
-        for row in result:
-            count += 1
-            products.append({
-                "id": str(row.id),
-                "sku": row.sku,
-                "title": row.title,
-                "description": row.description,
-                "brand": {"name": row.brand} if row.brand else None,
-                "original_codes": row.original_codes,  # ADICIONADO
-                "images": [{"url": url} for url in parse_image_urls(row.image_urls)],
-                "codes": parse_original_codes_to_array(row.original_codes)  # ADICIONADO
-            })
+        products = [product_json(row.product_doc) for row in rows]
         
-        print(f"Produtos encontrados: {count}")
-        return products
+        print(f"Produtos encontrados: {len(products)}")
+        return ORJSONResponse(products)
         
     except Exception as e:
         print(f"ERRO ao buscar produtos: {e}")
@@ -195,117 +81,160 @@ async def search_products_get(
     type: str = "texto",
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db)
+    format: str = "json",
+    facets: bool = True,
+    filters: SearchFilters = Depends(search_filters),
+    db: AsyncSession = Depends(get_async_db)
 ):
+    check_search_query(q)
+    limit = clamp_limit(limit)
+    if format != "json":
+        check_export_format(format)
+    
     try:
         print(f"Busca com confiança: q={q}, type={type}")
         
+        params = {**confidence_params(q), "limit": limit, "offset": skip}
+        
         if type == "codigo":
-            # INCLUINDO original_codes na busca por código
-            query = text("""
-                SELECT id, sku, title, description, brand, category, image_urls, original_codes 
-                FROM products 
-                WHERE LOWER(sku) LIKE LOWER(:term) 
-                   OR LOWER(original_codes) LIKE LOWER(:term)
-                ORDER BY 
-                    CASE 
-                        WHEN LOWER(sku) = LOWER(:exact) THEN 1
-                        WHEN LOWER(original_codes) LIKE LOWER(:exact_code) THEN 2
-                        ELSE 3
-                    END,
-                    id 
-                LIMIT :limit OFFSET :offset
-            """)
-            result = db.execute(query, {
-                "term": f"%{q}%", 
-                "exact": q,
-                "exact_code": f"% {q} %",
-                "limit": limit * 2, 
-                "offset": skip
-            })
+            # Busca por código via product_codes (índices em normalized_code)
+            params.update(code_match_params(q))
+            search = dict(
+                with_sql=f"WITH {CODE_MATCH_CTE}",
+                from_sql="FROM code_matches cm JOIN products p ON p.id = cm.product_id",
+                tie_order="cm.match_rank, p.id"
+            )
         else:
             # INCLUINDO original_codes na busca por texto
-            query = text("""
-                SELECT id, sku, title, description, brand, category, image_urls, original_codes 
-                FROM products 
-                WHERE LOWER(title) LIKE LOWER(:term) 
-                   OR LOWER(description) LIKE LOWER(:term) 
-                   OR LOWER(sku) LIKE LOWER(:term)
-                   OR LOWER(original_codes) LIKE LOWER(:term)
-                ORDER BY 
-                    CASE 
-                        WHEN LOWER(title) LIKE LOWER(:exact) THEN 1
-                        WHEN LOWER(sku) = LOWER(:q) THEN 2
-                        WHEN LOWER(original_codes) LIKE LOWER(:exact_code) THEN 3
+            params.update({"term": f"%{q}%", "q": q, "exact_code": f"% {q} %"})
+            search = dict(
+                from_sql="FROM products p",
+                where_sql="""
+                    LOWER(p.title) LIKE LOWER(:term)
+                    OR LOWER(p.description) LIKE LOWER(:term)
+                    OR LOWER(p.sku) LIKE LOWER(:term)
+                    OR LOWER(p.original_codes) LIKE LOWER(:term)
+                """,
+                tie_order="""
+                    CASE
+                        WHEN LOWER(p.title) LIKE LOWER(:term) THEN 1
+                        WHEN LOWER(p.sku) = LOWER(:q) THEN 2
+                        WHEN LOWER(p.original_codes) LIKE LOWER(:exact_code) THEN 3
                         ELSE 4
                     END,
-                    id 
-                LIMIT :limit OFFSET :offset
-            """)
-            result = db.execute(query, {
-                "term": f"%{q}%",
-                "exact": f"%{q}%", 
-                "q": q,
-                "exact_code": f"% {q} %",
-                "limit": limit * 2, 
-                "offset": skip
-            })
+                    p.id
+                """
+            )
+        
+        search = apply_filters(search, filters, params)
         
-        products = []
+        if format != "json":
+            return export_search(format, type, search, params, skip)
         
-        for row in result:
-            products.append({
-                "id": str(row.id),
-                "sku": row.sku,
-                "title": row.title,
-                "description": row.description,
-                "brand": {"name": row.brand} if row.brand else None,
-                "original_codes": row.original_codes,  # ADICIONADO
-                "images": [{"url": url} for url in parse_image_urls(row.image_urls)],
-                "codes": parse_original_codes_to_array(row.original_codes)  # ADICIONADO
-            })
+        # Confiança calculada no banco: ordena, pagina e conta numa consulta só
+        rows = (await db.execute(statement(ranked_search_sql(type, f"{SEARCH_COLUMNS}, {PRODUCT_DOC_COLUMN}", **search)), params)).fetchall()
+        counts = rows[0] if rows else None
+        if counts is None and skip > 0:
+            counts = (await db.execute(statement(ranked_search_sql(type, SEARCH_COLUMNS, count_only=True, **search)), params)).first()
+        stats = stats_from_counts(counts)
         
-        # Sistema de confiança
-        products_with_confidence = enhance_products_with_confidence(products, q, type)
-        paginated_products = products_with_confidence[skip:skip + limit]
+        # Todas as facetas numa consulta agrupada sobre o conjunto inteiro
+        facet_counts = None
+        if facets:
+            facet_counts = facets_from_rows(await db.execute(statement(facet_counts_sql(type, **search)), params))
         
-        print(f"Produtos com confiança: {len(products_with_confidence)}")
+        # Motivos só para as linhas da página
+        confidence = score_rows(rows, q, type)
+        products = [product_json(row.product_doc, confidence=confidence.confidence(i)) for i, row in enumerate(rows)]
         
-        return {
-            "products": paginated_products,
-            "total": len(products_with_confidence),
+        print(f"Produtos com confiança: {stats['total']}")
+        if skip == 0:
+            search_events.record("search", query=q, results=stats["total"], source="products")
+        
+        return ORJSONResponse({
+            "products": products,
+            "total": stats["total"],
             "page": (skip // limit) + 1,
             "limit": limit,
-            "hasMore": len(products_with_confidence) > skip + limit,
-            "confidence_stats": get_confidence_stats(products_with_confidence)
-        }
+            "hasMore": stats["total"] > skip + limit,
+            "confidence_stats": stats,
+            "facets": facet_counts
+        })
         
     except Exception as e:
         print(f"ERRO na busca: {e}")
-        return {"products": [], "total": 0, "page": 1, "limit": limit, "hasMore": False, "confidence_stats": {"total": 0, "alto": 0, "medio": 0, "baixo": 0}}
+        return {"products": [], "total": 0, "page": 1, "limit": limit, "hasMore": False, "confidence_stats": dict(EMPTY_STATS)}
+
+def _split_values(values: Optional[List[str]]) -> List[str]:
+    """Aceita ?ids=1,2,3 e ?ids=1&ids=2; remove vazios e repetidos mantendo a ordem"""
+    result = []
+    for value in values or []:
+        result.extend(part.strip() for part in value.split(",") if part.strip())
+    return list(dict.fromkeys(result))
+
+async def _batch_fetch(ids: List[str], skus: List[str], db: AsyncSession):
+    ids = _split_values(ids)
+    skus = _split_values(skus)
+    count = len(ids) + len(skus)
+    if count == 0:
+        raise HTTPException(status_code=400, detail="Informe ids ou skus")
+    if count > settings.product_batch_max:
+        raise HTTPException(status_code=400, detail=f"Máximo de {settings.product_batch_max} produtos por requisição ({count} enviados)")
+    
+    try:
+        by_id, by_sku = await load_product_docs(db, ids, skus)
+    except Exception as e:
+        print(f"ERRO ao buscar produtos em lote: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro: {str(e)}")
+    
+    # Na ordem pedida: primeiro os ids, depois os SKUs
+    products = []
+    missing = {"ids": [], "skus": []}
+    for values, found, kind in ((ids, by_id, "ids"), (skus, by_sku, "skus")):
+        for value in values:
+            doc = found.get(value)
+            if doc is None:
+                missing[kind].append(value)
+            else:
+                products.append(product_json(doc))
+    
+    logger.info("Produtos em lote: %d de %d", len(products), count)
+    return ORJSONResponse({
+        "products": products,
+        "total": len(products),
+        "requested": count,
+        "missing": missing
+    })
+
+@router.get("/batch")
+async def get_products_batch(
+    ids: Optional[List[str]] = Query(None),
+    skus: Optional[List[str]] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Vários produtos numa consulta: ?ids=1,2,3&skus=RV0402.0020 (mesmo formato de /{product_id})"""
+    return await _batch_fetch(ids, skus, db)
+
+@router.post("/batch")
+async def post_products_batch(
+    request: ProductBatchRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Como GET /batch, com as listas no corpo (para muitos ids)"""
+    return await _batch_fetch(request.ids, request.skus, db)
 
 @router.get("/{product_id}")
 async def get_product(
     product_id: str = Path(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        # INCLUINDO original_codes na query
-        query = text("SELECT id, sku, title, description, brand, category, image_urls, original_codes FROM products WHERE id = :id OR sku = :sku LIMIT 1")
-        result = db.execute(query, {"id": product_id, "sku": product_id})
-        row = result.first()
+        # Memória local -> Redis -> banco (por id ou por SKU)
+        doc = await product_cache.get(db, product_id)
         
-        if row:
-            return {
-                "id": str(row.id),
-                "sku": row.sku,
-                "title": row.title,
-                "description": row.description,
-                "brand": {"name": row.brand} if row.brand else None,
-                "original_codes": row.original_codes,  # ADICIONADO
-                "images": [{"url": url} for url in parse_image_urls(row.image_urls)],
-                "codes": parse_original_codes_to_array(row.original_codes)  # ADICIONADO
-            }
+        if doc is not None:
+            search_events.record("product_view", product_doc=doc, source="products")
+            return ORJSONResponse(product_json(doc))
         raise HTTPException(status_code=404, detail="Produto nao encontrado")
         
     except HTTPException:
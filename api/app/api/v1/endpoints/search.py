@@ -1,171 +1,61 @@
 ﻿# api/app/api/v1/endpoints/search.py
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Path
-from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, File, HTTPException, Path, Response, UploadFile
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-import json
-from app.core.database import get_db
+import asyncio
+import logging
+from app.core.config import settings
+from app.core.database import get_async_db
+from app.schemas.search import BulkCodesRequest, SearchFilters, SearchQuery, SearchResult
+from app.services.bulk_codes import parse_codes_file, resolve_codes
+from app.services.code_index import code_index, code_keys
+from app.services.confidence import EMPTY_STATS, check_search_query, confidence_params, ranked_search_sql, score_rows, stats_from_counts
+from app.services.embeddings import EF_SEARCH_SQL, HYBRID_MATCH_CTE, hybrid_params
+from app.services.image_features import compute_features
+from app.services.image_index import image_index
+from app.services.facets import apply_filters, facet_counts_sql, facets_from_rows, filters_cache_key, search_filters
+from app.services.export import check_export_format, export_products, export_search
+from app.services.product_codes import CODE_MATCH_CTE, EXACT_ORDER_SQL, code_match_params, split_original_codes
+from app.services.product_cache import product_cache
+from app.services.search_cache import cached_total, search_cache
+from app.services.search_events import search_events
+from app.services.search_engine import search_engine
+from app.services.spell_index import spell_index
+from app.services.statement_cache import statement
+from app.services.text_search import (
+    FTS_MATCH_SQL, FTS_RANK_SQL, SUBSTRING_MATCH_CTE, SUBSTRING_ORDER_SQL, fts_params, substring_params
+)
+from app.utils.images import parse_image_urls
+from app.utils.pagination import clamp_limit, decode_cursor, encode_cursor
+from app.utils.product_doc import PRODUCT_DOC_COLUMN, product_json
+from app.utils.text import normalize_text
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# Sistema de confiança
-def calculate_confidence_score(product, search_query, search_type):
-    score = 0
-    reasons = []
-    search_lower = search_query.lower().strip()
-    
-    # Verificar SKU
-    sku = str(product.get("sku", "")).lower()
-    if search_type == "codigo" or search_type == "CODIGO":
-        if sku == search_lower:
-            score += 45
-            reasons.append("SKU exato")
-        elif search_lower in sku or sku in search_lower:
-            score += 25
-            reasons.append("SKU parcial")
-    
-    # Verificar códigos originais
-    original_codes = str(product.get("original_codes", "")).lower()
-    if original_codes and search_lower in original_codes:
-        if f" {search_lower} " in f" {original_codes} ":
-            score += 50
-            reasons.append("Código OEM exato")
-        else:
-            score += 35
-            reasons.append("Código OEM parcial")
-    
-    title = str(product.get("title", "")).lower()
-    description = str(product.get("description", "")).lower()
-    
-    if search_type == "texto" or search_type == "TEXTO":
-        if search_lower == title:
-            score += 40
-            reasons.append("Título exato")
-        elif search_lower in title:
-            if len(search_lower) > 3:
-                score += 25
-                reasons.append("Título contém termo")
-            else:
-                score += 15
-                reasons.append("Termo encontrado no título")
-        
-        if search_lower in description:
-            if len(search_lower) > 5:
-                score += 15
-                reasons.append("Descrição contém termo")
-            else:
-                score += 8
-                reasons.append("Termo na descrição")
-        
-        if search_lower in sku:
-            score += 20
-            reasons.append("SKU relacionado")
-    
-    brand = product.get("brand")
-    if brand:
-        brand_name = ""
-        if isinstance(brand, dict):
-            brand_name = str(brand.get("name", "")).lower()
-        elif isinstance(brand, str):
-            brand_name = brand.lower()
-        
-        if search_lower in brand_name or brand_name in search_lower:
-            score += 12
-            reasons.append("Marca correspondente")
-    
-    if product.get("images") and len(product["images"]) > 0:
-        score += 8
-        reasons.append("Tem imagens")
-    
-    if description and len(description) > 100:
-        score += 5
-        reasons.append("Descrição detalhada")
-    
-    if not title or len(title) < 10:
-        score -= 10
-        reasons.append("Título incompleto")
-    
-    if score >= 70:
-        level = "alto"
-    elif score >= 40:
-        level = "medio"
-    else:
-        level = "baixo"
-    
-    return {
-        "level": level,
-        "score": min(max(score, 0), 100),
-        "reasons": reasons
-    }
-
-def enhance_products_with_confidence(products, search_query, search_type):
-    enhanced_products = []
-    
-    for product in products:
-        confidence = calculate_confidence_score(product, search_query, search_type)
-        enhanced_product = {
-            **product,
-            "confidence": confidence
-        }
-        enhanced_products.append(enhanced_product)
-    
-    priority_order = {"alto": 3, "medio": 2, "baixo": 1}
-    enhanced_products.sort(
-        key=lambda x: (
-            priority_order.get(x["confidence"]["level"], 0),  
-            x["confidence"]["score"],
-            x.get("title", "")
-        ), 
-        reverse=True
-    )
-    
-    return enhanced_products
-
-def get_confidence_stats(products):
-    if not products:
-        return {"total": 0, "alto": 0, "medio": 0, "baixo": 0}
-    
-    stats = {"total": len(products), "alto": 0, "medio": 0, "baixo": 0}
-    
-    for product in products:
-        confidence_level = product.get("confidence", {}).get("level", "baixo")
-        if confidence_level in stats:
-            stats[confidence_level] += 1
-    
-    return stats
-
-def parse_image_urls(image_urls_str):
-    if not image_urls_str:
-        return []
-    
-    try:
-        if image_urls_str.startswith('[') and image_urls_str.endswith(']'):
-            urls = json.loads(image_urls_str)
-            return [url.strip() for url in urls if url.strip()]
-        else:
-            urls = []
-            for url in image_urls_str.split(','):
-                clean_url = url.strip().strip('"').strip("'").strip()
-                clean_url = clean_url.replace('%22', '').replace('%27', '')
-                if clean_url:
-                    urls.append(clean_url)
-            return urls
-    except json.JSONDecodeError:
-        urls = []
-        for url in image_urls_str.split(','):
-            clean_url = url.strip().strip('"').strip("'").strip()
-            clean_url = clean_url.replace('%22', '').replace('%27', '')
-            if clean_url:
-                urls.append(clean_url)
-        return urls
+SEARCH_COLUMNS = "p.id, p.sku, p.title, p.description, p.brand, p.category, p.image_urls, p.original_codes, p.base_price"
+# Listagens devolvem product_doc pronto; as colunas soltas ficam para score_rows
+DOC_COLUMNS = f"p.id, {PRODUCT_DOC_COLUMN}"
 
 def parse_original_codes_to_array(original_codes_str):
-    if not original_codes_str or original_codes_str.strip() == '':
-        return []
-    
-    codes = [code.strip() for code in original_codes_str.split(' / ') if code.strip()]
+    codes = split_original_codes(original_codes_str)
     return [{"code": code, "type": "OEM"} for code in codes]
 
+def row_to_product(row):
+    return {
+        "id": str(row.id),
+        "sku": row.sku,
+        "title": row.title,
+        "description": row.description,
+        "brand": {"name": row.brand} if row.brand else None,
+        "original_codes": row.original_codes,
+        "images": [{"url": url} for url in parse_image_urls(row.image_urls)],
+        "codes": parse_original_codes_to_array(row.original_codes),
+        "base_price": float(row.base_price) if row.base_price else None
+    }
+
 def normalize_code_simple(code: str) -> str:
     """Normalização simples de códigos"""
     if not code:
@@ -174,184 +64,256 @@ def normalize_code_simple(code: str) -> str:
 
 @router.get("/")
 async def get_products(
+    response: Response,
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    format: str = "json",
+    db: AsyncSession = Depends(get_async_db)
 ):
+    """
+    Lista produtos por id. Paginação por cursor (keyset): passe o valor do
+    header X-Next-Cursor da página anterior em `cursor`. `skip` é mantido
+    apenas por compatibilidade.
+    """
+    limit = clamp_limit(limit)
+    after_id = None
+    if cursor:
+        try:
+            after_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    if format != "json":
+        check_export_format(format)
+        return export_products(format, after_id, skip)
+    
     try:
-        print(f"Buscando produtos: skip={skip}, limit={limit}")
-        query = text("SELECT id, sku, title, description, brand, category, image_urls, original_codes, base_price FROM products ORDER BY id LIMIT :limit OFFSET :offset")
-        result = db.execute(query, {"limit": limit, "offset": skip})
+        print(f"Buscando produtos: skip={skip}, limit={limit}, cursor={after_id}")
+        if after_id is not None:
+            # Range scan na PK, custo constante em qualquer profundidade
+            query = text(f"SELECT {DOC_COLUMNS} FROM products p WHERE p.id > :after_id ORDER BY p.id LIMIT :limit")
+            result = await db.execute(query, {"after_id": after_id, "limit": limit + 1})
+        else:
+            query = text(f"SELECT {DOC_COLUMNS} FROM products p ORDER BY p.id LIMIT :limit OFFSET :offset")
+            result = await db.execute(query, {"limit": limit + 1, "offset": skip})
         
-        products = []
-        count = 0
-        for row in result:
-            count += 1
-            products.append({
-                "id": str(row.id),
-                "sku": row.sku,
-                "title": row.title,
-                "description": row.description,
-                "brand": {"name": row.brand} if row.brand else None,
-                "original_codes": row.original_codes,
-                "images": [{"url": url} for url in parse_image_urls(row.image_urls)],
-                "codes": parse_original_codes_to_array(row.original_codes),
-                "base_price": float(row.base_price) if row.base_price else None
-            })
+        rows = result.fetchall()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].id)
         
-        print(f"Produtos encontrados: {count}")
-        return products
+        products = [product_json(row.product_doc) for row in rows]
+        
+        print(f"Produtos encontrados: {len(products)}")
+        return ORJSONResponse(products)
         
     except Exception as e:
         print(f"ERRO ao buscar produtos: {e}")
         return [{"id": "1", "sku": "ERROR", "title": f"Erro de conexao: {str(e)}", "description": "Verifique logs", "brand": None, "images": [], "codes": [], "original_codes": ""}]
 
+def _search_plan(q: str, type: str, skip: int, limit: int, filters: SearchFilters) -> Tuple[Dict, Dict, str]:
+    """Monta a busca de /search (from/where/ordem para ranked_search_sql), os parâmetros e o tipo de pontuação"""
+    params = {**confidence_params(q), "limit": limit, "offset": skip}
+    exact_ids = code_index.lookup(q) if type == "codigo" else []
+    hybrid = hybrid_params(q) if type == "hibrido" else None
+    # A busca híbrida usa os sinais de confiança da busca por texto
+    score_type = "texto" if type == "hibrido" else type
+    
+    if exact_ids:
+        # Fast path: código exato resolvido no índice em memória, só busca por PK
+        # (mesmos produtos e ordem da faixa exata de CODE_MATCH_CTE)
+        params.update(ids=exact_ids, code_keys=code_keys(q))
+        search = dict(from_sql="FROM products p", where_sql="p.id = ANY(:ids)", tie_order=EXACT_ORDER_SQL)
+    elif type == "codigo":
+        # Busca por código - SKU e códigos originais via product_codes (índices)
+        params.update(code_match_params(q))
+        search = dict(
+            with_sql=f"WITH {CODE_MATCH_CTE}",
+            from_sql="FROM code_matches cm JOIN products p ON p.id = cm.product_id",
+            tie_order="cm.match_rank, p.title"
+        )
+    elif hybrid is not None:
+        # Busca híbrida: vizinhos no HNSW + full-text, fundidos por RRF
+        params.update(hybrid)
+        search = dict(
+            with_sql=f"WITH {HYBRID_MATCH_CTE}",
+            from_sql="FROM hybrid_hits hh JOIN products p ON p.id = hh.product_id",
+            tie_order="hh.rrf DESC, p.id",
+            rank_by_confidence=False
+        )
+    elif len(q.strip().split()) == 1:
+        # Busca por trecho para uma palavra (índices de trigramas)
+        params.update(substring_params(q))
+        search = dict(
+            with_sql=f"WITH {SUBSTRING_MATCH_CTE}",
+            from_sql="FROM substring_hits h JOIN products p ON p.id = h.product_id",
+            tie_order=SUBSTRING_ORDER_SQL
+        )
+    else:
+        # Busca full-text para múltiplas palavras (search_vector + GIN)
+        params.update(fts_params(q))
+        search = dict(from_sql="FROM products p", where_sql=FTS_MATCH_SQL, tie_order=f"{FTS_RANK_SQL} DESC, p.title")
+    
+    search = apply_filters(search, filters, params)
+    return search, params, score_type
+
 @router.get("/search")
 async def search_products_get(
     q: str,
     type: str = "texto",
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db)
+    format: str = "json",
+    facets: bool = True,
+    filters: SearchFilters = Depends(search_filters),
+    db: AsyncSession = Depends(get_async_db)
 ):
+    """
+    Busca paginada por confiança. Com format=ndjson|csv devolve todos os
+    resultados (a partir de skip) em streaming, sem paginação.
+    """
+    check_search_query(q)
+    limit = clamp_limit(limit)
+    if format != "json":
+        check_export_format(format)
+    else:
+        cached, cache_key = await search_cache.get("search", q, type, skip, limit, facets=facets, **filters_cache_key(filters))
+        if cached is not None:
+            if skip == 0:
+                search_events.record("search", query=q, results=cached_total(cached), source="search")
+            return cached
+    
     try:
         print(f"Busca aprimorada: q={q}, type={type}")
+        typed_q = q
         
-        if type == "codigo":
-            # Busca por código - incluindo SKU e códigos originais
-            query = text("""
-                SELECT id, sku, title, description, brand, category, image_urls, original_codes, base_price 
-                FROM products 
-                WHERE LOWER(sku) LIKE LOWER(:term) 
-                   OR LOWER(original_codes) LIKE LOWER(:term)
-                   -- Busca normalizada para códigos
-                   OR UPPER(REPLACE(REPLACE(REPLACE(original_codes, '-', ''), ' ', ''), '.', '')) 
-                      LIKE '%' || UPPER(REPLACE(REPLACE(REPLACE(:q, '-', ''), ' ', ''), '.', '')) || '%'
-                   OR UPPER(REPLACE(REPLACE(REPLACE(sku, '-', ''), ' ', ''), '.', '')) 
-                      LIKE '%' || UPPER(REPLACE(REPLACE(REPLACE(:q, '-', ''), ' ', ''), '.', '')) || '%'
-                ORDER BY 
-                    CASE 
-                        WHEN LOWER(sku) = LOWER(:exact) THEN 1
-                        WHEN LOWER(original_codes) LIKE LOWER(:exact_code) THEN 2
-                        WHEN LOWER(sku) LIKE LOWER(:term) THEN 3
-                        ELSE 4
-                    END,
-                    title
-                LIMIT :limit OFFSET :offset
-            """)
-            result = db.execute(query, {
-                "term": f"%{q}%", 
-                "exact": q,
-                "exact_code": f"% {q} %",
-                "q": q,
-                "limit": limit * 2, 
-                "offset": skip
-            })
-        else:
-            # Busca por texto - muito mais flexível
-            # Divide a query em palavras para busca mais inteligente
-            words = q.strip().split()
-            
-            if len(words) == 1:
-                # Busca simples para uma palavra
-                query = text("""
-                    SELECT id, sku, title, description, brand, category, image_urls, original_codes, base_price 
-                    FROM products 
-                    WHERE LOWER(title) LIKE LOWER(:term) 
-                       OR LOWER(description) LIKE LOWER(:term) 
-                       OR LOWER(sku) LIKE LOWER(:term)
-                       OR LOWER(brand) LIKE LOWER(:term)
-                       OR LOWER(original_codes) LIKE LOWER(:term)
-                    ORDER BY 
-                        CASE 
-                            WHEN LOWER(title) LIKE LOWER(:exact) THEN 1
-                            WHEN LOWER(title) LIKE LOWER(:start) THEN 2
-                            WHEN LOWER(sku) LIKE LOWER(:term) THEN 3
-                            WHEN LOWER(brand) LIKE LOWER(:term) THEN 4
-                            ELSE 5
-                        END,
-                        title
-                    LIMIT :limit OFFSET :offset
-                """)
-                result = db.execute(query, {
-                    "term": f"%{q}%",
-                    "exact": q,
-                    "start": f"{q}%",
-                    "limit": limit * 2, 
-                    "offset": skip
-                })
-            else:
-                # Busca inteligente para múltiplas palavras
-                # Cria condições para cada palavra
-                word_conditions = []
-                params = {"limit": limit * 2, "offset": skip}
-                
-                for i, word in enumerate(words):
-                    if len(word) > 2:  # Ignora palavras muito pequenas
-                        word_param = f"word_{i}"
-                        word_conditions.append(f"LOWER(title) LIKE LOWER(:{word_param})")
-                        word_conditions.append(f"LOWER(description) LIKE LOWER(:{word_param})")
-                        params[word_param] = f"%{word}%"
-                
-                # Query dinâmica para múltiplas palavras
-                conditions_sql = " OR ".join(word_conditions) if word_conditions else "1=1"
-                
-                # Conta quantas palavras encontrou para relevância
-                score_conditions = []
-                for param in params.keys():
-                    if param.startswith('word_'):
-                        score_conditions.append(f"(CASE WHEN LOWER(title) LIKE LOWER(:{param}) THEN 10 ELSE 0 END)")
-                        score_conditions.append(f"(CASE WHEN LOWER(description) LIKE LOWER(:{param}) THEN 5 ELSE 0 END)")
-                
-                query = text(f"""
-                    SELECT id, sku, title, description, brand, category, image_urls, original_codes, base_price,
-                           -- Score baseado em quantas palavras encontrou
-                           (CASE WHEN LOWER(title) LIKE LOWER(:full_term) THEN 100 ELSE 0 END +
-                            {' + '.join(score_conditions) if score_conditions else '0'}
-                           ) as relevance_score
-                    FROM products 
-                    WHERE ({conditions_sql})
-                       OR LOWER(title) LIKE LOWER(:full_term)
-                       OR LOWER(description) LIKE LOWER(:full_term)
-                    ORDER BY relevance_score DESC, title
-                    LIMIT :limit OFFSET :offset
-                """)
-                
-                params["full_term"] = f"%{q}%"
-                result = db.execute(query, params)
+        search, params, score_type = _search_plan(q, type, skip, limit, filters)
         
-        products = []
+        if format != "json":
+            return export_search(format, score_type, search, params, skip)
         
-        for row in result:
-            products.append({
-                "id": str(row.id),
-                "sku": row.sku,
-                "title": row.title,
-                "description": row.description,
-                "brand": {"name": row.brand} if row.brand else None,
-                "original_codes": row.original_codes,
-                "images": [{"url": url} for url in parse_image_urls(row.image_urls)],
-                "codes": parse_original_codes_to_array(row.original_codes),
-                "base_price": float(row.base_price) if row.base_price else None
-            })
+        if "query_vector" in params:
+            await db.execute(statement(EF_SEARCH_SQL), {"candidates": params["candidates"]})
         
-        products_with_confidence = enhance_products_with_confidence(products, q, type)
-        paginated_products = products_with_confidence[skip:skip + limit]
+        # Confiança calculada no banco: ordena, pagina e conta numa consulta só
+        rows = (await db.execute(statement(ranked_search_sql(score_type, f"{SEARCH_COLUMNS}, {PRODUCT_DOC_COLUMN}", **search)), params)).fetchall()
         
-        print(f"Produtos encontrados: {len(products_with_confidence)}")
+        # Nada encontrado: tenta de novo com as palavras corrigidas pelo dicionário
+        did_you_mean = None
+        if not rows and skip == 0 and type != "codigo":
+            corrected = spell_index.correct(q)
+            if corrected:
+                corrected_search, corrected_params, score_type = _search_plan(corrected, type, skip, limit, filters)
+                rows = (await db.execute(statement(ranked_search_sql(score_type, f"{SEARCH_COLUMNS}, {PRODUCT_DOC_COLUMN}", **corrected_search)), corrected_params)).fetchall()
+                if rows:
+                    logger.info("Busca corrigida: %s -> %s", q, corrected)
+                    q, search, params, did_you_mean = corrected, corrected_search, corrected_params, corrected
         
-        return {
-            "products": paginated_products,
-            "total": len(products_with_confidence),
+        counts = rows[0] if rows else None
+        if counts is None and skip > 0:
+            # Página além do fim: ainda informa o total
+            counts = (await db.execute(statement(ranked_search_sql(score_type, SEARCH_COLUMNS, count_only=True, **search)), params)).first()
+        stats = stats_from_counts(counts)
+        
+        # Todas as facetas numa consulta agrupada sobre o conjunto inteiro
+        facet_counts = None
+        if facets:
+            facet_counts = facets_from_rows(await db.execute(statement(facet_counts_sql(score_type, **search)), params))
+        
+        # Motivos só para as linhas da página
+        confidence = score_rows(rows, q, score_type)
+        products = [product_json(row.product_doc, confidence=confidence.confidence(i)) for i, row in enumerate(rows)]
+        
+        print(f"Produtos encontrados: {stats['total']}")
+        if skip == 0:
+            search_events.record("search", query=typed_q, target=did_you_mean, results=stats["total"], source="search")
+        
+        response = {
+            "products": products,
+            "total": stats["total"],
             "page": (skip // limit) + 1,
             "limit": limit,
-            "hasMore": len(products_with_confidence) > skip + limit,
-            "confidence_stats": get_confidence_stats(products_with_confidence)
+            "hasMore": stats["total"] > skip + limit,
+            "confidence_stats": stats,
+            "facets": facet_counts,
+            "did_you_mean": did_you_mean
         }
+        await search_cache.set(cache_key, response, total=stats["total"])
+        return ORJSONResponse(response)
         
     except Exception as e:
         print(f"ERRO na busca: {e}")
-        return {"products": [], "total": 0, "page": 1, "limit": limit, "hasMore": False, "confidence_stats": {"total": 0, "alto": 0, "medio": 0, "baixo": 0}}
+        return {"products": [], "total": 0, "page": 1, "limit": limit, "hasMore": False, "confidence_stats": dict(EMPTY_STATS)}
+
+# Formatos da busca por várias palavras de /normalized (palavras por consulta)
+WORD_BUCKETS = (1, 2, 4, 8)
+
+async def _normalized_text_rows(db: AsyncSession, q: str, skip: int, limit: int) -> List:
+    """Busca por texto de /normalized (trecho para uma palavra, todas as palavras para várias)"""
+    # Busca por texto usando a mesma lógica melhorada
+    words = q.strip().split()
+    
+    if len(words) == 1:
+        query = statement(f"""
+            WITH {SUBSTRING_MATCH_CTE}
+            SELECT {DOC_COLUMNS}
+            FROM substring_hits h
+            JOIN products p ON p.id = h.product_id
+            ORDER BY {SUBSTRING_ORDER_SQL}
+            LIMIT :limit OFFSET :offset
+        """)
+        result = await db.execute(query, {
+            **substring_params(q),
+            "limit": limit, 
+            "offset": skip
+        })
+    else:
+        # Para múltiplas palavras, busca que cada palavra apareça no título
+        # ou na descrição. Compara com as colunas normalizadas (sem acento),
+        # como a busca por trecho, para a query corrigida pelo dicionário
+        # também casar. Um LIKE por coluna e palavra: cada um usa o índice de
+        # trigramas da coluna (0004) e o planner combina os bitmaps
+        word_terms = list(dict.fromkeys(f"%{normalize_text(word)}%" for word in words if len(word) > 2))
+        full_term = f"%{normalize_text(q.strip())}%"
+        
+        if word_terms:
+            # Quantidade de palavras arredondada para 1/2/4/8 (repetindo a
+            # última; acima de 8 fica nas 8 primeiras): só 4 textos SQL
+            size = next(bucket for bucket in WORD_BUCKETS if bucket >= min(len(word_terms), WORD_BUCKETS[-1]))
+            word_terms = (word_terms + [word_terms[-1]] * size)[:size]
+            all_words = " AND ".join(
+                f"(title_norm LIKE :w{i} OR description_norm LIKE :w{i})" for i in range(size)
+            )
+            query = statement(f"""
+                SELECT id, product_doc::text AS product_doc
+                FROM products
+                WHERE ({all_words})
+                   OR title_norm LIKE :full_term
+                ORDER BY 
+                    CASE 
+                        WHEN title_norm LIKE :full_term THEN 1
+                        ELSE 2
+                    END,
+                    title
+                LIMIT :limit OFFSET :offset
+            """)
+            result = await db.execute(query, {
+                **{f"w{i}": term for i, term in enumerate(word_terms)},
+                "full_term": full_term,
+                "limit": limit,
+                "offset": skip
+            })
+        else:
+            # Fallback para busca simples
+            query = statement("""
+                SELECT id, product_doc::text AS product_doc
+                FROM products
+                WHERE title_norm LIKE :term
+                LIMIT :limit OFFSET :offset
+            """)
+            result = await db.execute(query, {"term": full_term, "limit": limit, "offset": skip})
+    return result.fetchall()
 
 @router.get("/normalized")
 async def search_products_normalized_simple(
@@ -359,135 +321,79 @@ async def search_products_normalized_simple(
     type: str = "codigo",
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Busca normalizada melhorada"""
+    limit = clamp_limit(limit)
+    cached, cache_key = await search_cache.get("normalized", q, type, skip, limit)
+    if cached is not None:
+        if skip == 0:
+            search_events.record("search", query=q, results=cached_total(cached), source="normalized")
+        return cached
+    
     try:
         print(f"Busca normalizada melhorada: q={q}, type={type}")
         
-        if type == "codigo":
-            # Normalização mais robusta para códigos
-            query = text("""
-                SELECT id, sku, title, description, brand, category, image_urls, original_codes, base_price 
-                FROM products 
-                WHERE 
-                    -- Busca normal
-                    LOWER(sku) LIKE LOWER(:term) 
-                    OR LOWER(original_codes) LIKE LOWER(:term)
-                    -- Busca normalizada (remove hífens, espaços, pontos)
-                    OR UPPER(REPLACE(REPLACE(REPLACE(REPLACE(original_codes, '-', ''), ' ', ''), '.', ''), '_', '')) 
-                       LIKE '%' || UPPER(REPLACE(REPLACE(REPLACE(REPLACE(:q, '-', ''), ' ', ''), '.', ''), '_', '')) || '%'
-                    OR UPPER(REPLACE(REPLACE(REPLACE(REPLACE(sku, '-', ''), ' ', ''), '.', ''), '_', '')) 
-                       LIKE '%' || UPPER(REPLACE(REPLACE(REPLACE(REPLACE(:q, '-', ''), ' ', ''), '.', ''), '_', '')) || '%'
-                ORDER BY 
-                    CASE 
-                        WHEN LOWER(sku) = LOWER(:q) THEN 1
-                        WHEN LOWER(original_codes) LIKE LOWER(:exact_code) THEN 2
-                        WHEN LOWER(sku) LIKE LOWER(:term) THEN 3
-                        ELSE 4
-                    END,
-                    title
+        exact_ids = code_index.lookup(q) if type == "codigo" else []
+        did_you_mean = None
+        
+        if exact_ids:
+            # Fast path: código exato resolvido no índice em memória, só busca por PK
+            # (mesmos produtos e ordem da faixa exata de CODE_MATCH_CTE)
+            query = statement(f"""
+                SELECT {DOC_COLUMNS}
+                FROM products p
+                WHERE p.id = ANY(:ids)
+                ORDER BY {EXACT_ORDER_SQL}
+                LIMIT :limit OFFSET :offset
+            """)
+            rows = (await db.execute(query, {"ids": exact_ids, "code_keys": code_keys(q), "limit": limit, "offset": skip})).fetchall()
+        elif type == "codigo":
+            # Normalização feita uma vez em product_codes.normalized_code (indexado)
+            query = statement(f"""
+                WITH {CODE_MATCH_CTE}
+                SELECT {DOC_COLUMNS}
+                FROM code_matches cm
+                JOIN products p ON p.id = cm.product_id
+                ORDER BY cm.match_rank, p.title
                 LIMIT :limit OFFSET :offset
             """)
             
-            result = db.execute(query, {
-                "term": f"%{q}%",
-                "q": q,
-                "exact_code": f"% {q} %",
+            rows = (await db.execute(query, {
+                **code_match_params(q),
                 "limit": limit,
                 "offset": skip
-            })
+            })).fetchall()
             
         else:
-            # Busca por texto usando a mesma lógica melhorada
-            words = q.strip().split()
+            rows = await _normalized_text_rows(db, q, skip, limit)
             
-            if len(words) == 1:
-                query = text("""
-                    SELECT id, sku, title, description, brand, category, image_urls, original_codes, base_price 
-                    FROM products 
-                    WHERE LOWER(title) LIKE LOWER(:term) 
-                       OR LOWER(description) LIKE LOWER(:term) 
-                       OR LOWER(sku) LIKE LOWER(:term)
-                       OR LOWER(brand) LIKE LOWER(:term)
-                    ORDER BY 
-                        CASE 
-                            WHEN LOWER(title) = LOWER(:q) THEN 1
-                            WHEN LOWER(title) LIKE LOWER(:start) THEN 2
-                            ELSE 3
-                        END,
-                        title
-                    LIMIT :limit OFFSET :offset
-                """)
-                result = db.execute(query, {
-                    "term": f"%{q}%", 
-                    "q": q,
-                    "start": f"{q}%",
-                    "limit": limit, 
-                    "offset": skip
-                })
-            else:
-                # Para múltiplas palavras, busca que cada palavra apareça
-                word_likes = []
-                params = {"limit": limit, "offset": skip}
-                
-                for i, word in enumerate(words):
-                    if len(word) > 2:
-                        param = f"word_{i}"
-                        word_likes.append(f"(LOWER(title) LIKE LOWER(:{param}) OR LOWER(description) LIKE LOWER(:{param}))")
-                        params[param] = f"%{word}%"
-                
-                if word_likes:
-                    conditions = " AND ".join(word_likes)
-                    query = text(f"""
-                        SELECT id, sku, title, description, brand, category, image_urls, original_codes, base_price 
-                        FROM products 
-                        WHERE {conditions}
-                           OR LOWER(title) LIKE LOWER(:full_term)
-                        ORDER BY 
-                            CASE 
-                                WHEN LOWER(title) LIKE LOWER(:full_term) THEN 1
-                                ELSE 2
-                            END,
-                            title
-                        LIMIT :limit OFFSET :offset
-                    """)
-                    params["full_term"] = f"%{q}%"
-                    result = db.execute(query, params)
-                else:
-                    # Fallback para busca simples
-                    query = text("""
-                        SELECT id, sku, title, description, brand, category, image_urls, original_codes, base_price 
-                        FROM products 
-                        WHERE LOWER(title) LIKE LOWER(:term)
-                        LIMIT :limit OFFSET :offset
-                    """)
-                    result = db.execute(query, {"term": f"%{q}%", "limit": limit, "offset": skip})
+            # Nada encontrado: tenta de novo com as palavras corrigidas pelo dicionário
+            if not rows and skip == 0:
+                corrected = spell_index.correct(q)
+                if corrected:
+                    rows = await _normalized_text_rows(db, corrected, skip, limit)
+                    if rows:
+                        logger.info("Busca corrigida: %s -> %s", q, corrected)
+                        did_you_mean = corrected
         
-        products = []
-        for row in result:
-            products.append({
-                "id": str(row.id),
-                "sku": row.sku,
-                "title": row.title,
-                "description": row.description,
-                "brand": {"name": row.brand} if row.brand else None,
-                "original_codes": row.original_codes,
-                "images": [{"url": url} for url in parse_image_urls(row.image_urls)],
-                "codes": parse_original_codes_to_array(row.original_codes),
-                "base_price": float(row.base_price) if row.base_price else None,
-                "confidence": {"score": 85, "level": "alto", "reasons": ["Match normalizado aprimorado"]}
-            })
+        normalized_confidence = {"score": 85, "level": "alto", "reasons": ["Match normalizado aprimorado"]}
+        products = [product_json(row.product_doc, confidence=normalized_confidence) for row in rows]
         
-        return {
+        response = {
             "success": True,
             "products": products,
             "total": len(products),
             "page": (skip // limit) + 1,
             "limit": limit,
             "hasMore": len(products) == limit,
-            "confidence_stats": {"total": len(products), "alto": len(products), "medio": 0, "baixo": 0}
+            "confidence_stats": {"total": len(products), "alto": len(products), "medio": 0, "baixo": 0},
+            "did_you_mean": did_you_mean
         }
+        if skip == 0:
+            search_events.record("search", query=q, target=did_you_mean, results=len(products), source="normalized")
+        await search_cache.set(cache_key, response, total=len(products))
+        return ORJSONResponse(response)
         
     except Exception as e:
         print(f"ERRO na busca normalizada: {e}")
@@ -498,28 +404,138 @@ async def search_products_normalized_simple(
             "error": str(e)
         }
 
+async def _bulk_resolve(codes: List[str], db: AsyncSession):
+    count = sum(1 for code in codes if code and code.strip())
+    if count > settings.bulk_codes_max:
+        raise HTTPException(status_code=400, detail=f"Máximo de {settings.bulk_codes_max} códigos por requisição ({count} enviados)")
+    
+    try:
+        logger.info("Resolução em lote: %d códigos", count)
+        return await resolve_codes(db, codes)
+    except Exception as e:
+        print(f"ERRO na resolução em lote: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro: {str(e)}")
+
+@router.post("/bulk-codes")
+async def bulk_codes(
+    request: BulkCodesRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Resolve uma lista de códigos SKU/OEM (correspondência exata) de uma vez"""
+    return await _bulk_resolve(request.codes, db)
+
+@router.post("/bulk-codes/upload")
+async def bulk_codes_upload(
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Resolve os códigos de uma planilha (.xlsx/.xls, primeira coluna) ou arquivo .csv/.txt"""
+    if not file.filename.lower().endswith(('.xlsx', '.xls', '.csv', '.txt')):
+        raise HTTPException(status_code=400, detail="Arquivo deve ser .xlsx, .xls, .csv ou .txt")
+    
+    content = await file.read()
+    try:
+        codes = parse_codes_file(file.filename, content)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erro ao ler arquivo: {str(e)}")
+    return await _bulk_resolve(codes, db)
+
+@router.post("/image")
+async def search_by_image(
+    file: UploadFile = File(...),
+    limit: int = 10,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Busca por imagem (SearchType.imagem): produtos com as imagens mais parecidas com a enviada"""
+    if file.content_type not in settings.allowed_image_types:
+        raise HTTPException(status_code=400, detail=f"Tipo de imagem não suportado: {file.content_type}")
+    content = await file.read()
+    if len(content) > settings.max_upload_size:
+        raise HTTPException(status_code=400, detail="Imagem maior que o limite de upload")
+    
+    try:
+        # Decodificar e redimensionar a imagem é CPU: fora do event loop
+        features = await asyncio.to_thread(compute_features, content)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Imagem inválida: {str(e)}")
+    
+    try:
+        matches = await asyncio.to_thread(image_index.search, features, clamp_limit(limit))
+        logger.info("Busca por imagem: %d produtos em %.1f ms", len(matches), image_index.last_query_ms)
+        
+        rows = {}
+        if matches:
+            query = statement(f"SELECT {DOC_COLUMNS} FROM products p WHERE p.id = ANY(:ids)")
+            rows = {row.id: row for row in await db.execute(query, {"ids": [product_id for product_id, _, _ in matches]})}
+        
+        products = []
+        stats = {"total": 0, "alto": 0, "medio": 0, "baixo": 0}
+        for product_id, distance, details in matches:
+            row = rows.get(product_id)
+            if row is None:
+                continue
+            similarity = round(1 - distance, 4)
+            score = int(round(similarity * 100))
+            confidence_level = "alto" if score >= 70 else "medio" if score >= 40 else "baixo"
+            stats["total"] += 1
+            stats[confidence_level] += 1
+            products.append(product_json(
+                row.product_doc,
+                confidence={"level": confidence_level, "score": score, "reasons": ["Imagem semelhante"]},
+                explain={"match_type": "imagem", "image_sim": similarity, **details}
+            ))
+        
+        return ORJSONResponse({
+            "products": products,
+            "total": len(products),
+            "limit": limit,
+            "confidence_stats": stats
+        })
+        
+    except Exception as e:
+        print(f"ERRO na busca por imagem: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro: {str(e)}")
+
+@router.post("")
+async def search_unified(query: SearchQuery, db: AsyncSession = Depends(get_async_db)):
+    """
+    Busca unificada (SearchQuery -> SearchResult): roda só os sinais do tipo
+    de consulta e combina com os pesos search_*_weight de Settings. Para
+    imagem, `valor` é a URL da imagem. timings_ms traz o custo de cada sinal.
+    """
+    try:
+        result = await search_engine.search(db, query, SEARCH_COLUMNS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"ERRO na busca unificada: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro: {str(e)}")
+    
+    logger.info("Busca unificada: tipo=%s, %d resultados, %s", query.consulta.tipo.value, len(result.hits), result.timings_ms)
+    results = [
+        SearchResult(product=row_to_product(hit.row), confidence=hit.confidence, nivel=hit.nivel, explain=hit.explain)
+        for hit in result.hits
+    ]
+    return {
+        "results": [r.model_dump(exclude_none=True) for r in results],
+        "total": len(results),
+        "signals": result.signals,
+        "weights": {signal: result.weights[signal] for signal in result.signals},
+        "timings_ms": result.timings_ms
+    }
+
 @router.get("/{product_id}")
 async def get_product(
     product_id: str = Path(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        query = text("SELECT id, sku, title, description, brand, category, image_urls, original_codes, base_price FROM products WHERE id = :id OR sku = :sku LIMIT 1")
-        result = db.execute(query, {"id": product_id, "sku": product_id})
-        row = result.first()
+        # Memória local -> Redis -> banco (por id ou por SKU)
+        doc = await product_cache.get(db, product_id)
         
-        if row:
-            return {
-                "id": str(row.id),
-                "sku": row.sku,
-                "title": row.title,
-                "description": row.description,
-                "brand": {"name": row.brand} if row.brand else None,
-                "original_codes": row.original_codes,
-                "images": [{"url": url} for url in parse_image_urls(row.image_urls)],
-                "codes": parse_original_codes_to_array(row.original_codes),
-                "base_price": float(row.base_price) if row.base_price else None
-            }
+        if doc is not None:
+            search_events.record("product_view", product_doc=doc, source="search")
+            return ORJSONResponse(product_json(doc))
         raise HTTPException(status_code=404, detail="Produto nao encontrado")
         
     except HTTPException:
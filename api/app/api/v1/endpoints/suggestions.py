@@ -1,270 +1,357 @@
 # app/api/v1/endpoints/suggestions.py
+import asyncio
+import heapq
+import logging
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text, func
-from typing import List, Optional
-import re
-from app.core.database import get_db
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, get_async_db
 from app.models.product import Product
+from app.schemas.search import SuggestionClick
+from app.services.autocomplete import autocomplete
+from app.services.code_index import code_index, sku_keys
+from app.services.search_cache import search_cache
+from app.services.search_events import search_events
+from app.services.sku_correction import sku_corrector
+from app.services.text_search import substring_params
+from app.services.trending import trending
+from app.utils.sku import SKUNormalizer
+from app.utils.text import bounded_edit_distance, normalize_code
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-class SKUNormalizer:
-    """Normalizador de SKU para Python backend"""
-    
-    @staticmethod
-    def normalize_sku(input_sku: str) -> List[str]:
-        """Normaliza SKU em diferentes variações"""
-        if not input_sku:
-            return []
-        
-        variations = []
-        clean = input_sku.strip().upper()
-        variations.append(clean)
-        
-        # RV401031 → RV0401.0031
-        if re.match(r'^RV\d{7,8}$', clean):
-            digits = clean[2:]
-            if len(digits) == 7:
-                formatted = f"RV{digits[:4]}.{digits[4:]}"
-                variations.append(formatted)
-                # Com zero à esquerda
-                with_zero = f"RV0{digits[:3]}.{digits[3:]}"
-                variations.append(with_zero)
-            elif len(digits) == 8:
-                formatted = f"RV{digits[:4]}.{digits[4:]}"
-                variations.append(formatted)
-        
-        # Adicionar/remover pontos
-        if '.' in clean:
-            without_dots = clean.replace('.', '')
-            variations.append(without_dots)
-        elif re.match(r'^RV\d{8}$', clean):
-            digits = clean[2:]
-            with_dot = f"RV{digits[:4]}.{digits[4:]}"
-            variations.append(with_dot)
-        
-        return list(set(variations))
-    
-    @staticmethod
-    def levenshtein_distance(s1: str, s2: str) -> int:
-        """Calcula distância de Levenshtein"""
-        if len(s1) < len(s2):
-            return SKUNormalizer.levenshtein_distance(s2, s1)
-        
-        if len(s2) == 0:
-            return len(s1)
-        
-        previous_row = list(range(len(s2) + 1))
-        for i, c1 in enumerate(s1):
-            current_row = [i + 1]
-            for j, c2 in enumerate(s2):
-                insertions = previous_row[j + 1] + 1
-                deletions = current_row[j] + 1
-                substitutions = previous_row[j] + (c1 != c2)
-                current_row.append(min(insertions, deletions, substitutions))
-            previous_row = current_row
-        
-        return previous_row[-1]
+# Partes de /suggestions: cada uma devolve sua lista de sugestões e roda
+# como tarefa separada; as que ainda dependem do banco usam sessão própria
+# do pool para poderem rodar ao mesmo tempo
 
-@router.get("/suggestions")
-async def get_smart_suggestions(
-    q: str = Query(..., description="Query de busca"),
-    limit: int = Query(10, ge=1, le=20),
-    db: Session = Depends(get_db)
-):
-    """Retorna sugestões inteligentes baseadas na query"""
+async def _similar_stage(query: str, limit: int) -> List[dict]:
+    """1. SKUs similares (match exato ou próximo)"""
+    if code_index.ready:
+        # Match exato de SKU/variação/OEM direto no índice em memória
+        variation_keys = set(sku_keys(query))
+        similar_products = []
+        for product_id in code_index.lookup(query):
+            product = code_index.product(product_id)
+            if not product:
+                continue
+            sku, title = product
+            if sku.upper() == query.upper():
+                confidence = 1.0
+            elif normalize_code(sku) in variation_keys:
+                confidence = 0.9
+            else:
+                confidence = 0.8  # encontrado por código OEM
+            similar_products.append((confidence, sku, title))
+        
+        similar_products.sort(key=lambda x: x[0], reverse=True)
+        return [
+            {"text": sku, "type": "similar", "confidence": confidence, "metadata": {"title": title}}
+            for confidence, sku, title in similar_products[:limit // 2]
+        ]
     
-    if not q or len(q.strip()) < 2:
-        return {"suggestions": []}
+    sku_variations = SKUNormalizer.normalize_sku(query)
+    if not sku_variations:
+        return []
     
-    suggestions = []
-    query = q.strip()
+    # Buscar variações normalizadas
+    placeholders = ','.join([f':var{i}' for i in range(len(sku_variations))])
+    params = {f'var{i}': var for i, var in enumerate(sku_variations)}
     
-    try:
-        # 1. Buscar SKUs similares (match exato ou próximo)
-        sku_variations = SKUNormalizer.normalize_sku(query)
-        
-        if sku_variations:
-            # Buscar variações normalizadas
-            placeholders = ','.join([f':var{i}' for i in range(len(sku_variations))])
-            params = {f'var{i}': var for i, var in enumerate(sku_variations)}
-            
-            similar_products = db.execute(
-                text(f"""
-                    SELECT DISTINCT sku, title, 
-                           CASE 
-                               WHEN UPPER(sku) = UPPER(:original) THEN 1.0
-                               WHEN UPPER(sku) IN ({placeholders}) THEN 0.9
-                               ELSE 0.8
-                           END as confidence
-                    FROM products 
-                    WHERE UPPER(sku) IN ({placeholders}) OR UPPER(sku) = UPPER(:original)
-                    ORDER BY confidence DESC
-                    LIMIT :limit
-                """),
-                {**params, 'original': query, 'limit': limit // 2}
-            ).fetchall()
-            
-            for product in similar_products:
-                suggestions.append({
-                    "text": product.sku,
-                    "type": "similar",
-                    "confidence": float(product.confidence),
-                    "metadata": {"title": product.title}
-                })
-        
-        # 2. Buscar por match parcial em SKU, título ou descrição
-        partial_matches = db.execute(
-            text("""
-                SELECT sku, title,
+    async with AsyncSessionLocal() as db:
+        similar_products = (await db.execute(
+            text(f"""
+                SELECT DISTINCT sku, title, 
                        CASE 
-                           WHEN UPPER(sku) LIKE UPPER(:exact) THEN 1.0
-                           WHEN UPPER(sku) LIKE UPPER(:partial) THEN 0.8
-                           WHEN UPPER(title) LIKE UPPER(:partial) THEN 0.6
-                           WHEN UPPER(description) LIKE UPPER(:partial) THEN 0.4
-                           ELSE 0.2
+                           WHEN UPPER(sku) = UPPER(:original) THEN 1.0
+                           WHEN UPPER(sku) IN ({placeholders}) THEN 0.9
+                           ELSE 0.8
                        END as confidence
                 FROM products 
-                WHERE UPPER(sku) LIKE UPPER(:partial)
-                   OR UPPER(title) LIKE UPPER(:partial)
-                   OR UPPER(description) LIKE UPPER(:partial)
-                ORDER BY confidence DESC, sku
+                WHERE UPPER(sku) IN ({placeholders}) OR UPPER(sku) = UPPER(:original)
+                ORDER BY confidence DESC
                 LIMIT :limit
             """),
-            {
-                'exact': f'{query}%',
-                'partial': f'%{query}%',
-                'limit': limit
-            }
-        ).fetchall()
-        
-        for match in partial_matches:
-            # Evitar duplicatas
-            if not any(s['text'] == match.sku for s in suggestions):
-                suggestions.append({
-                    "text": match.sku,
-                    "type": "partial",
-                    "confidence": float(match.confidence),
-                    "metadata": {"title": match.title}
-                })
-        
-        # 3. Buscar produtos populares (mais consultados)
-        # Nota: Você precisaria de uma tabela de analytics para isso
-        # Por ora, usar produtos com mais dados como proxy
-        popular_products = db.execute(
+            {**params, 'original': query, 'limit': limit // 2}
+        )).fetchall()
+    
+    return [
+        {"text": product.sku, "type": "similar", "confidence": float(product.confidence), "metadata": {"title": product.title}}
+        for product in similar_products
+    ]
+
+async def _completion_stage(query: str, limit: int) -> List[dict]:
+    """2-3. Match parcial por prefixo e produtos populares"""
+    if autocomplete.ready:
+        # SKUs, variações, OEM, títulos e palavras em memória, já ordenados
+        # por tipo e popularidade, sem ir ao banco
+        return autocomplete.complete(query, limit)
+    
+    # Match parcial em SKU, título ou descrição e produtos populares numa
+    # ida só ao banco. Popularidade: visualizações e cliques agregados em
+    # product_stats_daily, com os produtos com mais dados no desempate
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
             text("""
-                SELECT sku, title, 0.5 as confidence
-                FROM products 
-                WHERE (
-                    base_price IS NOT NULL 
-                    AND image_urls IS NOT NULL 
-                    AND description IS NOT NULL
+                (
+                    SELECT sku, title, 'partial' AS type,
+                           CASE 
+                               WHEN normalize_code(sku) LIKE :code_prefix THEN 1.0
+                               WHEN normalize_code(sku) LIKE :code_term THEN 0.8
+                               WHEN title_norm LIKE :norm_term THEN 0.6
+                               WHEN description_norm LIKE :norm_term THEN 0.4
+                               ELSE 0.2
+                           END as confidence
+                    FROM products 
+                    WHERE normalize_code(sku) LIKE :code_term
+                       OR title_norm LIKE :norm_term
+                       OR description_norm LIKE :norm_term
+                    ORDER BY confidence DESC, word_similarity(:norm_exact, title_norm) DESC, sku
+                    LIMIT :limit
                 )
-                AND (
-                    UPPER(sku) LIKE UPPER(:partial)
-                    OR UPPER(title) LIKE UPPER(:partial)
+                UNION ALL
+                (
+                    SELECT sku, title, 'popular' AS type, 0.5 as confidence
+                    FROM products p
+                    LEFT JOIN (
+                        SELECT product_id, SUM(views + clicks) AS hits
+                        FROM product_stats_daily
+                        WHERE day >= current_date - :popularity_days
+                        GROUP BY product_id
+                    ) ps ON ps.product_id = p.id
+                    WHERE (
+                        base_price IS NOT NULL 
+                        AND image_urls IS NOT NULL 
+                        AND description IS NOT NULL
+                    )
+                    AND (
+                        normalize_code(sku) LIKE :code_term
+                        OR title_norm LIKE :norm_term
+                    )
+                    ORDER BY 
+                        COALESCE(ps.hits, 0) DESC,
+                        CASE WHEN base_price IS NOT NULL THEN 1 ELSE 0 END +
+                        CASE WHEN image_urls IS NOT NULL THEN 1 ELSE 0 END +
+                        CASE WHEN description IS NOT NULL THEN 1 ELSE 0 END DESC
+                    LIMIT :popular_limit
                 )
-                ORDER BY 
-                    CASE WHEN base_price IS NOT NULL THEN 1 ELSE 0 END +
-                    CASE WHEN image_urls IS NOT NULL THEN 1 ELSE 0 END +
-                    CASE WHEN description IS NOT NULL THEN 1 ELSE 0 END DESC
-                LIMIT :limit
             """),
             {
-                'partial': f'%{query}%',
-                'limit': max(3, limit // 3)
+                **substring_params(query),
+                'code_prefix': f'{normalize_code(query)}%',
+                'limit': limit,
+                'popular_limit': max(3, limit // 3),
+                'popularity_days': settings.product_popularity_days
             }
-        ).fetchall()
+        )).fetchall()
+    
+    # Parciais antes dos populares, como eram consultados
+    rows.sort(key=lambda row: row.type != "partial")
+    return [
+        {"text": row.sku, "type": row.type, "confidence": float(row.confidence), "metadata": {"title": row.title}}
+        for row in rows
+    ]
+
+async def _correction_stage(query: str) -> List[dict]:
+    """4. Correções baseadas em distância de edição"""
+    max_distance = min(3, len(query) // 3)
+    
+    if sku_corrector.ready:
+        # BK-tree sobre todos os SKUs do catálogo (formas normalizadas); em
+        # thread para o prazo de /suggestions valer também aqui
+        matches = await asyncio.to_thread(sku_corrector.lookup, query, max_distance, 3)
+    else:
+        async with AsyncSessionLocal() as db:
+            all_skus = (await db.execute(
+                text("SELECT DISTINCT sku FROM products WHERE sku IS NOT NULL LIMIT 1000")
+            )).fetchall()
         
-        for product in popular_products:
-            if not any(s['text'] == product.sku for s in suggestions):
-                suggestions.append({
-                    "text": product.sku,
-                    "type": "popular", 
-                    "confidence": float(product.confidence),
-                    "metadata": {"title": product.title}
-                })
+        matches = []
+        for sku_row in all_skus:
+            distance = bounded_edit_distance(query.upper(), sku_row.sku.upper(), max_distance, transpositions=False)
+            # Aceitar correções com distância pequena
+            if 1 <= distance <= max_distance:
+                matches.append((sku_row.sku, distance))
+        matches = heapq.nsmallest(3, matches, key=lambda match: match[1])
+    
+    return [
+        {
+            "text": sku,
+            "type": "correction",
+            "confidence": max(0.1, 1.0 - (distance / len(query))),
+            "metadata": {"distance": distance}
+        }
+        for sku, distance in matches
+    ]
+
+@router.get("/suggestions")
+async def get_smart_suggestions(
+    q: str = Query(..., description="Query de busca"),
+    limit: int = Query(10, ge=1, le=20)
+):
+    """Retorna sugestões inteligentes baseadas na query"""
+    
+    if not q or len(q.strip()) < 2:
+        return {"suggestions": []}
+    
+    query = q.strip()
+    
+    cached, cache_key = await search_cache.get("suggestions", query, limit=limit)
+    if cached is not None:
+        return cached
+    
+    try:
+        stages = {
+            "similar": asyncio.create_task(_similar_stage(query, limit)),
+            "completion": asyncio.create_task(_completion_stage(query, limit)),
+        }
+        if len(query) > 4:  # Correções só para queries maiores
+            stages["correction"] = asyncio.create_task(_correction_stage(query))
         
-        # 4. Calcular correções baseadas em distância de edição
-        if len(query) > 4:  # Só para queries maiores
-            all_skus = db.execute(
-                text("SELECT DISTINCT sku FROM products WHERE sku IS NOT NULL LIMIT 1000")
-            ).fetchall()
-            
-            corrections = []
-            for sku_row in all_skus:
-                sku = sku_row.sku
-                distance = SKUNormalizer.levenshtein_distance(query.upper(), sku.upper())
-                
-                # Aceitar correções com distância pequena
-                if 1 <= distance <= min(3, len(query) // 3):
-                    corrections.append({
-                        "text": sku,
-                        "type": "correction",
-                        "confidence": max(0.1, 1.0 - (distance / len(query))),
-                        "metadata": {"distance": distance}
-                    })
-            
-            # Ordenar correções por confiança
-            corrections.sort(key=lambda x: x['confidence'], reverse=True)
-            suggestions.extend(corrections[:3])
+        # Orçamento de latência: o que não terminou no prazo fica de fora
+        done, pending = await asyncio.wait(stages.values(), timeout=settings.suggestions_budget_ms / 1000)
+        for task in pending:
+            task.cancel()
         
-        # Remover duplicatas e ordenar por confiança
-        seen = set()
-        unique_suggestions = []
-        for suggestion in suggestions:
-            text_lower = suggestion['text'].lower()
-            if text_lower not in seen:
-                seen.add(text_lower)
-                unique_suggestions.append(suggestion)
+        # Remover duplicatas (a primeira ocorrência, na ordem das etapas, fica)
+        unique_suggestions: Dict[str, dict] = {}
+        dropped_stages = []
+        for name, task in stages.items():
+            if task not in done:
+                dropped_stages.append(name)
+                continue
+            if task.exception() is not None:
+                logger.warning("Erro na etapa %s das sugestões: %s", name, task.exception())
+                dropped_stages.append(name)
+                continue
+            for suggestion in task.result():
+                unique_suggestions.setdefault(suggestion['text'].lower(), suggestion)
         
-        # Ordenar por confiança e limitar resultados
-        unique_suggestions.sort(key=lambda x: x['confidence'], reverse=True)
-        final_suggestions = unique_suggestions[:limit]
+        # Maiores confianças (estável nos empates) e limitar resultados
+        final_suggestions = heapq.nlargest(limit, unique_suggestions.values(), key=lambda x: x['confidence'])
         
-        return {
+        response = {
             "suggestions": final_suggestions,
             "query": query,
             "total": len(final_suggestions)
         }
+        if dropped_stages:
+            # Resposta incompleta não vai para o cache
+            response["dropped_stages"] = dropped_stages
+        else:
+            await search_cache.set(cache_key, response)
+        return response
         
     except Exception as e:
         print(f"Erro ao gerar sugestões: {e}")
         return {"suggestions": [], "error": str(e)}
 
+def _rollup_window(hours: int) -> Tuple[str, str]:
+    """Agregado por hora para janelas curtas (até 48h), por dia para as longas"""
+    if hours <= 48:
+        return "search_stats_hourly", "bucket >= now() - make_interval(hours => :hours)"
+    return "search_stats_daily", "day >= (now() - make_interval(hours => :hours))::date"
+
 @router.get("/popular-searches")
 async def get_popular_searches(
     limit: int = Query(10, ge=1, le=50),
-    db: Session = Depends(get_db)
+    hours: Optional[int] = Query(None, ge=1, le=24 * 90, description="Janela dos agregados; sem ela, o que está em alta agora"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Retorna buscas populares (produtos mais completos como proxy)"""
+    """Buscas em alta agora (contadores decaídos no Redis) ou as mais feitas numa janela (search_events agregados)"""
     
     try:
-        popular = db.execute(
-            text("""
-                SELECT sku, title, 
-                       (CASE WHEN base_price IS NOT NULL THEN 1 ELSE 0 END +
-                        CASE WHEN image_urls IS NOT NULL THEN 1 ELSE 0 END +
-                        CASE WHEN description IS NOT NULL THEN 1 ELSE 0 END) as completeness_score
-                FROM products 
-                WHERE sku IS NOT NULL
-                ORDER BY completeness_score DESC, sku
+        if hours is None:
+            # Top-k direto dos sorted sets: O(log N + k), sem varrer tabela
+            queries = await trending.top("queries", limit)
+            if queries:
+                return {
+                    "popular_searches": [
+                        {"query": item["name"], "score": item["score"]}
+                        for item in queries
+                    ],
+                    "popular_products": [
+                        {"sku": item["member"], "title": item["name"], "score": item["score"]}
+                        for item in await trending.top("products", limit) or []
+                    ],
+                    "source": "trending"
+                }
+            # Redis fora ou sem eventos recentes: agregados da janela padrão
+            hours = settings.popular_searches_days * 24
+        
+        table, window = _rollup_window(hours)
+        popular = (await db.execute(
+            text(f"""
+                SELECT query_norm, MIN(query) AS query, SUM(searches) AS searches, SUM(clicks) AS clicks
+                FROM {table}
+                WHERE {window}
+                GROUP BY query_norm
+                HAVING SUM(searches) > SUM(zero_results)
+                ORDER BY SUM(searches) DESC, query_norm
                 LIMIT :limit
             """),
-            {"limit": limit}
-        ).fetchall()
+            {"hours": hours, "limit": limit}
+        )).fetchall()
         
         return {
             "popular_searches": [
                 {
-                    "sku": item.sku,
-                    "title": item.title,
-                    "score": item.completeness_score
+                    "query": item.query,
+                    "searches": item.searches,
+                    "clicks": item.clicks,
+                    "score": item.searches
                 }
                 for item in popular
+            ],
+            "source": "analytics"
+        }
+        
+    except Exception as e:
+        return {"popular_searches": [], "error": str(e)}
+
+@router.get("/zero-results")
+async def get_zero_result_searches(
+    limit: int = Query(20, ge=1, le=200),
+    hours: int = Query(settings.popular_searches_days * 24, ge=1, le=24 * 90),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Buscas que não encontraram nada na janela, das mais frequentes para as menos"""
+    
+    try:
+        table, window = _rollup_window(hours)
+        rows = (await db.execute(
+            text(f"""
+                SELECT query_norm, MIN(query) AS query, SUM(zero_results) AS zero_results, SUM(searches) AS searches
+                FROM {table}
+                WHERE {window}
+                GROUP BY query_norm
+                HAVING SUM(zero_results) > 0
+                ORDER BY SUM(zero_results) DESC, query_norm
+                LIMIT :limit
+            """),
+            {"hours": hours, "limit": limit}
+        )).fetchall()
+        
+        return {
+            "zero_results": [
+                {"query": row.query, "zero_results": row.zero_results, "searches": row.searches}
+                for row in rows
             ]
         }
         
     except Exception as e:
-        return {"popular_searches": [], "error": str(e)}
\ No newline at end of file
+        return {"zero_results": [], "error": str(e)}
+
+@router.post("/click")
+async def record_suggestion_click(click: SuggestionClick):
+    """Registra a sugestão escolhida (conta como busca popular e, com product_id, como clique no produto)"""
+    search_events.record(
+        "suggestion_click",
+        query=click.text,
+        target=click.query,
+        product_id=click.product_id,
+        source="suggestions"
+    )
+    return {"recorded": True}
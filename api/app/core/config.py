@@ -12,6 +12,7 @@ class Settings(BaseSettings):
     # API
     api_v1_str: str = "/api/v1"
     secret_key: str = secrets.token_urlsafe(32)
+    max_page_size: int = 100
 
     # JWT
     jwt_secret_key: str = secrets.token_urlsafe(32)
@@ -29,12 +30,36 @@ class Settings(BaseSettings):
         "REDIS_URL",
         "redis://redis:6379/0"  # redis:6379 ao invés de localhost:6379
     )
+    redis_timeout_seconds: float = 0.2
+    # Formatos de SQL em cache (TextClause) e prepared statements por conexão (asyncpg)
+    statement_cache_size: int = 500
+
+    # Cache de busca (Redis)
+    search_cache_enabled: bool = True
+    search_cache_ttl_seconds: int = 300
+
+    # Cache do detalhe do produto (memória local + Redis)
+    product_cache_enabled: bool = True
+    product_cache_size: int = 10_000
+    product_cache_ttl_seconds: int = 120
+    product_cache_redis_ttl_seconds: int = 3600
+    product_cache_version_check_seconds: float = 1.0
+    # Detalhe de vários produtos numa consulta (GET/POST /products/batch)
+    product_batch_max: int = 500
 
     # Upload
     max_upload_size: int = 10 * 1024 * 1024  # 10MB
     upload_path: str = "/app/uploads"
     allowed_image_types: List[str] = ["image/jpeg", "image/png", "image/webp"]
 
+    # Busca por imagem (image_features + índice em memória)
+    image_cache_path: str = "/app/uploads/image_cache"
+    image_download_timeout_seconds: float = 10.0
+    # Hosts de onde a busca por imagem pode baixar URLs que não são image_urls de produtos
+    image_url_allowlist: List[str] = []
+    image_index_enabled: bool = True
+    image_index_refresh_seconds: int = 60
+
     # Search weights
     search_code_exact_weight: float = 0.55
     search_code_fuzzy_weight: float = 0.15
@@ -43,6 +68,67 @@ class Settings(BaseSettings):
     search_app_weight: float = 0.03
     search_brand_weight: float = 0.02
 
+    # Embeddings locais (pgvector) e busca híbrida
+    embedding_dim: int = 256  # tamanho da coluna criada pela migração 0005; conferido no startup
+    embedding_batch_size: int = 500
+    hybrid_candidates: int = 100
+
+    # Resolução de códigos em lote (POST /search/bulk-codes)
+    bulk_codes_max: int = 10_000
+    bulk_codes_chunk_size: int = 1000
+
+    # Índice de códigos em memória (SKU/OEM)
+    code_index_enabled: bool = True
+    code_index_max_keys: int = 500_000
+    code_index_refresh_seconds: int = 30
+
+    # LISTEN catalog_changes: invalida os caches a cada escrita no catálogo
+    catalog_watch_retry_seconds: int = 5
+    # Poda de catalog_changes: bem acima do maior intervalo de refresh dos índices
+    catalog_changes_keep_seconds: int = 3600
+    catalog_changes_prune_seconds: int = 300
+
+    # Correção ortográfica (SymSpell sobre títulos e descrições)
+    spell_index_enabled: bool = True
+    spell_max_edit_distance: int = 2
+    spell_prefix_length: int = 7
+    spell_index_refresh_seconds: int = 60
+
+    # Autocomplete em memória (/suggestions)
+    autocomplete_enabled: bool = True
+    autocomplete_top_k: int = 20  # limite máximo de /suggestions
+    autocomplete_heavy_prefix: int = 256  # acima disso o prefixo guarda o top-k pronto
+    autocomplete_refresh_seconds: int = 30
+
+    # Correção de SKUs digitados errado (BK-tree, /suggestions)
+    sku_correction_enabled: bool = True
+    sku_correction_max_distance: int = 3
+    sku_correction_refresh_seconds: int = 60
+
+    # Prazo de /suggestions: etapas que não terminarem nele ficam de fora
+    suggestions_budget_ms: int = 150
+
+    # Eventos de busca (buffer em memória -> search_events -> agregados)
+    search_events_enabled: bool = True
+    search_events_buffer_size: int = 100_000
+    search_events_batch_size: int = 5000
+    search_events_flush_seconds: int = 5
+    search_rollup_seconds: int = 300
+    search_events_retention_days: int = 30
+    search_stats_hourly_retention_days: int = 14
+    popular_searches_days: int = 7
+    product_popularity_days: int = 30
+
+    # Buscas e produtos em alta (Redis: sorted sets + count-min sketch)
+    trending_enabled: bool = True
+    trending_half_life_seconds: int = 3600
+    trending_epoch_half_lives: int = 8  # chaves novas a cada 8 meias-vidas
+    trending_max_members: int = 1000  # por sorted set; o resto fica no sketch
+    trending_cms_width: int = 8192
+    trending_cms_depth: int = 4
+    trending_buffer_size: int = 100_000
+    trending_flush_seconds: int = 1
+
     class Config:
         env_file = ".env"
         case_sensitive = False
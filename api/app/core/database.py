@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
@@ -29,6 +30,33 @@ else:
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+def async_database_url(url: str) -> str:
+    """Mesma URL com driver assíncrono (asyncpg / aiosqlite)"""
+    if url.startswith("sqlite"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    scheme, rest = url.split("://", 1)
+    return f"{scheme.split('+')[0]}+asyncpg://{rest}"
+
+# Engine assíncrono para os endpoints: as consultas não bloqueiam o event loop.
+# O engine síncrono acima continua para Celery, scripts e threads de fundo.
+if settings.database_url.startswith("sqlite"):
+    async_engine = create_async_engine(
+        async_database_url(settings.database_url),
+        poolclass=StaticPool,
+        echo=settings.environment == "development"
+    )
+else:
+    async_engine = create_async_engine(
+        async_database_url(settings.database_url),
+        pool_size=10,
+        max_overflow=20,
+        pool_pre_ping=True,
+        connect_args={"prepared_statement_cache_size": settings.statement_cache_size},
+        echo=settings.environment == "development"
+    )
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
@@ -36,3 +64,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """Dependency: sessão assíncrona (AsyncSession)"""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,8 +1,9 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import logging
 import time
 import os
@@ -10,6 +11,16 @@ import os
 from app.core.config import settings
 from app.core.database import engine
 from app.api.v1.api import api_router
+from app.services.autocomplete import start_autocomplete
+from app.services.catalog_watch import start_catalog_watch, stop_catalog_watch
+from app.services.code_index import start_code_index
+from app.services.embeddings import check_embedding_dim
+from app.services.image_index import start_image_index
+from app.services.search_cache import close_async_redis
+from app.services.search_events import start_search_events, stop_search_events
+from app.services.sku_correction import start_sku_corrector
+from app.services.spell_index import start_spell_index
+from app.services.trending import start_trending
 
 # Configure logging
 logging.basicConfig(
@@ -23,6 +34,7 @@ app = FastAPI(
     title="Catálogo Log Parts API",
     description="Sistema de busca e catálogo de peças automotivas com IA",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     openapi_url=f"{settings.api_v1_str}/openapi.json" if settings.environment == "development" else None,
 )
 
@@ -39,6 +51,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Request timing middleware
@@ -66,6 +79,25 @@ async def internal_error_handler(request: Request, exc):
         content={"detail": "Erro interno do servidor"}
     )
 
+# Startup
+@app.on_event("startup")
+async def startup():
+    await asyncio.to_thread(check_embedding_dim)
+    await start_catalog_watch()
+    await start_code_index()
+    await start_image_index()
+    await start_spell_index()
+    await start_autocomplete()
+    await start_sku_corrector()
+    await start_search_events()
+    await start_trending()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_catalog_watch()
+    await stop_search_events()
+    await close_async_redis()
+
 # Health check
 @app.get("/healthz")
 async def health_check():
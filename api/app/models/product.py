@@ -1,4 +1,9 @@
-from sqlalchemy import Column, String, Text, Numeric, Integer
+from sqlalchemy import Column, String, Text, Numeric, Integer, BigInteger, DateTime, ForeignKey, Computed, REAL, JSON
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+from sqlalchemy.orm import deferred
+from pgvector.sqlalchemy import Vector
+from sqlalchemy.sql import func
+from app.core.config import settings
 from app.core.database import Base
 
 class Product(Base):
@@ -19,5 +24,66 @@ class Product(Base):
     ncm = Column(String(20))
     product_type = Column(String(10))
 
+    # Busca full-text (coluna gerada no banco, migração 0003)
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('portuguese_unaccent', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('portuguese_unaccent', coalesce(brand, '') || ' ' || coalesce(category, '')), 'B') || "
+        "setweight(to_tsvector('portuguese_unaccent', coalesce(description, '')), 'C')",
+        persisted=True
+    )))
+
+    # Texto normalizado para busca por trecho (colunas geradas, migração 0004)
+    title_norm = deferred(Column(Text, Computed("normalize_text(title)", persisted=True)))
+    description_norm = deferred(Column(Text, Computed("normalize_text(description)", persisted=True)))
+
+    # Produto no formato da API, montado no banco (coluna gerada, migração 0007)
+    product_doc = deferred(Column(JSON, Computed(
+        "build_product_doc(id, sku, title, description, brand, original_codes, image_urls, base_price)",
+        persisted=True
+    )))
+
     def __repr__(self):
         return f"<Product(sku='{self.sku}', title='{self.title}')>"
+
+class ProductCode(Base):
+    """Um código de products.original_codes por linha (mantido por trigger no banco)"""
+    __tablename__ = "product_codes"
+    
+    id = Column(BigInteger, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    code = Column(Text, nullable=False)
+    code_type = Column(String(10), nullable=False, default="OEM")
+    normalized_code = Column(Text, nullable=False)  # normalize_code(code)
+    position = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ProductCode(product_id={self.product_id}, code='{self.code}')>"
+
+class ProductEmbedding(Base):
+    """Embedding de título/descrição/aplicações (app/services/embeddings.py)"""
+    __tablename__ = "product_embeddings"
+    
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    embedding = Column(Vector(settings.embedding_dim), nullable=False)
+    content_hash = Column(Text, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ProductEmbedding(product_id={self.product_id})>"
+
+class ImageFeature(Base):
+    """Hashes perceptuais e descritor de uma imagem (app/services/image_features.py)"""
+    __tablename__ = "image_features"
+    
+    id = Column(BigInteger, primary_key=True)
+    source = Column(Text, nullable=False, unique=True)  # caminho em uploads/ ou URL
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), index=True)
+    phash = Column(BigInteger, nullable=False)
+    dhash = Column(BigInteger, nullable=False)
+    descriptor = Column(ARRAY(REAL), nullable=False)
+    content_hash = Column(Text, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ImageFeature(source='{self.source}')>"
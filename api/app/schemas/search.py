@@ -6,6 +6,7 @@ class SearchType(str, Enum):
     codigo = "codigo"
     texto = "texto"
     imagem = "imagem"
+    hibrido = "hibrido"
 
 class ConsultaQuery(BaseModel):
     tipo: SearchType
@@ -13,11 +14,14 @@ class ConsultaQuery(BaseModel):
     confianca_min: Optional[float] = Field(0.1, ge=0.0, le=1.0)
 
 class SearchFilters(BaseModel):
-    brand_ids: Optional[List[str]] = None
-    category_ids: Optional[List[str]] = None
+    brand_ids: Optional[List[str]] = None  # nomes das marcas (products.brand)
+    category_ids: Optional[List[str]] = None  # nomes das categorias (products.category)
     min_conf: Optional[int] = Field(None, ge=0, le=100)
     year_from: Optional[int] = None
     year_to: Optional[int] = None
+    product_types: Optional[List[str]] = None
+    has_price: Optional[bool] = None
+    has_image: Optional[bool] = None
 
 class SearchOptions(BaseModel):
     max_resultados: int = Field(20, ge=1, le=100)
@@ -47,3 +51,15 @@ class SearchResult(BaseModel):
 
     class Config:
         from_attributes = True
+
+class BulkCodesRequest(BaseModel):
+    codes: List[str] = Field(..., min_length=1)
+
+class ProductBatchRequest(BaseModel):
+    ids: List[str] = []
+    skus: List[str] = []
+
+class SuggestionClick(BaseModel):
+    query: str = Field(..., min_length=1)  # o que foi digitado
+    text: str = Field(..., min_length=1)  # a sugestão escolhida
+    product_id: Optional[int] = None
@@ -0,0 +1,330 @@
+# api/app/services/autocomplete.py
+
+import asyncio
+import heapq
+import logging
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.code_index import CatalogCursor, catalog_changed, get_catalog_cursor, get_catalog_version, sku_keys
+from app.services.search_events import get_rollup_version, product_popularity
+from app.utils.text import extract_keywords, normalize_code, normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Confiança de cada tipo de entrada (mesma escala das sugestões por SQL)
+KIND_CONFIDENCE = {
+    "sku": 1.0,
+    "sku_variant": 0.9,
+    "oem": 0.8,
+    "title": 0.6,
+    "word": 0.5,
+}
+
+# (texto sugerido, tipo, popularidade, detalhe): o detalhe é o título do
+# produto para códigos, o SKU para títulos e None para palavras
+Entry = Tuple[str, str, int, Optional[str]]
+
+def _rank(entry: Entry) -> Tuple[float, int]:
+    return KIND_CONFIDENCE[entry[1]], entry[2]
+
+@dataclass
+class _Table:
+    """
+    Chaves ordenadas e o id da entrada de cada uma: o intervalo de chaves
+    com um prefixo sai de duas buscas binárias, como descer numa trie
+    achatada. Prefixos com muitas chaves ("RV", "fil") têm o top-k
+    calculado na montagem; os demais intervalos são pequenos e lidos direto.
+    """
+    keys: List[str] = field(default_factory=list)
+    entry_ids: array = field(default_factory=lambda: array("i"))
+    top: Dict[str, Tuple[int, ...]] = field(default_factory=dict)
+
+    def range(self, prefix: str) -> Tuple[int, int]:
+        return bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + "\uffff")
+
+@dataclass
+class _Snapshot:
+    entries: List[Entry]
+    codes: _Table   # normalize_code: SKUs, variações e OEM
+    titles: _Table  # normalize_text do título inteiro
+    words: _Table   # palavras dos títulos
+    version: int
+    cursor: CatalogCursor
+    rollup_version: int
+
+def _build_table(pairs: List[Tuple[str, int]], entries: List[Entry], top_k: int, heavy: int) -> _Table:
+    pairs.sort()
+    table = _Table(
+        keys=[sys.intern(key) for key, _ in pairs],
+        entry_ids=array("i", (entry_id for _, entry_id in pairs)),
+    )
+
+    # Desce pelos prefixos enquanto o intervalo for maior que "heavy"
+    stack = [(0, len(pairs), 1)]
+    while stack:
+        lo, hi, depth = stack.pop()
+        if hi - lo <= heavy:
+            continue
+        start = lo
+        while start < hi:
+            key = table.keys[start]
+            if len(key) < depth:
+                start += 1
+                continue
+            prefix = key[:depth]
+            end = bisect_left(table.keys, prefix + "\uffff", start, hi)
+            if end - start > heavy:
+                table.top[prefix] = _top_entries(table.entry_ids[start:end], entries, top_k)
+                stack.append((start, end, depth + 1))
+            start = end
+    return table
+
+def _top_entries(entry_ids, entries: List[Entry], k: int) -> Tuple[int, ...]:
+    """k melhores entradas, uma por texto sugerido"""
+    best: Dict[str, int] = {}
+    for entry_id in entry_ids:
+        text_key = entries[entry_id][0].lower()
+        current = best.get(text_key)
+        if current is None or _rank(entries[entry_id]) > _rank(entries[current]):
+            best[text_key] = entry_id
+    return tuple(heapq.nlargest(k, best.values(), key=lambda entry_id: _rank(entries[entry_id])))
+
+class Autocomplete:
+    """
+    Completar prefixos em memória: SKUs, variações normalizadas de SKU,
+    códigos OEM, títulos e palavras dos títulos. A montagem roda em
+    background quando a versão do catálogo ou os agregados de eventos
+    (popularidade) mudam e o snapshot novo entra no lugar do antigo numa
+    única atribuição.
+    """
+
+    def __init__(self, top_k: int = settings.autocomplete_top_k, heavy: int = settings.autocomplete_heavy_prefix):
+        self.top_k = top_k
+        self.heavy = heavy
+        self.loaded_at: Optional[float] = None
+        self.last_build_ms = 0.0
+        self.queries = 0
+        self.query_us = 0.0
+        self._snapshot: Optional[_Snapshot] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version if self._snapshot else 0
+
+    # ---- consulta ----
+
+    def complete(self, query: str, limit: int = 10) -> List[Dict]:
+        """Sugestões cujo código ou texto começa com a query, no formato de /suggestions"""
+        snapshot = self._snapshot
+        if snapshot is None or not query.strip():
+            return []
+
+        started = time.perf_counter()
+        candidates: Dict[str, Tuple[int, str]] = {}
+
+        code_prefix = normalize_code(query.strip())
+        if len(code_prefix) >= 2:
+            self._collect(snapshot, snapshot.codes, code_prefix, limit, candidates)
+
+        # Título inteiro pelo prefixo da query; palavra pelo último termo,
+        # com o começo da query na frente
+        text_query = " ".join(normalize_text(query).split())
+        if len(text_query) >= 2:
+            self._collect(snapshot, snapshot.titles, text_query, limit, candidates)
+        head, _, last_word = text_query.rpartition(" ")
+        if len(last_word) >= 2:
+            self._collect(snapshot, snapshot.words, last_word, limit, candidates, f"{head} " if head else "")
+
+        ranked = heapq.nlargest(limit, candidates.values(), key=lambda item: _rank(snapshot.entries[item[0]]))
+        suggestions = []
+        for entry_id, suggestion_text in ranked:
+            _, kind, popularity, detail = snapshot.entries[entry_id]
+            metadata = {"kind": kind}
+            if kind == "word":
+                metadata["products"] = popularity
+            elif kind == "title":
+                metadata["sku"] = detail
+            else:
+                metadata["title"] = detail
+            suggestions.append({
+                "text": suggestion_text,
+                "type": "partial",
+                "confidence": KIND_CONFIDENCE[kind],
+                "metadata": metadata,
+            })
+
+        self.queries += 1
+        self.query_us += (time.perf_counter() - started) * 1_000_000
+        return suggestions
+
+    def _collect(self, snapshot: _Snapshot, table: _Table, prefix: str, limit: int,
+                 candidates: Dict[str, Tuple[int, str]], lead: str = "") -> None:
+        # Prefixo sem top-k pronto tem no máximo "heavy" chaves
+        entry_ids = table.top.get(prefix)
+        if entry_ids is None:
+            lo, hi = table.range(prefix)
+            entry_ids = _top_entries(table.entry_ids[lo:hi], snapshot.entries, limit)
+        for entry_id in entry_ids[:limit]:
+            entry = snapshot.entries[entry_id]
+            suggestion_text = lead + entry[0]
+            key = suggestion_text.lower()
+            current = candidates.get(key)
+            if current is None or _rank(entry) > _rank(snapshot.entries[current[0]]):
+                candidates[key] = (entry_id, suggestion_text)
+
+    # ---- montagem ----
+
+    def build(self, db: Session) -> None:
+        """Monta um snapshot novo a partir do banco e troca pelo atual"""
+        started = time.perf_counter()
+        cursor = get_catalog_cursor(db)
+        version = get_catalog_version(db)
+        rollup_version = get_rollup_version(db)
+        hits = product_popularity(db)
+        products = db.execute(text("""
+            SELECT id, sku, title,
+                   (base_price IS NOT NULL)::int + (image_urls IS NOT NULL)::int
+                   + (description IS NOT NULL)::int AS completeness
+            FROM products
+        """)).fetchall()
+        codes = db.execute(text("SELECT product_id, code, normalized_code FROM product_codes")).fetchall()
+        self.build_rows(products, codes, hits, cursor, version, rollup_version)
+
+        snapshot = self._snapshot
+        self.last_build_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            f"Autocomplete montado: {len(snapshot.codes.keys)} códigos, {len(snapshot.titles.keys)} títulos, "
+            f"{len(snapshot.words.keys)} palavras, "
+            f"versão {version}, {self.last_build_ms:.0f} ms"
+        )
+
+    def build_rows(self, products: Iterable, codes: Iterable, hits: Dict[int, int],
+                   cursor: CatalogCursor = (0, 0), version: int = 0, rollup_version: int = 0) -> None:
+        """
+        Monta o snapshot a partir das linhas de products (id, sku, title,
+        completeness) e product_codes (product_id, code, normalized_code) e
+        troca pelo atual
+        """
+        entries: List[Entry] = []
+        code_pairs: List[Tuple[str, int]] = []
+        title_pairs: List[Tuple[str, int]] = []
+        word_pairs: List[Tuple[str, int]] = []
+        words: Counter = Counter()
+
+        titles = {}
+        popularity = {}
+        for row in products:
+            titles[row.id] = row.title
+            # Visualizações/cliques primeiro, produtos com mais dados (0-3) no desempate
+            popularity[row.id] = hits.get(row.id, 0) * 4 + row.completeness
+            if row.sku:
+                sku_id = len(entries)
+                entries.append((row.sku, "sku", popularity[row.id], row.title))
+                variant_id = len(entries)
+                entries.append((row.sku, "sku_variant", popularity[row.id], row.title))
+                exact = normalize_code(row.sku)
+                code_pairs.append((exact, sku_id))
+                for key in sku_keys(row.sku):
+                    if key != exact:
+                        code_pairs.append((key, variant_id))
+            if row.title:
+                title_id = len(entries)
+                entries.append((row.title, "title", popularity[row.id], row.sku))
+                title_pairs.append((" ".join(normalize_text(row.title).split()), title_id))
+                words.update(set(extract_keywords(row.title)))
+
+        for row in codes:
+            if row.normalized_code:
+                entry_id = len(entries)
+                entries.append((row.code, "oem", popularity.get(row.product_id, 0), titles.get(row.product_id)))
+                code_pairs.append((row.normalized_code, entry_id))
+
+        for word, count in words.items():
+            entry_id = len(entries)
+            entries.append((word, "word", count, None))
+            word_pairs.append((word, entry_id))
+
+        snapshot = _Snapshot(
+            entries=entries,
+            codes=_build_table(code_pairs, entries, self.top_k, self.heavy),
+            titles=_build_table(title_pairs, entries, self.top_k, self.heavy),
+            words=_build_table(word_pairs, entries, self.top_k, self.heavy),
+            version=version,
+            cursor=cursor,
+            rollup_version=rollup_version,
+        )
+        self._snapshot = snapshot
+        self.loaded_at = time.time()
+
+    def refresh(self, db: Session) -> bool:
+        """Remonta se o catálogo ou os agregados de popularidade mudaram; retorna se remontou"""
+        snapshot = self._snapshot
+        if (snapshot is not None and not catalog_changed(db, snapshot.cursor)
+                and get_rollup_version(db) <= snapshot.rollup_version):
+            return False
+        self.build(db)
+        return True
+
+    # ---- métricas ----
+
+    def stats(self) -> Dict:
+        snapshot = self._snapshot
+        tables = (snapshot.codes, snapshot.titles, snapshot.words) if snapshot else ()
+        return {
+            "ready": snapshot is not None,
+            "version": self.version,
+            "rollup_version": snapshot.rollup_version if snapshot else 0,
+            "entries": len(snapshot.entries) if snapshot else 0,
+            "keys": sum(len(table.keys) for table in tables),
+            "precomputed_prefixes": sum(len(table.top) for table in tables),
+            "queries": self.queries,
+            "avg_query_us": round(self.query_us / self.queries, 1) if self.queries else 0.0,
+            "last_build_ms": round(self.last_build_ms, 2),
+            "loaded_at": self.loaded_at,
+        }
+
+autocomplete = Autocomplete()
+_refresh_task: Optional[asyncio.Task] = None
+
+def _refresh_autocomplete() -> None:
+    db = SessionLocal()
+    try:
+        autocomplete.refresh(db)
+    finally:
+        db.close()
+
+async def start_autocomplete() -> None:
+    """Monta o índice no startup e o remonta em background quando o catálogo muda"""
+    if not settings.autocomplete_enabled:
+        return
+
+    try:
+        await asyncio.to_thread(_refresh_autocomplete)
+    except Exception as e:
+        logger.error(f"Erro ao montar autocomplete: {e}")
+
+    global _refresh_task
+    _refresh_task = asyncio.create_task(_refresh_loop())
+
+async def _refresh_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.autocomplete_refresh_seconds)
+        try:
+            await asyncio.to_thread(_refresh_autocomplete)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar autocomplete: {e}")
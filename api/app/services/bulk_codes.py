@@ -0,0 +1,109 @@
+# api/app/services/bulk_codes.py
+
+import io
+import re
+from typing import Dict, List
+
+import pandas as pd
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.services.statement_cache import statement
+from app.utils.text import normalize_code
+
+# Só correspondência exata: SKU (normalize_code(sku)) ou código OEM
+# (product_codes.normalized_code), os dois pelos índices existentes
+BULK_MATCH_SQL = """
+    WITH input AS (
+        SELECT DISTINCT code FROM unnest(CAST(:codes AS TEXT[])) AS t(code)
+    ),
+    hits AS (
+        SELECT i.code, p.id AS product_id, 1 AS match_rank
+        FROM input i
+        JOIN products p ON normalize_code(p.sku) = i.code
+        UNION ALL
+        SELECT i.code, pc.product_id, 2
+        FROM input i
+        JOIN product_codes pc ON pc.normalized_code = i.code
+    )
+    SELECT h.code, p.id, p.sku, p.title, p.brand, p.base_price, MIN(h.match_rank) AS match_rank
+    FROM hits h
+    JOIN products p ON p.id = h.product_id
+    GROUP BY h.code, p.id
+    ORDER BY h.code, match_rank, p.title
+"""
+
+def _confidence(score: int) -> Dict:
+    level = "alto" if score >= 70 else "medio" if score >= 40 else "baixo"
+    return {"level": level, "score": score}
+
+def _skip_header(values: List[str]) -> List[str]:
+    # Cabeçalho ("Código", "SKU", ...) não tem dígito; código de peça tem
+    if values and not any(char.isdigit() for char in values[0]):
+        return values[1:]
+    return values
+
+def parse_codes_file(filename: str, content: bytes) -> List[str]:
+    """
+    Códigos de uma planilha (.xlsx/.xls: primeira coluna) ou de um arquivo
+    texto/CSV (primeiro campo de cada linha), sem a linha de cabeçalho
+    """
+    if filename.lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(io.BytesIO(content), header=None, dtype=str)
+        if df.empty:
+            return []
+        return _skip_header([str(value).strip() for value in df.iloc[:, 0].dropna()])
+
+    try:
+        decoded = content.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        decoded = content.decode('latin-1')
+    lines = [line for line in decoded.splitlines() if line.strip()]
+    return _skip_header([re.split(r'[;,\t]', line, maxsplit=1)[0].strip().strip('"') for line in lines])
+
+async def resolve_codes(db: AsyncSession, codes: List[str]) -> Dict:
+    """
+    Resolve uma lista de códigos em consultas por lotes de
+    settings.bulk_codes_chunk_size. Cada entrada recebe seus produtos
+    (SKU exato antes de OEM); as que não acham nada vão para not_found.
+    """
+    inputs = [code.strip() for code in codes if code and code.strip()]
+    normalized_inputs = [normalize_code(code) for code in inputs]
+    unique_codes = sorted({code for code in normalized_inputs if code})
+
+    matches: Dict[str, List[Dict]] = {}
+    chunk_size = settings.bulk_codes_chunk_size
+    for start in range(0, len(unique_codes), chunk_size):
+        rows = (await db.execute(statement(BULK_MATCH_SQL), {"codes": unique_codes[start:start + chunk_size]})).fetchall()
+        for row in rows:
+            matches.setdefault(row.code, []).append(row)
+
+    results = []
+    not_found = []
+    for code, normalized in zip(inputs, normalized_inputs):
+        rows = matches.get(normalized, [])
+        if not rows:
+            not_found.append(code)
+        # OEM que aponta para vários produtos é ambíguo
+        oem_score = 90 if len(rows) == 1 else 60
+        results.append({
+            "input": code,
+            "normalized": normalized,
+            "matches": [{
+                "id": str(row.id),
+                "sku": row.sku,
+                "title": row.title,
+                "brand": {"name": row.brand} if row.brand else None,
+                "base_price": float(row.base_price) if row.base_price else None,
+                "match_type": "SKU exato" if row.match_rank == 1 else "Código OEM exato",
+                "confidence": _confidence(100 if row.match_rank == 1 else oem_score)
+            } for row in rows]
+        })
+
+    return {
+        "total": len(inputs),
+        "found": len(inputs) - len(not_found),
+        "not_found_count": len(not_found),
+        "results": results,
+        "not_found": not_found
+    }
@@ -0,0 +1,109 @@
+# api/app/services/catalog_watch.py
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Set
+
+import asyncpg
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.code_index import prune_catalog_changes
+from app.services.search_cache import bump_catalog_version
+
+logger = logging.getLogger(__name__)
+
+# Canal do NOTIFY feito pelo trigger de catalog_changes (migração 0011)
+CHANNEL = "catalog_changes"
+
+class CatalogWatch:
+    """
+    Invalida os caches de busca e de produto assim que uma escrita em
+    products commita, venha de onde vier (API, importação, scripts, SQL
+    direto): o trigger de catalog_changes faz NOTIFY e aqui cada
+    notificação vira um bump_catalog_version. Não depende dos índices em
+    memória estarem ligados.
+    """
+
+    def __init__(self):
+        self.connected = False
+        self.connections = 0
+        self.notifications = 0
+        self.last_notification: Optional[float] = None
+        self._bumps: Set[asyncio.Task] = set()
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self.notifications += 1
+        self.last_notification = time.time()
+        task = asyncio.create_task(asyncio.to_thread(bump_catalog_version))
+        self._bumps.add(task)
+        task.add_done_callback(self._bumps.discard)
+
+    async def run(self) -> None:
+        dsn = "postgresql://" + settings.database_url.split("://", 1)[1]
+        while True:
+            try:
+                connection = await asyncpg.connect(dsn)
+            except Exception as e:
+                logger.error(f"Erro ao conectar para ouvir {CHANNEL}: {e}")
+                await asyncio.sleep(settings.catalog_watch_retry_seconds)
+                continue
+
+            try:
+                await connection.add_listener(CHANNEL, self._on_notify)
+                self.connected = True
+                self.connections += 1
+                # O que commitou enquanto não havia LISTEN não foi avisado
+                await asyncio.to_thread(bump_catalog_version)
+                while not connection.is_closed():
+                    await asyncio.sleep(settings.catalog_watch_retry_seconds)
+                logger.warning(f"Conexão de LISTEN {CHANNEL} caiu, reconectando")
+            except Exception as e:
+                logger.error(f"Erro ao ouvir {CHANNEL}: {e}")
+            finally:
+                self.connected = False
+                connection.terminate()
+
+    def stats(self) -> Dict:
+        return {
+            "connected": self.connected,
+            "connections": self.connections,
+            "notifications": self.notifications,
+            "last_notification": self.last_notification,
+        }
+
+catalog_watch = CatalogWatch()
+_watch_task: Optional[asyncio.Task] = None
+_prune_task: Optional[asyncio.Task] = None
+
+def _prune_catalog_changes() -> None:
+    db = SessionLocal()
+    try:
+        deleted = prune_catalog_changes(db, settings.catalog_changes_keep_seconds)
+        if deleted:
+            logger.info(f"catalog_changes: {deleted} alterações antigas apagadas")
+    finally:
+        db.close()
+
+async def start_catalog_watch() -> None:
+    """LISTEN e poda de catalog_changes em background; SQLite (testes) não tem NOTIFY"""
+    if settings.database_url.startswith("sqlite"):
+        return
+
+    global _watch_task, _prune_task
+    _watch_task = asyncio.create_task(catalog_watch.run())
+    _prune_task = asyncio.create_task(_prune_loop())
+
+async def stop_catalog_watch() -> None:
+    for task in (_watch_task, _prune_task):
+        if task is not None:
+            task.cancel()
+
+async def _prune_loop() -> None:
+    while True:
+        try:
+            await asyncio.to_thread(_prune_catalog_changes)
+        except Exception as e:
+            logger.error(f"Erro ao podar catalog_changes: {e}")
+        await asyncio.sleep(settings.catalog_changes_prune_seconds)
@@ -0,0 +1,358 @@
+# api/app/services/code_index.py
+
+import asyncio
+import logging
+import re
+import sys
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.utils.sku import SKUNormalizer
+from app.utils.text import normalize_code
+
+logger = logging.getLogger(__name__)
+
+# Acima disso um refresh incremental sai mais caro que recarregar tudo
+FULL_RELOAD_THRESHOLD = 5000
+
+IdList = Union[int, array]
+
+# (xmin do snapshot, linhas de catalog_changes visíveis com xid >= xmin)
+CatalogCursor = Tuple[int, int]
+
+def get_catalog_version(db: Session) -> int:
+    """Versão atual do catálogo (último seq de catalog_changes), para métricas e logs"""
+    return db.execute(text("SELECT COALESCE(MAX(seq), 0) FROM catalog_changes")).scalar() or 0
+
+def get_catalog_cursor(db: Session) -> CatalogCursor:
+    """
+    Posição de leitura em catalog_changes, lida antes dos dados.
+
+    seq não segue a ordem de commit, então o cursor é o xmin do snapshot:
+    toda transação ainda não visível tem xid >= xmin, e a próxima leitura
+    pega "xid >= xmin" (relendo as alterações já aplicadas dessa janela,
+    o que não muda nada). A contagem dessas linhas diz se algo novo ficou
+    visível desde então (catalog_changes é append-only).
+    """
+    row = db.execute(text("""
+        WITH s AS (SELECT pg_snapshot_xmin(pg_current_snapshot()) AS xmin)
+        SELECT s.xmin::text::bigint AS xmin,
+               (SELECT COUNT(*) FROM catalog_changes c WHERE c.xid >= s.xmin) AS pending
+        FROM s
+    """)).first()
+    return row.xmin, row.pending
+
+def catalog_changed(db: Session, cursor: CatalogCursor) -> bool:
+    """Alguma alteração ficou visível depois do cursor (ou a poda passou dele)?"""
+    row = db.execute(text("""
+        SELECT (SELECT COUNT(*) FROM catalog_changes WHERE xid >= CAST(CAST(:xmin AS text) AS xid8)) AS pending,
+               (SELECT horizon >= CAST(CAST(:xmin AS text) AS xid8) FROM catalog_changes_horizon) AS pruned
+    """), {"xmin": cursor[0]}).first()
+    return row.pending != cursor[1] or bool(row.pruned)
+
+def changed_products(db: Session, cursor: CatalogCursor) -> Optional[List[int]]:
+    """
+    Produtos alterados por transações ainda não visíveis (ou não terminadas)
+    no cursor; None quando a poda já apagou parte delas (recarregar tudo)
+    """
+    pruned = db.execute(
+        text("SELECT horizon >= CAST(CAST(:xmin AS text) AS xid8) FROM catalog_changes_horizon"),
+        {"xmin": cursor[0]}
+    ).scalar()
+    if pruned:
+        return None
+    return [row[0] for row in db.execute(
+        text("SELECT DISTINCT product_id FROM catalog_changes WHERE xid >= CAST(CAST(:xmin AS text) AS xid8)"),
+        {"xmin": cursor[0]}
+    )]
+
+def prune_catalog_changes(db: Session, keep_seconds: int) -> int:
+    """
+    Apaga as alterações com mais de keep_seconds e sobe o horizonte até o
+    maior xid apagado. Os índices em memória leem a cada poucos segundos,
+    então seus cursores ficam acima do horizonte; quem ficou para trás (ou
+    via uma transação longa que commitou agora) recarrega tudo.
+    """
+    deleted = db.execute(text("""
+        WITH deleted AS (
+            DELETE FROM catalog_changes
+            WHERE changed_at < now() - make_interval(secs => :keep_seconds)
+            RETURNING xid
+        ),
+        top AS (
+            SELECT xid FROM deleted ORDER BY xid DESC LIMIT 1
+        ),
+        moved AS (
+            UPDATE catalog_changes_horizon h
+            SET horizon = GREATEST(h.horizon, top.xid)
+            FROM top
+        )
+        SELECT COUNT(*) FROM deleted
+    """), {"keep_seconds": keep_seconds}).scalar()
+    db.commit()
+    return deleted
+
+def sku_keys(sku: str) -> List[str]:
+    """Chaves normalizadas de um SKU, incluindo as variações do SKUNormalizer"""
+    keys = {normalize_code(sku)}
+    keys.update(normalize_code(variation) for variation in SKUNormalizer.normalize_sku(sku))
+    keys.discard("")
+    return list(keys)
+
+def code_keys(query: str) -> List[str]:
+    """
+    Chaves de uma busca exata por código: sku_keys da query e, para
+    "RV0" + 7 dígitos, também o SKU sem o zero (o RV4010031 cadastrado
+    vira RV0401.0031 no SKUNormalizer). O índice guarda só normalize_code
+    do SKU e dos códigos OEM, e o SQL (CODE_MATCH_CTE) compara as mesmas
+    colunas com estas chaves: os dois acham os mesmos produtos.
+    """
+    keys = set(sku_keys(query.strip()))
+    keys.update(f"RV{key[3:]}" for key in list(keys) if re.fullmatch(r"RV0\d{7}", key))
+    return sorted(keys)
+
+class CodeIndex:
+    """
+    Dicionário em memória: código normalizado (SKU e códigos OEM) -> ids
+    de produtos. As variações do SKUNormalizer entram pela consulta
+    (code_keys), como no SQL.
+
+    Para economizar memória as chaves são internadas e a lista de ids é um
+    int quando há um só produto ou um array('i') quando há vários.
+    """
+
+    def __init__(self, max_keys: int = settings.code_index_max_keys):
+        self.max_keys = max_keys
+        self.version = 0
+        self.cursor: CatalogCursor = (0, 0)
+        self.ready = False
+        self.truncated = False
+        self.loaded_at: Optional[float] = None
+        self.last_refresh_ms = 0.0
+        self._index: Dict[str, IdList] = {}
+        self._products: Dict[int, Tuple[str, str]] = {}
+        self._keys_by_product: Dict[int, Tuple[str, ...]] = {}
+        self._lock = threading.Lock()
+
+    # ---- consulta ----
+
+    def lookup(self, query: str) -> List[int]:
+        """Ids de produtos cujo SKU (ou variação) ou código OEM é exatamente a query"""
+        if not self.ready or not query:
+            return []
+
+        ids: List[int] = []
+        seen = set()
+        for key in code_keys(query):
+            entry = self._index.get(key)
+            if entry is None:
+                continue
+            for product_id in ((entry,) if isinstance(entry, int) else entry):
+                if product_id not in seen:
+                    seen.add(product_id)
+                    ids.append(product_id)
+        return ids
+
+    def product(self, product_id: int) -> Optional[Tuple[str, str]]:
+        """(sku, title) de um produto indexado"""
+        return self._products.get(product_id)
+
+    # ---- carga ----
+
+    def load(self, db: Session) -> None:
+        """Carga completa; monta estruturas novas e troca de uma vez"""
+        started = time.perf_counter()
+        # Cursor lido antes dos dados: o que mudar durante a carga é reaplicado no próximo refresh
+        cursor = get_catalog_cursor(db)
+        version = get_catalog_version(db)
+
+        products = db.execute(text("SELECT id, sku, title FROM products WHERE sku IS NOT NULL")).fetchall()
+        codes = db.execute(text("SELECT product_id, normalized_code FROM product_codes")).fetchall()
+
+        index: Dict[str, IdList] = {}
+        product_data: Dict[int, Tuple[str, str]] = {}
+        keys_by_product: Dict[int, List[str]] = {}
+        truncated = False
+
+        for row in products:
+            product_data[row.id] = (sys.intern(row.sku), row.title or "")
+            normalized = normalize_code(row.sku)
+            keys_by_product[row.id] = [normalized] if normalized else []
+        for row in codes:
+            if row.normalized_code:
+                keys_by_product.setdefault(row.product_id, []).append(row.normalized_code)
+
+        for product_id, keys in keys_by_product.items():
+            if not self._add_keys(index, product_id, keys):
+                truncated = True
+
+        with self._lock:
+            self._index = index
+            self._products = product_data
+            self._keys_by_product = {pid: tuple(sys.intern(k) for k in keys) for pid, keys in keys_by_product.items()}
+            self.version = version
+            self.cursor = cursor
+            self.truncated = truncated
+            self.ready = True
+            self.loaded_at = time.time()
+
+        self.last_refresh_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            f"Índice de códigos carregado: {len(index)} chaves, {len(product_data)} produtos, "
+            f"versão {version}, {self.last_refresh_ms:.0f} ms"
+        )
+        if truncated:
+            logger.warning(f"Índice de códigos truncado em {self.max_keys} chaves")
+
+    def refresh(self, db: Session) -> int:
+        """Aplica as alterações de catalog_changes desde a última versão; retorna quantos produtos mudaram"""
+        if not self.ready:
+            self.load(db)
+            return len(self._products)
+
+        if not catalog_changed(db, self.cursor):
+            return 0
+
+        started = time.perf_counter()
+        cursor = get_catalog_cursor(db)
+        version = get_catalog_version(db)
+        changed = changed_products(db, self.cursor)
+
+        if changed is None or len(changed) > FULL_RELOAD_THRESHOLD:
+            self.load(db)
+            return len(changed) if changed is not None else len(self._products)
+
+        products = db.execute(
+            text("SELECT id, sku, title FROM products WHERE id = ANY(:ids) AND sku IS NOT NULL"),
+            {"ids": changed}
+        ).fetchall()
+        codes = db.execute(
+            text("SELECT product_id, normalized_code FROM product_codes WHERE product_id = ANY(:ids)"),
+            {"ids": changed}
+        ).fetchall()
+
+        new_keys: Dict[int, List[str]] = {}
+        for row in products:
+            normalized = normalize_code(row.sku)
+            new_keys[row.id] = [normalized] if normalized else []
+        for row in codes:
+            if row.normalized_code:
+                new_keys.setdefault(row.product_id, []).append(row.normalized_code)
+
+        with self._lock:
+            for product_id in changed:
+                self._remove_product(product_id)
+            for row in products:
+                self._products[row.id] = (sys.intern(row.sku), row.title or "")
+            for product_id, keys in new_keys.items():
+                if not self._add_keys(self._index, product_id, keys):
+                    self.truncated = True
+                self._keys_by_product[product_id] = tuple(sys.intern(k) for k in keys)
+            self.version = version
+            self.cursor = cursor
+
+        self.last_refresh_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Índice de códigos atualizado: {len(changed)} produtos, versão {version}")
+        return len(changed)
+
+    def _add_keys(self, index: Dict[str, IdList], product_id: int, keys: List[str]) -> bool:
+        complete = True
+        for key in keys:
+            entry = index.get(key)
+            if entry is None:
+                if len(index) >= self.max_keys:
+                    complete = False
+                    continue
+                index[sys.intern(key)] = product_id
+            elif isinstance(entry, int):
+                if entry != product_id:
+                    index[key] = array('i', (entry, product_id))
+            elif product_id not in entry:
+                entry.append(product_id)
+        return complete
+
+    def _remove_product(self, product_id: int) -> None:
+        self._products.pop(product_id, None)
+        for key in self._keys_by_product.pop(product_id, ()):
+            entry = self._index.get(key)
+            if entry is None:
+                continue
+            if isinstance(entry, int):
+                if entry == product_id:
+                    del self._index[key]
+                continue
+            if product_id in entry:
+                entry.remove(product_id)
+            if len(entry) == 1:
+                self._index[key] = entry[0]
+
+    # ---- métricas ----
+
+    def memory_bytes(self) -> int:
+        """Estimativa do uso de memória das estruturas do índice"""
+        total = sys.getsizeof(self._index) + sys.getsizeof(self._products) + sys.getsizeof(self._keys_by_product)
+        for key, entry in self._index.items():
+            total += sys.getsizeof(key) + sys.getsizeof(entry)
+        for sku, title in self._products.values():
+            total += sys.getsizeof(title)
+        for keys in self._keys_by_product.values():
+            total += sys.getsizeof(keys)
+        return total
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "version": self.version,
+            "keys": len(self._index),
+            "products": len(self._products),
+            "max_keys": self.max_keys,
+            "truncated": self.truncated,
+            "memory_bytes": self.memory_bytes(),
+            "last_refresh_ms": round(self.last_refresh_ms, 2),
+            "loaded_at": self.loaded_at,
+        }
+
+code_index = CodeIndex()
+_refresh_task: Optional[asyncio.Task] = None
+
+def _load_code_index() -> None:
+    db = SessionLocal()
+    try:
+        code_index.load(db)
+    finally:
+        db.close()
+
+def _refresh_code_index() -> None:
+    db = SessionLocal()
+    try:
+        code_index.refresh(db)
+    finally:
+        db.close()
+
+async def start_code_index() -> None:
+    """Carrega o índice no startup e mantém um refresh incremental em background"""
+    if not settings.code_index_enabled:
+        return
+
+    try:
+        await asyncio.to_thread(_load_code_index)
+    except Exception as e:
+        logger.error(f"Erro ao carregar índice de códigos: {e}")
+
+    global _refresh_task
+    _refresh_task = asyncio.create_task(_refresh_loop())
+
+async def _refresh_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.code_index_refresh_seconds)
+        try:
+            await asyncio.to_thread(_refresh_code_index)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar índice de códigos: {e}")
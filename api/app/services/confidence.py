@@ -1,134 +1,284 @@
-# api/app/services/confidence.py - CRIAR este arquivo
+# api/app/services/confidence.py
 
-def calculate_confidence_score(product, search_query, search_type):
+from bisect import bisect_right
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from fastapi import HTTPException
+
+# Sinais de confiança, na ordem em que os motivos aparecem: (nome, pontos, motivo)
+SIGNALS = (
+    ("sku_exact", 45, "SKU exato"),
+    ("sku_partial", 25, "SKU parcial"),
+    ("oem_exact", 50, "Código OEM exato"),
+    ("oem_partial", 35, "Código OEM parcial"),
+    ("title_exact", 40, "Título exato"),
+    ("title_contains", 25, "Título contém termo"),
+    ("title_term", 15, "Termo encontrado no título"),
+    ("description_contains", 15, "Descrição contém termo"),
+    ("description_term", 8, "Termo na descrição"),
+    ("sku_related", 20, "SKU relacionado"),
+    ("brand", 12, "Marca correspondente"),
+    ("has_images", 8, "Tem imagens"),
+    ("detailed_description", 5, "Descrição detalhada"),
+    ("short_title", -10, "Título incompleto"),
+)
+SIGNAL_POINTS = np.array([points for _, points, _ in SIGNALS], dtype=np.int32)
+LEVELS = ("baixo", "medio", "alto")
+
+EMPTY_STATS = {"total": 0, "alto": 0, "medio": 0, "baixo": 0}
+
+class _Column:
     """
-    Calcula o nível de confiança da correspondência baseado nos dados reais
+    Coluna de texto em minúsculas guardada como uma string só (valores
+    separados por \\x00): contains() varre a coluna inteira com str.find em
+    vez de testar produto por produto.
     """
-    score = 0
-    reasons = []
-    search_lower = search_query.lower().strip()
-    
-    # Correspondência exata de SKU (peso alto)
-    sku = str(product.get("sku", "")).lower()
-    if search_type == "codigo" or search_type == "CODIGO":
-        if sku == search_lower:
-            score += 45
-            reasons.append("SKU exato")
-        elif search_lower in sku or sku in search_lower:
-            score += 25
-            reasons.append("SKU parcial")
-    
-    # Correspondência de texto
-    title = str(product.get("title", "")).lower()
-    description = str(product.get("description", "")).lower()
-    
-    if search_type == "texto" or search_type == "TEXTO":
-        # Correspondência exata no título
-        if search_lower == title:
-            score += 40
-            reasons.append("Título exato")
-        elif search_lower in title:
-            if len(search_lower) > 3:
-                score += 25
-                reasons.append("Título contém termo")
-            else:
-                score += 15
-                reasons.append("Termo encontrado no título")
-        
-        # Correspondência na descrição
-        if search_lower in description:
-            if len(search_lower) > 5:
-                score += 15
-                reasons.append("Descrição contém termo")
-            else:
-                score += 8
-                reasons.append("Termo na descrição")
-        
-        # Correspondência no SKU (mesmo em busca textual)
-        if search_lower in sku:
-            score += 20
-            reasons.append("SKU relacionado")
-    
-    # Correspondência de marca
-    brand = product.get("brand")
-    if brand:
-        brand_name = ""
-        if isinstance(brand, dict):
-            brand_name = str(brand.get("name", "")).lower()
-        elif isinstance(brand, str):
-            brand_name = brand.lower()
-        
-        if search_lower in brand_name or brand_name in search_lower:
-            score += 12
-            reasons.append("Marca correspondente")
-    
-    # Bonus por qualidade dos dados
-    if product.get("images") and len(product["images"]) > 0:
-        score += 8
-        reasons.append("Tem imagens")
-    
-    if description and len(description) > 100:
-        score += 5
-        reasons.append("Descrição detalhada")
-    
-    # Penalidade por dados incompletos
-    if not title or len(title) < 10:
-        score -= 10
-        reasons.append("Título incompleto")
-    
-    # Determinar nível baseado no score
-    if score >= 70:
-        level = "alto"
-    elif score >= 40:
-        level = "medio"
-    else:
-        level = "baixo"
-    
-    return {
-        "level": level,
-        "score": min(max(score, 0), 100),
-        "reasons": reasons
-    }
 
-def enhance_products_with_confidence(products, search_query, search_type):
+    def __init__(self, values: Sequence[Optional[str]]):
+        self.blob = "\x00".join(value or "" for value in values).lower()
+        self.values = self.blob.split("\x00")
+        self.lengths = np.fromiter(map(len, self.values), dtype=np.int64, count=len(self.values))
+        self.starts = (np.cumsum(self.lengths + 1) - self.lengths - 1).tolist()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def contains(self, term: str) -> np.ndarray:
+        """term in valor, para cada valor"""
+        n = len(self)
+        if not term:
+            return np.ones(n, dtype=bool)
+
+        mask = np.zeros(n, dtype=bool)
+        pos = self.blob.find(term)
+        while pos != -1:
+            # Achou em uma linha: marca e continua a partir da próxima
+            row = bisect_right(self.starts, pos) - 1
+            mask[row] = True
+            if row + 1 >= n:
+                break
+            pos = self.blob.find(term, self.starts[row + 1])
+        return mask
+
+    def equals(self, term: str) -> np.ndarray:
+        return np.array(self.values, dtype=object) == term
+
+    def contained_in(self, term: str) -> np.ndarray:
+        """valor não vazio in term, para cada valor"""
+        return np.fromiter((bool(value) and value in term for value in self.values), dtype=bool, count=len(self))
+
+def _has_images(image_urls: Optional[str]) -> bool:
+    return bool(image_urls) and image_urls.strip() not in ("", "[]")
+
+class ConfidenceBatch:
     """
-    Adiciona sistema de confiança aos produtos retornados pela busca
+    Confiança de um conjunto de candidatos calculada de uma vez. Os motivos
+    só são montados (confidence()) para os produtos que vão na resposta.
     """
-    enhanced_products = []
-    
-    for product in products:
-        confidence = calculate_confidence_score(product, search_query, search_type)
-        enhanced_product = {
-            **product,
-            "confidence": confidence
+
+    def __init__(self, signals: np.ndarray):
+        self.signals = signals
+        raw = SIGNAL_POINTS @ signals if signals.size else np.zeros(0, dtype=np.int32)
+        self.levels = (raw >= 40).astype(np.int8) + (raw >= 70)
+        self.scores = np.clip(raw, 0, 100)
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def confidence(self, i: int) -> Dict:
+        return {
+            "level": LEVELS[self.levels[i]],
+            "score": int(self.scores[i]),
+            "reasons": [reason for (_, _, reason), hit in zip(SIGNALS, self.signals[:, i]) if hit],
         }
-        enhanced_products.append(enhanced_product)
-    
-    # Ordenar por nível de confiança e score
-    priority_order = {"alto": 3, "medio": 2, "baixo": 1}
-    enhanced_products.sort(
-        key=lambda x: (
-            priority_order.get(x["confidence"]["level"], 0),  
-            x["confidence"]["score"],
-            x.get("title", "")
-        ), 
-        reverse=True
+
+def score_batch(
+    search_query: str,
+    search_type: str,
+    skus: Sequence[Optional[str]],
+    titles: Sequence[Optional[str]],
+    descriptions: Sequence[Optional[str]],
+    brands: Sequence[Optional[str]],
+    original_codes: Sequence[Optional[str]],
+    has_images: Sequence[bool],
+) -> ConfidenceBatch:
+    """
+    Calcula todos os sinais de confiança de uma vez, sobre colunas com um
+    valor por candidato
+    """
+    n = len(skus)
+    signals = np.zeros((len(SIGNALS), n), dtype=bool)
+    if n == 0:
+        return ConfidenceBatch(signals)
+
+    q = search_query.lower().strip()
+    if not q:
+        raise ValueError("Termo de busca vazio")
+    search_type = search_type.lower()
+    rows = {name: i for i, (name, _, _) in enumerate(SIGNALS)}
+
+    sku = _Column(skus)
+    title = _Column(titles)
+    description = _Column(descriptions)
+    brand = _Column(brands)
+    codes = _Column(original_codes)
+
+    if search_type == "codigo":
+        sku_exact = sku.equals(q)
+        signals[rows["sku_exact"]] = sku_exact
+        # SKU vazio conta como parcial, como sempre contou ("" in q)
+        signals[rows["sku_partial"]] = ~sku_exact & (sku.contains(q) | sku.contained_in(q) | (sku.lengths == 0))
+
+    # Código OEM exato = termo inteiro entre as barras/espaços de original_codes
+    oem_hit = codes.contains(q)
+    oem_exact = np.zeros(n, dtype=bool)
+    for i in np.flatnonzero(oem_hit):
+        oem_exact[i] = f" {q} " in f" {codes.values[i]} "
+    signals[rows["oem_exact"]] = oem_exact
+    signals[rows["oem_partial"]] = oem_hit & ~oem_exact
+
+    if search_type == "texto":
+        title_exact = title.equals(q)
+        signals[rows["title_exact"]] = title_exact
+        signals[rows["title_contains" if len(q) > 3 else "title_term"]] = ~title_exact & title.contains(q)
+        signals[rows["description_contains" if len(q) > 5 else "description_term"]] = description.contains(q)
+        signals[rows["sku_related"]] = sku.contains(q)
+
+    signals[rows["brand"]] = (brand.lengths > 0) & (brand.contains(q) | brand.contained_in(q))
+
+    signals[rows["has_images"]] = np.asarray(has_images, dtype=bool)
+    signals[rows["detailed_description"]] = description.lengths > 100
+    signals[rows["short_title"]] = title.lengths < 10
+
+    return ConfidenceBatch(signals)
+
+def score_rows(rows: Sequence, search_query: str, search_type: str) -> ConfidenceBatch:
+    """score_batch sobre linhas do banco (sku, title, description, brand, original_codes, image_urls)"""
+    return score_batch(
+        search_query,
+        search_type,
+        skus=[row.sku for row in rows],
+        titles=[row.title for row in rows],
+        descriptions=[row.description for row in rows],
+        brands=[row.brand for row in rows],
+        original_codes=[row.original_codes for row in rows],
+        has_images=[_has_images(row.image_urls) for row in rows],
     )
-    
-    return enhanced_products
 
-def get_confidence_stats(products):
+def confidence_score_sql(search_type: str, alias: str = "p") -> str:
+    """
+    Mesma pontuação de score_batch como expressão SQL (antes do corte em
+    0..100), para ordenar e paginar no banco. Parâmetro: :conf_q (ver
+    confidence_params).
+    """
+    search_type = search_type.lower()
+    sku = f"lower(COALESCE({alias}.sku, ''))"
+    title = f"lower(COALESCE({alias}.title, ''))"
+    description = f"lower(COALESCE({alias}.description, ''))"
+    brand = f"lower(COALESCE({alias}.brand, ''))"
+    codes = f"lower(COALESCE({alias}.original_codes, ''))"
+
+    terms = []
+    if search_type == "codigo":
+        terms.append(f"""CASE WHEN {sku} = :conf_q THEN 45
+                              WHEN strpos({sku}, :conf_q) > 0 OR strpos(:conf_q, {sku}) > 0 THEN 25
+                              ELSE 0 END""")
+    terms.append(f"""CASE WHEN strpos(' ' || {codes} || ' ', ' ' || :conf_q || ' ') > 0 THEN 50
+                          WHEN strpos({codes}, :conf_q) > 0 THEN 35
+                          ELSE 0 END""")
+    if search_type == "texto":
+        terms.append(f"""CASE WHEN {title} = :conf_q THEN 40
+                              WHEN strpos({title}, :conf_q) > 0 THEN CASE WHEN char_length(:conf_q) > 3 THEN 25 ELSE 15 END
+                              ELSE 0 END""")
+        terms.append(f"""CASE WHEN strpos({description}, :conf_q) > 0 THEN CASE WHEN char_length(:conf_q) > 5 THEN 15 ELSE 8 END
+                              ELSE 0 END""")
+        terms.append(f"CASE WHEN strpos({sku}, :conf_q) > 0 THEN 20 ELSE 0 END")
+    terms.append(f"CASE WHEN {brand} <> '' AND (strpos({brand}, :conf_q) > 0 OR strpos(:conf_q, {brand}) > 0) THEN 12 ELSE 0 END")
+    terms.append(f"CASE WHEN btrim(COALESCE({alias}.image_urls, '')) NOT IN ('', '[]') THEN 8 ELSE 0 END")
+    terms.append(f"CASE WHEN char_length(COALESCE({alias}.description, '')) > 100 THEN 5 ELSE 0 END")
+    terms.append(f"CASE WHEN char_length(COALESCE({alias}.title, '')) < 10 THEN -10 ELSE 0 END")
+    return "\n        + ".join(terms)
+
+def check_search_query(q: str) -> None:
+    """
+    Recusa termo em branco: o termo vazio está contido em qualquer texto e
+    daria "Código OEM"/"Título contém termo" a todos os produtos
+    """
+    if not q or not q.strip():
+        raise HTTPException(status_code=400, detail="Informe um termo de busca")
+
+def confidence_params(q: str) -> Dict[str, str]:
+    """Parâmetros de confidence_score_sql"""
+    conf_q = q.lower().strip()
+    if not conf_q:
+        raise ValueError("Termo de busca vazio")
+    return {"conf_q": conf_q}
+
+CONFIDENCE_ORDER_SQL = """
+    (c.raw_score >= 40)::int + (c.raw_score >= 70)::int DESC,
+    LEAST(GREATEST(c.raw_score, 0), 100) DESC
+"""
+
+def ranked_search_sql(
+    search_type: str,
+    columns: str,
+    from_sql: str,
+    where_sql: str = "TRUE",
+    tie_order: str = "p.id",
+    with_sql: str = "",
+    count_only: bool = False,
+    with_counts: bool = True,
+    rank_by_confidence: bool = True,
+) -> str:
+    """
+    Consulta que ordena os candidatos (alias "p") por nível e score de
+    confiança e pagina uma vez no banco (:limit/:offset). O total e a
+    contagem por nível vêm na mesma ida ao banco, por window functions.
+    Com count_only=True gera só as contagens, para páginas além do fim; com
+    with_counts=False não calcula contagens (exportação); com
+    rank_by_confidence=False ordena só por tie_order (busca híbrida).
+    """
+    counts = """,
+        COUNT(*) OVER () AS total_count,
+        COUNT(*) FILTER (WHERE c.raw_score >= 70) OVER () AS alto_count,
+        COUNT(*) FILTER (WHERE c.raw_score >= 40 AND c.raw_score < 70) OVER () AS medio_count
     """
-    Gera estatísticas dos níveis de confiança
+    source = f"""
+        {from_sql}
+        CROSS JOIN LATERAL (SELECT {confidence_score_sql(search_type)} AS raw_score) c
+        WHERE {where_sql}
     """
-    if not products:
-        return {"total": 0, "alto": 0, "medio": 0, "baixo": 0}
-    
-    stats = {"total": len(products), "alto": 0, "medio": 0, "baixo": 0}
-    
-    for product in products:
-        confidence_level = product.get("confidence", {}).get("level", "baixo")
-        if confidence_level in stats:
-            stats[confidence_level] += 1
-    
-    return stats
\ No newline at end of file
+    if count_only:
+        return f"""
+            {with_sql}
+            SELECT COUNT(*) AS total_count,
+                   COUNT(*) FILTER (WHERE c.raw_score >= 70) AS alto_count,
+                   COUNT(*) FILTER (WHERE c.raw_score >= 40 AND c.raw_score < 70) AS medio_count
+            {source}
+        """
+    return f"""
+        {with_sql}
+        SELECT {columns}{counts if with_counts else ""}
+        {source}
+        ORDER BY {CONFIDENCE_ORDER_SQL + "," if rank_by_confidence else ""}
+                 {tie_order}
+        LIMIT :limit OFFSET :offset
+    """
+
+# Score e nível já calculados, para colunas de ranked_search_sql (exportação)
+CONFIDENCE_COLUMNS_SQL = """
+    LEAST(GREATEST(c.raw_score, 0), 100) AS confidence_score,
+    CASE WHEN c.raw_score >= 70 THEN 'alto' WHEN c.raw_score >= 40 THEN 'medio' ELSE 'baixo' END AS confidence_level
+"""
+
+def stats_from_counts(row) -> Dict:
+    """confidence_stats a partir das contagens de ranked_search_sql"""
+    if row is None or not row.total_count:
+        return dict(EMPTY_STATS)
+    return {
+        "total": row.total_count,
+        "alto": row.alto_count,
+        "medio": row.medio_count,
+        "baixo": row.total_count - row.alto_count - row.medio_count,
+    }
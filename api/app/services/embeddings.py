@@ -0,0 +1,223 @@
+# api/app/services/embeddings.py
+
+import hashlib
+import logging
+import time
+import zlib
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.text_search import FTS_MATCH_SQL, FTS_RANK_SQL, fts_params
+from app.utils.text import extract_keywords
+
+logger = logging.getLogger(__name__)
+
+# Muda quando o encoder muda: força recalcular todos os embeddings
+ENCODER_VERSION = "hash-ngram-v1"
+
+# Peso de cada campo no embedding do produto
+FIELD_WEIGHTS = (("title", 2.0), ("description", 1.0), ("applications", 0.5))
+# Peso de cada n-grama de caracteres em relação à palavra inteira
+NGRAM_WEIGHT = 0.3
+NGRAM_SIZES = (3, 4)
+
+@lru_cache(maxsize=100_000)
+def _token_slots(token: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Posições e pesos (com sinal) de uma palavra e dos seus n-gramas de
+    caracteres no vetor. crc32 e não hash(): o resultado não pode mudar
+    entre processos.
+    """
+    features = [(token, 1.0)]
+    padded = f"<{token}>"
+    for size in NGRAM_SIZES:
+        features.extend((padded[i:i + size], NGRAM_WEIGHT) for i in range(len(padded) - size + 1))
+
+    slots = np.empty(len(features), dtype=np.int64)
+    weights = np.empty(len(features), dtype=np.float32)
+    for i, (feature, weight) in enumerate(features):
+        h = zlib.crc32(feature.encode())
+        slots[i] = h % settings.embedding_dim
+        weights[i] = weight if h & 0x80000000 else -weight
+    return slots, weights
+
+def embed_text(fields: Sequence[Tuple[Optional[str], float]]) -> Optional[np.ndarray]:
+    """
+    Encoder local e determinístico: projeção por hashing das palavras e
+    n-gramas de caracteres (texto sem acentos), em escala log e com norma 1.
+    Retorna None quando não há texto.
+    """
+    vector = np.zeros(settings.embedding_dim, dtype=np.float32)
+    for value, field_weight in fields:
+        for token in extract_keywords(value or ""):
+            slots, weights = _token_slots(token)
+            np.add.at(vector, slots, weights * field_weight)
+
+    vector = np.sign(vector) * np.log1p(np.abs(vector))
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return None
+    return vector / norm
+
+def embed_query(q: str) -> Optional[np.ndarray]:
+    return embed_text([(q, 1.0)])
+
+def embed_product(row) -> Optional[np.ndarray]:
+    return embed_text([(getattr(row, field), weight) for field, weight in FIELD_WEIGHTS])
+
+def content_hash(row) -> str:
+    """Hash do conteúdo embedado; igual ao gravado = embedding em dia"""
+    content = "\x00".join([ENCODER_VERSION] + [getattr(row, field) or "" for field, _ in FIELD_WEIGHTS])
+    return hashlib.sha1(content.encode()).hexdigest()
+
+def vector_literal(vector: np.ndarray) -> str:
+    """Formato texto do pgvector ('[0.1,0.2,...]')"""
+    return "[" + ",".join(f"{value:.6f}" for value in vector) + "]"
+
+def check_embedding_dim() -> None:
+    """
+    Confere no startup se a coluna product_embeddings.embedding tem
+    settings.embedding_dim dimensões; com outro valor todo INSERT e toda
+    busca vetorial falhariam. Sem a tabela (migração pendente) não há o
+    que conferir.
+    """
+    db = SessionLocal()
+    try:
+        column_type = db.execute(text("""
+            SELECT format_type(atttypid, atttypmod)
+            FROM pg_attribute
+            WHERE attrelid = to_regclass('product_embeddings') AND attname = 'embedding'
+        """)).scalar()
+    except SQLAlchemyError as e:
+        logger.error(f"Erro ao conferir dimensão dos embeddings: {e}")
+        return
+    finally:
+        db.close()
+
+    expected = f"vector({settings.embedding_dim})"
+    if column_type is not None and column_type != expected:
+        raise RuntimeError(
+            f"product_embeddings.embedding é {column_type}, mas settings.embedding_dim pede {expected}; "
+            "recrie a coluna ou ajuste EMBEDDING_DIM"
+        )
+
+def sync_embeddings(
+    product_ids: Optional[List[int]] = None,
+    batch_size: int = settings.embedding_batch_size,
+    progress: Optional[Callable[[Dict], None]] = None,
+) -> Dict:
+    """
+    Recalcula os embeddings cujo conteúdo mudou. Os produtos são lidos em
+    lotes por um cursor no servidor e cada lote é gravado e commitado em
+    seguida; produtos sem texto perdem o embedding.
+    """
+    started = time.perf_counter()
+    stats = {"scanned": 0, "updated": 0, "removed": 0, "unchanged": 0}
+
+    where = "WHERE p.id = ANY(:ids)" if product_ids is not None else ""
+    query = text(f"""
+        SELECT p.id, p.title, p.description, p.applications, e.content_hash
+        FROM products p
+        LEFT JOIN product_embeddings e ON e.product_id = p.id
+        {where}
+        ORDER BY p.id
+    """)
+
+    # Leitura e escrita em sessões separadas: o commit de cada lote não
+    # pode fechar o cursor da leitura
+    read_db = SessionLocal()
+    write_db = SessionLocal()
+    try:
+        result = read_db.execute(query, {"ids": product_ids}, execution_options={"yield_per": batch_size})
+        for rows in result.partitions():
+            upserts = []
+            removed = []
+            for row in rows:
+                new_hash = content_hash(row)
+                if new_hash == row.content_hash:
+                    stats["unchanged"] += 1
+                    continue
+                vector = embed_product(row)
+                if vector is None:
+                    removed.append(row.id)
+                else:
+                    upserts.append({"id": row.id, "embedding": vector_literal(vector), "hash": new_hash})
+
+            if upserts:
+                write_db.execute(text("""
+                    INSERT INTO product_embeddings (product_id, embedding, content_hash, updated_at)
+                    VALUES (:id, CAST(:embedding AS vector), :hash, NOW())
+                    ON CONFLICT (product_id) DO UPDATE
+                    SET embedding = EXCLUDED.embedding,
+                        content_hash = EXCLUDED.content_hash,
+                        updated_at = EXCLUDED.updated_at
+                """), upserts)
+            if removed:
+                write_db.execute(text("DELETE FROM product_embeddings WHERE product_id = ANY(:ids)"), {"ids": removed})
+            write_db.commit()
+
+            stats["scanned"] += len(rows)
+            stats["updated"] += len(upserts)
+            stats["removed"] += len(removed)
+            if progress:
+                progress(dict(stats))
+    finally:
+        read_db.close()
+        write_db.close()
+
+    stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    logger.info(f"Embeddings sincronizados: {stats}")
+    return stats
+
+# Busca híbrida: vizinhos mais próximos no HNSW + resultados léxicos (FTS),
+# fundidos por reciprocal rank fusion. Gera "hybrid_hits(product_id, rrf)".
+HYBRID_MATCH_CTE = f"""
+    lexical AS (
+        SELECT id AS product_id, ROW_NUMBER() OVER (ORDER BY {FTS_RANK_SQL} DESC, id) AS rnk
+        FROM products
+        WHERE {FTS_MATCH_SQL}
+        ORDER BY rnk
+        LIMIT :candidates
+    ),
+    nearest AS (
+        SELECT product_id, embedding <=> CAST(:query_vector AS vector) AS distance
+        FROM product_embeddings
+        ORDER BY distance
+        LIMIT :candidates
+    ),
+    semantic AS (
+        SELECT product_id, ROW_NUMBER() OVER (ORDER BY distance) AS rnk
+        FROM nearest
+    ),
+    hybrid_hits AS (
+        SELECT product_id, SUM(1.0 / (:rrf_k + rnk)) AS rrf
+        FROM (SELECT * FROM lexical UNION ALL SELECT * FROM semantic) ranked
+        GROUP BY product_id
+    )
+"""
+
+# Constante usual do RRF: reduz o peso das primeiras posições de cada lista
+RRF_K = 60
+
+# O HNSW devolve no máximo hnsw.ef_search vizinhos (padrão do pgvector: 40),
+# menos que "LIMIT :candidates". set_config(..., true) = SET LOCAL (SET não
+# aceita parâmetros): vale só até o fim da transação da consulta
+EF_SEARCH_SQL = "SELECT set_config('hnsw.ef_search', CAST(GREATEST(:candidates, 40) AS text), true)"
+
+def hybrid_params(q: str) -> Optional[Dict]:
+    """Parâmetros de HYBRID_MATCH_CTE; None quando a query não gera embedding"""
+    vector = embed_query(q)
+    if vector is None:
+        return None
+    return {
+        **fts_params(q),
+        "query_vector": vector_literal(vector),
+        "candidates": settings.hybrid_candidates,
+        "rrf_k": RRF_K,
+    }
@@ -0,0 +1,105 @@
+# api/app/services/export.py
+
+import csv
+import io
+import json
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.core.database import SessionLocal
+from app.services.embeddings import EF_SEARCH_SQL
+from app.services.statement_cache import statement
+from app.services.confidence import CONFIDENCE_COLUMNS_SQL, ranked_search_sql
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Linhas lidas do cursor no servidor (e enviadas ao cliente) por vez
+EXPORT_BATCH_SIZE = 500
+
+PRODUCT_EXPORT_COLUMNS = [
+    "id", "sku", "title", "description", "brand", "category", "original_codes", "base_price", "image_urls"
+]
+PRODUCT_EXPORT_SQL = ", ".join(f"p.{column}" for column in PRODUCT_EXPORT_COLUMNS)
+SEARCH_EXPORT_COLUMNS = PRODUCT_EXPORT_COLUMNS + ["confidence_score", "confidence_level"]
+
+def check_export_format(format: str) -> None:
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato inválido: {format}. Use json, {', '.join(EXPORT_FORMATS)}"
+        )
+
+def _export_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def _stream_rows(sql: str, params: Dict, format: str, columns: List[str]) -> Iterator[str]:
+    # Sessão própria: a do request pode ser fechada antes do fim do streaming
+    db = SessionLocal()
+    try:
+        if "query_vector" in params:
+            # Busca híbrida: o HNSW precisa devolver todos os candidatos (ver EF_SEARCH_SQL)
+            db.execute(statement(EF_SEARCH_SQL), {"candidates": params["candidates"]})
+        # yield_per usa cursor no servidor: memória constante qualquer que seja o resultado
+        result = db.execute(statement(sql), params, execution_options={"yield_per": EXPORT_BATCH_SIZE})
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if format == "csv":
+            writer.writerow(columns)
+
+        for rows in result.partitions():
+            for row in rows:
+                values = [_export_value(getattr(row, column)) for column in columns]
+                if format == "csv":
+                    writer.writerow(values)
+                else:
+                    buffer.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False, default=str))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+def stream_export(sql: str, params: Dict, format: str, filename: str, columns: List[str] = PRODUCT_EXPORT_COLUMNS) -> StreamingResponse:
+    """
+    Resposta em streaming (ndjson ou csv) com todas as linhas da consulta,
+    serializadas em lotes de EXPORT_BATCH_SIZE conforme chegam do banco
+    """
+    return StreamingResponse(
+        _stream_rows(sql, params, format, columns),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'}
+    )
+
+def export_products(format: str, after_id: Optional[int] = None, skip: int = 0) -> StreamingResponse:
+    """Listagem completa de produtos por id, a partir do cursor ou de skip"""
+    sql = f"""
+        SELECT {PRODUCT_EXPORT_SQL}
+        FROM products p
+        WHERE (CAST(:after_id AS BIGINT) IS NULL OR p.id > :after_id)
+        ORDER BY p.id
+        OFFSET :offset
+    """
+    params = {"after_id": after_id, "offset": skip if after_id is None else 0}
+    return stream_export(sql, params, format, "produtos")
+
+def export_search(format: str, search_type: str, search: Dict, params: Dict, skip: int = 0) -> StreamingResponse:
+    """
+    Todos os resultados de uma busca (argumentos de ranked_search_sql em
+    search), na mesma ordem da busca paginada, a partir de skip
+    """
+    sql = ranked_search_sql(search_type, f"{PRODUCT_EXPORT_SQL}, {CONFIDENCE_COLUMNS_SQL}", with_counts=False, **search)
+    # LIMIT NULL = sem limite
+    return stream_export(sql, {**params, "limit": None, "offset": skip}, format, "busca", SEARCH_EXPORT_COLUMNS)
@@ -0,0 +1,110 @@
+# api/app/services/facets.py
+
+from typing import Dict, List, Optional
+
+from fastapi import Query
+
+from app.schemas.search import SearchFilters
+from app.services.confidence import confidence_score_sql
+
+# Facetas: nome -> expressão sobre products (alias "p")
+FACETS = {
+    "brand": "p.brand",
+    "category": "p.category",
+    "product_type": "p.product_type",
+    "has_price": "COALESCE(p.base_price, 0) > 0",
+    "has_image": "btrim(COALESCE(p.image_urls, '')) NOT IN ('', '[]')",
+}
+
+def search_filters(
+    brand_ids: Optional[List[str]] = Query(None),
+    category_ids: Optional[List[str]] = Query(None),
+    product_types: Optional[List[str]] = Query(None),
+    has_price: Optional[bool] = None,
+    has_image: Optional[bool] = None,
+    min_conf: Optional[int] = Query(None, ge=0, le=100),
+) -> SearchFilters:
+    """Dependency: SearchFilters a partir da query string (parâmetros repetidos para listas)"""
+    return SearchFilters(
+        brand_ids=brand_ids,
+        category_ids=category_ids,
+        product_types=product_types,
+        has_price=has_price,
+        has_image=has_image,
+        min_conf=min_conf,
+    )
+
+def filters_cache_key(filters: SearchFilters) -> Dict:
+    return filters.model_dump(exclude_none=True)
+
+def filter_sql(filters: SearchFilters, params: Dict) -> str:
+    """
+    Condições dos filtros sobre "p" (e "c.raw_score" para min_conf);
+    os valores vão em params
+    """
+    conditions = []
+    if filters.brand_ids:
+        conditions.append("p.brand = ANY(:filter_brands)")
+        params["filter_brands"] = filters.brand_ids
+    if filters.category_ids:
+        conditions.append("p.category = ANY(:filter_categories)")
+        params["filter_categories"] = filters.category_ids
+    if filters.product_types:
+        conditions.append("p.product_type = ANY(:filter_product_types)")
+        params["filter_product_types"] = filters.product_types
+    if filters.has_price is not None:
+        conditions.append(f"({FACETS['has_price']}) = :filter_has_price")
+        params["filter_has_price"] = filters.has_price
+    if filters.has_image is not None:
+        conditions.append(f"({FACETS['has_image']}) = :filter_has_image")
+        params["filter_has_image"] = filters.has_image
+    if filters.min_conf is not None:
+        conditions.append("LEAST(GREATEST(c.raw_score, 0), 100) >= :filter_min_conf")
+        params["filter_min_conf"] = filters.min_conf
+    return " AND ".join(conditions) or "TRUE"
+
+def apply_filters(search: Dict, filters: SearchFilters, params: Dict) -> Dict:
+    """Acrescenta os filtros ao where_sql dos argumentos de ranked_search_sql"""
+    conditions = filter_sql(filters, params)
+    if conditions == "TRUE":
+        return search
+    return {**search, "where_sql": f"({search.get('where_sql', 'TRUE')}) AND {conditions}"}
+
+def facet_counts_sql(
+    search_type: str,
+    from_sql: str,
+    where_sql: str = "TRUE",
+    with_sql: str = "",
+    **_,
+) -> str:
+    """
+    Contagem de todas as facetas sobre o conjunto de resultados inteiro
+    (mesmos argumentos de ranked_search_sql) numa consulta só, com
+    GROUPING SETS
+    """
+    columns = ", ".join(f"{expression} AS {name}" for name, expression in FACETS.items())
+    groupings = ", ".join(f"GROUPING({name}) AS g_{name}" for name in FACETS)
+    sets = ", ".join(f"({name})" for name in FACETS)
+    return f"""
+        {with_sql}
+        SELECT {", ".join(FACETS)}, {groupings}, COUNT(*) AS count
+        FROM (
+            SELECT {columns}
+            {from_sql}
+            CROSS JOIN LATERAL (SELECT {confidence_score_sql(search_type)} AS raw_score) c
+            WHERE {where_sql}
+        ) matches
+        GROUP BY GROUPING SETS ({sets})
+    """
+
+def facets_from_rows(rows) -> Dict[str, List[Dict]]:
+    """{faceta: [{"value", "count"}]} em ordem de contagem"""
+    facets: Dict[str, List[Dict]] = {name: [] for name in FACETS}
+    for row in rows:
+        for name in FACETS:
+            if getattr(row, f"g_{name}") == 0:
+                facets[name].append({"value": getattr(row, name), "count": row.count})
+                break
+    for values in facets.values():
+        values.sort(key=lambda item: -item["count"])
+    return facets
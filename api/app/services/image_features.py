@@ -0,0 +1,324 @@
+# api/app/services/image_features.py
+
+import hashlib
+import io
+import ipaddress
+import logging
+import os
+import socket
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+import numpy as np
+from PIL import Image, ImageOps
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.utils.images import parse_image_urls
+from app.utils.text import normalize_code
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+HASH_SIZE = 8          # hashes de 64 bits
+PHASH_SAMPLE = 32      # pHash: DCT sobre 32x32
+HUE_BINS = 8
+DESCRIPTOR_SIZE = HUE_BINS + 8
+
+@dataclass
+class ImageFeatures:
+    phash: int       # 64 bits, sem sinal
+    dhash: int       # 64 bits, sem sinal
+    descriptor: np.ndarray  # float32[DESCRIPTOR_SIZE], valores em ~[0, 1]
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+_DCT = _dct_matrix(PHASH_SAMPLE)
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+def to_signed64(value: int) -> int:
+    """Hash sem sinal -> BIGINT do Postgres"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def to_unsigned64(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+def perceptual_hash(gray: Image.Image) -> int:
+    """pHash: sinal das frequências baixas da DCT em relação à mediana"""
+    pixels = np.asarray(gray.resize((PHASH_SAMPLE, PHASH_SAMPLE), Image.LANCZOS), dtype=np.float32)
+    dct = _DCT @ pixels @ _DCT.T
+    low = dct[:HASH_SIZE, :HASH_SIZE]
+    # O termo DC (brilho médio) fica fora da mediana
+    median = np.median(low.ravel()[1:])
+    return _bits_to_int(low > median)
+
+def difference_hash(gray: Image.Image) -> int:
+    """dHash: gradiente horizontal sobre 9x8"""
+    pixels = np.asarray(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+def shape_color_descriptor(image: Image.Image) -> np.ndarray:
+    """
+    Descritor pequeno de cor e forma: histograma de matiz ponderado pela
+    saturação, saturação/brilho médios, proporção da imagem, fração e
+    caixa do objeto (pixels diferentes do fundo) e densidade de bordas
+    """
+    small = image.resize((64, 64), Image.BILINEAR)
+    hsv = np.asarray(small.convert("HSV"), dtype=np.float32) / 255.0
+    hue, saturation, value = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+
+    hue_hist, _ = np.histogram(hue, bins=HUE_BINS, range=(0.0, 1.0), weights=saturation)
+    hue_hist = hue_hist / hue_hist.sum() if hue_hist.sum() > 0 else hue_hist
+
+    gray = np.asarray(small.convert("L"), dtype=np.float32) / 255.0
+    border = np.concatenate([gray[0], gray[-1], gray[:, 0], gray[:, -1]])
+    foreground = np.abs(gray - np.median(border)) > 0.12
+    fill = foreground.mean()
+    if foreground.any():
+        rows = np.flatnonzero(foreground.any(axis=1))
+        cols = np.flatnonzero(foreground.any(axis=0))
+        box_height = (rows[-1] - rows[0] + 1) / 64
+        box_width = (cols[-1] - cols[0] + 1) / 64
+        center_y, center_x = [coords.mean() / 63 for coords in np.nonzero(foreground)]
+    else:
+        box_height = box_width = 0.0
+        center_y = center_x = 0.5
+
+    gradient_x = np.abs(np.diff(gray, axis=1))
+    gradient_y = np.abs(np.diff(gray, axis=0))
+    edges = ((gradient_x[:-1, :] + gradient_y[:, :-1]) > 0.15).mean()
+
+    width, height = image.size
+    aspect = width / (width + height)
+
+    return np.array(
+        list(hue_hist) + [saturation.mean(), value.mean(), aspect, fill, box_width, box_height, edges, (center_x + center_y) / 2],
+        dtype=np.float32
+    )
+
+def compute_features(data: bytes) -> ImageFeatures:
+    """Hashes e descritor de uma imagem (bytes de jpg/png/webp)"""
+    with Image.open(io.BytesIO(data)) as opened:
+        image = ImageOps.exif_transpose(opened).convert("RGB")
+    gray = image.convert("L")
+    return ImageFeatures(
+        phash=perceptual_hash(gray),
+        dhash=difference_hash(gray),
+        descriptor=shape_color_descriptor(image),
+    )
+
+# ---- imagens locais e cache das image_urls dos produtos ----
+
+def cached_image_path(url: str) -> str:
+    """Arquivo no cache local para uma URL de imagem de produto"""
+    extension = os.path.splitext(url.split("?")[0])[1].lower()
+    if extension not in IMAGE_EXTENSIONS:
+        extension = ".img"
+    return os.path.join(settings.image_cache_path, hashlib.sha1(url.encode()).hexdigest() + extension)
+
+def _fetch_cached(url: str, client: Optional[httpx.Client]) -> Optional[bytes]:
+    path = cached_image_path(url)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    if client is None:
+        return None
+
+    try:
+        response = client.get(url)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        logger.warning(f"Erro ao baixar imagem {url}: {e}")
+        return None
+
+    os.makedirs(settings.image_cache_path, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(response.content)
+    return response.content
+
+# ---- imagem da consulta (URL vinda do cliente) ----
+
+def _is_product_image_url(url: str) -> bool:
+    """A URL está nas image_urls de algum produto?"""
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            text("SELECT image_urls FROM products WHERE strpos(image_urls, :url) > 0 LIMIT 20"),
+            {"url": url}
+        )
+        return any(url in parse_image_urls(row.image_urls) for row in rows)
+    finally:
+        db.close()
+
+def _public_address(host: str, port: int) -> Optional[str]:
+    """Primeiro IP de host se todos os endereços resolvidos forem públicos; None caso contrário"""
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        return None
+    addresses = [ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos]
+    if not addresses or not all(address.is_global for address in addresses):
+        return None
+    return str(addresses[0])
+
+def fetch_query_image(url: str) -> Optional[bytes]:
+    """
+    Imagem informada por URL na busca; None se recusada ou se falhar.
+
+    Só aceita URLs que já estão nas image_urls de algum produto (lidas do
+    cache local quando já baixadas) ou de hosts em image_url_allowlist.
+    O host precisa resolver só para endereços públicos e a conexão vai
+    para o IP verificado (sem nova resolução nem redirecionamentos); o
+    download para em max_upload_size e não é gravado no cache.
+    """
+    parsed = urlsplit(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return None
+
+    host = parsed.hostname.lower()
+    if host not in settings.image_url_allowlist:
+        if not _is_product_image_url(url):
+            logger.warning(f"URL de imagem recusada (fora das imagens de produtos): {url}")
+            return None
+        path = cached_image_path(url)
+        if os.path.exists(path):
+            return _read_file(path)
+
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    address = _public_address(host, port)
+    if address is None:
+        logger.warning(f"URL de imagem recusada (endereço não público): {url}")
+        return None
+
+    netloc = f"[{address}]" if ":" in address else address
+    pinned = urlunsplit((parsed.scheme, f"{netloc}:{port}", parsed.path or "/", parsed.query, ""))
+    headers = {"Host": parsed.netloc.rsplit("@", 1)[-1]}
+    extensions = {"sni_hostname": host} if parsed.scheme == "https" else {}
+
+    try:
+        with httpx.Client(timeout=settings.image_download_timeout_seconds, follow_redirects=False) as client:
+            with client.stream("GET", pinned, headers=headers, extensions=extensions) as response:
+                response.raise_for_status()
+                if int(response.headers.get("content-length") or 0) > settings.max_upload_size:
+                    return None
+                data = bytearray()
+                for chunk in response.iter_bytes():
+                    data.extend(chunk)
+                    if len(data) > settings.max_upload_size:
+                        return None
+                return bytes(data)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning(f"Erro ao baixar imagem {url}: {e}")
+        return None
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def _upload_images(paths: Optional[List[str]]) -> Iterator[str]:
+    if paths is not None:
+        yield from paths
+        return
+    cache_dir = os.path.abspath(settings.image_cache_path)
+    for root, _, files in os.walk(settings.upload_path):
+        if os.path.abspath(root).startswith(cache_dir):
+            continue
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, name)
+
+def process_images(
+    image_paths: Optional[List[str]] = None,
+    download: bool = True,
+    progress: Optional[Callable[[Dict], None]] = None,
+) -> Dict:
+    """
+    Calcula e grava em image_features as características das imagens de
+    uploads/ (ou das informadas) e das image_urls dos produtos, pelo cache
+    local (baixando o que faltar se download=True). Imagens com o mesmo
+    conteúdo já processado são puladas.
+    """
+    stats = {"processed": 0, "unchanged": 0, "errors": 0}
+    db = SessionLocal()
+    client = httpx.Client(timeout=settings.image_download_timeout_seconds, follow_redirects=True) if download else None
+    try:
+        known = dict(db.execute(text("SELECT source, content_hash FROM image_features")).fetchall())
+        sku_ids = {
+            normalize_code(row.sku): row.id
+            for row in db.execute(text("SELECT id, sku FROM products WHERE sku IS NOT NULL"))
+        }
+
+        sources: List[Tuple[str, Optional[int], Callable[[], Optional[bytes]]]] = []
+        for path in _upload_images(image_paths):
+            # Upload com nome igual ao SKU (ex.: RV0402.0020.jpg) fica ligado ao produto
+            stem = normalize_code(os.path.splitext(os.path.basename(path))[0])
+            sources.append((path, sku_ids.get(stem), lambda path=path: _read_file(path)))
+
+        if image_paths is None:
+            for row in db.execute(text("SELECT id, image_urls FROM products WHERE image_urls IS NOT NULL AND image_urls <> ''")):
+                for url in parse_image_urls(row.image_urls):
+                    sources.append((url, row.id, lambda url=url: _fetch_cached(url, client)))
+
+        for i, (source, product_id, read) in enumerate(sources):
+            try:
+                data = read()
+                if data is None:
+                    continue
+                digest = hashlib.sha1(data).hexdigest()
+                if known.get(source) == digest:
+                    stats["unchanged"] += 1
+                    continue
+
+                features = compute_features(data)
+                # Savepoint por imagem: um erro no INSERT não aborta a transação do lote
+                with db.begin_nested():
+                    db.execute(text("""
+                        INSERT INTO image_features (source, product_id, phash, dhash, descriptor, content_hash, updated_at)
+                        VALUES (:source, :product_id, :phash, :dhash, :descriptor, :content_hash, NOW())
+                        ON CONFLICT (source) DO UPDATE
+                        SET product_id = EXCLUDED.product_id,
+                            phash = EXCLUDED.phash,
+                            dhash = EXCLUDED.dhash,
+                            descriptor = EXCLUDED.descriptor,
+                            content_hash = EXCLUDED.content_hash,
+                            updated_at = EXCLUDED.updated_at
+                    """), {
+                        "source": source,
+                        "product_id": product_id,
+                        "phash": to_signed64(features.phash),
+                        "dhash": to_signed64(features.dhash),
+                        "descriptor": [float(value) for value in features.descriptor],
+                        "content_hash": digest,
+                    })
+                stats["processed"] += 1
+            except Exception as e:
+                logger.warning(f"Erro ao processar imagem {source}: {e}")
+                stats["errors"] += 1
+
+            if (i + 1) % 100 == 0:
+                db.commit()
+                if progress:
+                    progress({**stats, "current": i + 1, "total": len(sources)})
+
+        db.commit()
+    finally:
+        db.close()
+        if client is not None:
+            client.close()
+
+    logger.info(f"Imagens processadas: {stats}")
+    return stats
@@ -0,0 +1,228 @@
+# api/app/services/image_index.py
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.image_features import DESCRIPTOR_SIZE, ImageFeatures, to_unsigned64
+
+logger = logging.getLogger(__name__)
+
+# Multi-index hashing: o pHash de 64 bits é dividido em 4 blocos de 16 bits,
+# cada um com sua tabela (valores distintos do bloco, ordenados, e as imagens
+# de cada um). Se dois hashes diferem em d bits, algum bloco difere em até
+# d // 4 bits (casa das gavetas): depois de sondar os valores a até r bits
+# do bloco da consulta, toda imagem ainda não vista está a 4*(r + 1) bits ou
+# mais e sua distância combinada é pelo menos PHASH_WEIGHT * 4*(r + 1) / 64.
+CHUNKS = 4
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# Peso de cada sinal na distância combinada (0 = idêntica, 1 = nada a ver)
+PHASH_WEIGHT = 0.5
+DHASH_WEIGHT = 0.3
+DESCRIPTOR_WEIGHT = 0.2
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# Tabela de um bloco: (valores distintos, início e fim de cada um em order, order)
+ChunkTable = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+def hamming(hashes: np.ndarray, value: int) -> np.ndarray:
+    """Distância de Hamming entre um array de uint64 e um hash"""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return _POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+def _chunk_hamming(values: np.ndarray, value: int) -> np.ndarray:
+    """Distância de Hamming entre valores de 16 bits e um bloco"""
+    xor = np.bitwise_xor(values, value)
+    return _POPCOUNT[xor & 0xFF] + _POPCOUNT[xor >> 8]
+
+def _members(starts: np.ndarray, ends: np.ndarray, order: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """Imagens dos valores keys de uma tabela, sem laço em Python"""
+    lengths = ends[keys] - starts[keys]
+    offsets = np.repeat(starts[keys] - np.cumsum(lengths) + lengths, lengths)
+    return order[offsets + np.arange(lengths.sum())]
+
+def _chunks(value: int) -> List[int]:
+    return [(value >> (CHUNK_BITS * i)) & CHUNK_MASK for i in range(CHUNKS)]
+
+class ImageIndex:
+    """Índice em memória das características de image_features"""
+
+    def __init__(self):
+        self.ready = False
+        self.signature: Tuple = ()
+        self.loaded_at: Optional[float] = None
+        self.last_query_ms = 0.0
+        self._phash = np.zeros(0, dtype=np.uint64)
+        self._dhash = np.zeros(0, dtype=np.uint64)
+        self._descriptors = np.zeros((0, DESCRIPTOR_SIZE), dtype=np.float32)
+        self._product_ids = np.zeros(0, dtype=np.int64)
+        self._tables: List[ChunkTable] = []
+        self._lock = threading.Lock()
+
+    def load(self, db: Session) -> None:
+        """Carga completa a partir de image_features"""
+        started = time.perf_counter()
+        signature = _signature(db)
+        rows = db.execute(text("""
+            SELECT product_id, phash, dhash, descriptor
+            FROM image_features
+            WHERE product_id IS NOT NULL
+            ORDER BY id
+        """)).fetchall()
+        self.load_rows(rows, signature)
+        logger.info(f"Índice de imagens carregado: {len(rows)} imagens, {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def load_rows(self, rows: Sequence, signature: Tuple = ()) -> None:
+        """
+        Monta as estruturas a partir das linhas (product_id, phash, dhash,
+        descriptor) e troca de uma vez
+        """
+        phash = np.array([to_unsigned64(row.phash) for row in rows], dtype=np.uint64)
+        dhash = np.array([to_unsigned64(row.dhash) for row in rows], dtype=np.uint64)
+        descriptors = np.array([row.descriptor for row in rows], dtype=np.float32).reshape(-1, DESCRIPTOR_SIZE)
+        product_ids = np.array([row.product_id for row in rows], dtype=np.int64)
+
+        tables: List[ChunkTable] = []
+        for i in range(CHUNKS):
+            chunk = ((phash >> np.uint64(CHUNK_BITS * i)) & np.uint64(CHUNK_MASK)).astype(np.int64)
+            order = np.argsort(chunk, kind="stable")
+            values, starts = np.unique(chunk[order], return_index=True)
+            tables.append((values, starts, np.append(starts[1:], len(order)), order))
+
+        with self._lock:
+            self._phash, self._dhash = phash, dhash
+            self._descriptors, self._product_ids = descriptors, product_ids
+            self._tables = tables
+            self.signature = signature
+            self.ready = True
+            self.loaded_at = time.time()
+
+    def refresh(self, db: Session) -> bool:
+        """Recarrega se image_features mudou"""
+        if self.ready and _signature(db) == self.signature:
+            return False
+        self.load(db)
+        return True
+
+    def search(self, features: ImageFeatures, limit: int = 10) -> List[Tuple[int, float, Dict]]:
+        """
+        Produtos mais parecidos com a imagem: [(product_id, distância, detalhes)],
+        uma entrada por produto (a melhor imagem dele)
+        """
+        started = time.perf_counter()
+        with self._lock:
+            phash, dhash = self._phash, self._dhash
+            descriptors, product_ids, tables = self._descriptors, self._product_ids, self._tables
+        if not len(phash):
+            return []
+
+        # Distância de cada valor distinto de cada bloco ao bloco da consulta
+        probes = [
+            (_chunk_hamming(values, chunk), starts, ends, order)
+            for chunk, (values, starts, ends, order) in zip(_chunks(features.phash), tables)
+        ]
+        seen_rows = np.zeros(len(phash), dtype=bool)
+        candidates = np.zeros(0, dtype=np.int64)
+        distance = phash_distance = dhash_distance = descriptor_distance = np.zeros(0)
+        for radius in range(CHUNK_BITS + 1):
+            rows = np.unique(np.concatenate([
+                _members(starts, ends, order, np.flatnonzero(key_distance == radius))
+                for key_distance, starts, ends, order in probes
+            ]))
+            rows = rows[~seen_rows[rows]]
+            if len(rows):
+                seen_rows[rows] = True
+                new_phash = hamming(phash[rows], features.phash) / 64
+                new_dhash = hamming(dhash[rows], features.dhash) / 64
+                new_descriptor = np.minimum(
+                    np.linalg.norm(descriptors[rows] - features.descriptor, axis=1) / np.sqrt(DESCRIPTOR_SIZE) * 2, 1.0
+                )
+                candidates = np.concatenate([candidates, rows])
+                phash_distance = np.concatenate([phash_distance, new_phash])
+                dhash_distance = np.concatenate([dhash_distance, new_dhash])
+                descriptor_distance = np.concatenate([descriptor_distance, new_descriptor])
+                distance = np.concatenate([
+                    distance, PHASH_WEIGHT * new_phash + DHASH_WEIGHT * new_dhash + DESCRIPTOR_WEIGHT * new_descriptor
+                ])
+
+            # Para quando o limit-ésimo produto já é tão próximo quanto
+            # qualquer imagem ainda não vista pode ser
+            bound = PHASH_WEIGHT * CHUNKS * (radius + 1) / 64
+            if np.count_nonzero(distance <= bound) >= limit:
+                ranked = np.argsort(distance, kind="stable")
+                _, first = np.unique(product_ids[candidates[ranked]], return_index=True)
+                if len(first) >= limit and distance[ranked[np.sort(first)[limit - 1]]] <= bound:
+                    break
+
+        results = []
+        seen = set()
+        for i in np.argsort(distance, kind="stable"):
+            product_id = int(product_ids[candidates[i]])
+            if product_id in seen:
+                continue
+            seen.add(product_id)
+            results.append((product_id, float(distance[i]), {
+                "phash_distance": int(round(phash_distance[i] * 64)),
+                "dhash_distance": int(round(dhash_distance[i] * 64)),
+                "descriptor_distance": round(float(descriptor_distance[i]), 4),
+            }))
+            if len(results) >= limit:
+                break
+
+        self.last_query_ms = (time.perf_counter() - started) * 1000
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "images": int(len(self._phash)),
+            "products": int(len(np.unique(self._product_ids))),
+            "last_query_ms": round(self.last_query_ms, 2),
+            "loaded_at": self.loaded_at,
+        }
+
+def _signature(db: Session) -> Tuple:
+    row = db.execute(text("SELECT COUNT(*), MAX(updated_at) FROM image_features")).first()
+    return tuple(row)
+
+image_index = ImageIndex()
+_refresh_task: Optional[asyncio.Task] = None
+
+def _refresh_image_index() -> None:
+    db = SessionLocal()
+    try:
+        image_index.refresh(db)
+    finally:
+        db.close()
+
+async def start_image_index() -> None:
+    """Carrega o índice no startup e recarrega quando process_images grava algo"""
+    if not settings.image_index_enabled:
+        return
+
+    try:
+        await asyncio.to_thread(_refresh_image_index)
+    except Exception as e:
+        logger.error(f"Erro ao carregar índice de imagens: {e}")
+
+    global _refresh_task
+    _refresh_task = asyncio.create_task(_refresh_loop())
+
+async def _refresh_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.image_index_refresh_seconds)
+        try:
+            await asyncio.to_thread(_refresh_image_index)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar índice de imagens: {e}")
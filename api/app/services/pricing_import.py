@@ -8,6 +8,7 @@ import logging
 
 from app.core.database import get_db
 from app.models.product import Product
+from app.services.search_cache import bump_catalog_version
 
 logger = logging.getLogger(__name__)
 
@@ -180,6 +181,7 @@ class PricingDataImporter:
             
             # Commit final
             self.db.commit()
+            bump_catalog_version()
             
             # Atualizar regras NCM baseadas nos dados importados
             self._update_ncm_rules()
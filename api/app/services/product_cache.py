@@ -0,0 +1,204 @@
+# api/app/services/product_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.services.search_cache import CATALOG_VERSION_KEY, _mark_unavailable, get_async_redis
+from app.services.statement_cache import statement
+from app.utils.product_doc import PRODUCT_DOC_COLUMN
+
+# Dois caminhos indexados em vez de "id = :id OR sku = :sku" (que não usa
+# nenhum índice): PK quando o valor é numérico e ix_products_sku (0008)
+PRODUCT_BY_ID_SQL = f"SELECT {PRODUCT_DOC_COLUMN} FROM products p WHERE p.id = :id"
+PRODUCT_BY_SKU_SQL = f"SELECT {PRODUCT_DOC_COLUMN} FROM products p WHERE p.sku = :sku LIMIT 1"
+
+MAX_PRODUCT_ID = 2_147_483_647
+
+async def load_product_doc(db: AsyncSession, product_id: str) -> Optional[str]:
+    """product_doc pelo id ou, se não houver produto com esse id, pelo SKU"""
+    if product_id.isdecimal() and int(product_id) <= MAX_PRODUCT_ID:
+        doc = (await db.execute(statement(PRODUCT_BY_ID_SQL), {"id": int(product_id)})).scalar()
+        if doc is not None:
+            return doc
+    return (await db.execute(statement(PRODUCT_BY_SKU_SQL), {"sku": product_id})).scalar()
+
+PRODUCTS_BATCH_SQL = f"""
+    SELECT p.id, p.sku, {PRODUCT_DOC_COLUMN}
+    FROM products p
+    WHERE p.id = ANY(:ids) OR p.sku = ANY(:skus)
+"""
+
+async def load_product_docs(db: AsyncSession, ids: List[str], skus: List[str]) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Vários produtos numa consulta só (PK e ix_products_sku). Retorna
+    ({id: product_doc}, {sku: product_doc}); ids não numéricos são ignorados.
+    """
+    int_ids = [int(product_id) for product_id in ids if product_id.isdecimal() and int(product_id) <= MAX_PRODUCT_ID]
+    if not int_ids and not skus:
+        return {}, {}
+    rows = await db.execute(statement(PRODUCTS_BATCH_SQL), {"ids": int_ids, "skus": skus})
+    by_id, by_sku = {}, {}
+    for row in rows:
+        by_id[str(row.id)] = row.product_doc
+        if row.sku is not None:
+            by_sku.setdefault(row.sku, row.product_doc)
+    return by_id, by_sku
+
+class ProductCache:
+    """
+    Detalhe do produto (product_doc) por id ou SKU em dois níveis: LRU com
+    TTL em memória e Redis compartilhado entre os workers. As chaves levam a
+    versão do catálogo (bump_catalog_version): quando ela muda, o nível local
+    é esvaziado e as chaves antigas do Redis deixam de ser lidas.
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.product_cache_size,
+        ttl: int = settings.product_cache_ttl_seconds,
+        redis_ttl: int = settings.product_cache_redis_ttl_seconds,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis_ttl = redis_ttl
+        self.version = "0"
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.not_found = 0
+        self.evictions = 0
+        self.expired = 0
+        self.errors = 0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._version_checked = 0.0
+        self._lock = threading.Lock()
+
+    async def get(self, db: AsyncSession, product_id: str) -> Optional[str]:
+        """product_doc do produto (texto JSON) ou None se não existir"""
+        if not settings.product_cache_enabled:
+            return await load_product_doc(db, product_id)
+
+        await self._check_version()
+        doc = self._get_local(product_id)
+        if doc is not None:
+            return doc
+
+        doc = await self._get_redis(product_id)
+        if doc is not None:
+            self.redis_hits += 1
+            self._set_local(product_id, doc)
+            return doc
+
+        self.misses += 1
+        doc = await load_product_doc(db, product_id)
+        if doc is None:
+            self.not_found += 1
+            return None
+        self._set_local(product_id, doc)
+        await self._set_redis(product_id, doc)
+        return doc
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    # ---- memória local ----
+
+    def _get_local(self, product_id: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry is None:
+                return None
+            expires_at, doc = entry
+            if expires_at < time.monotonic():
+                del self._entries[product_id]
+                self.expired += 1
+                return None
+            self._entries.move_to_end(product_id)
+            self.local_hits += 1
+            return doc
+
+    def _set_local(self, product_id: str, doc: str) -> None:
+        with self._lock:
+            self._entries[product_id] = (time.monotonic() + self.ttl, doc)
+            self._entries.move_to_end(product_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # ---- Redis ----
+
+    async def _check_version(self) -> None:
+        """Relê a versão do catálogo no Redis no máximo a cada product_cache_version_check_seconds"""
+        now = time.monotonic()
+        if now - self._version_checked < settings.product_cache_version_check_seconds:
+            return
+        self._version_checked = now
+
+        client = get_async_redis()
+        if client is None:
+            return
+        try:
+            version = (await client.get(CATALOG_VERSION_KEY) or b"0").decode()
+        except redis.RedisError as e:
+            self.errors += 1
+            _mark_unavailable(e)
+            return
+        if version != self.version:
+            self.version = version
+            self.clear()
+
+    def _redis_key(self, product_id: str) -> str:
+        return f"product:v{self.version}:{product_id}"
+
+    async def _get_redis(self, product_id: str) -> Optional[str]:
+        client = get_async_redis()
+        if client is None:
+            return None
+        try:
+            cached = await client.get(self._redis_key(product_id))
+        except redis.RedisError as e:
+            self.errors += 1
+            _mark_unavailable(e)
+            return None
+        return cached.decode() if cached is not None else None
+
+    async def _set_redis(self, product_id: str, doc: str) -> None:
+        client = get_async_redis()
+        if client is None:
+            return
+        try:
+            await client.set(self._redis_key(product_id), doc, ex=self.redis_ttl)
+        except redis.RedisError as e:
+            self.errors += 1
+            _mark_unavailable(e)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = len(self._entries)
+        total = self.local_hits + self.redis_hits + self.misses
+        return {
+            "enabled": settings.product_cache_enabled,
+            "size": size,
+            "max_size": self.max_size,
+            "catalog_version": self.version,
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "not_found": self.not_found,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "errors": self.errors,
+            "hit_ratio": round((self.local_hits + self.redis_hits) / total, 4) if total else 0.0,
+            "local_hit_ratio": round(self.local_hits / total, 4) if total else 0.0,
+            "ttl_seconds": self.ttl,
+            "redis_ttl_seconds": self.redis_ttl,
+        }
+
+product_cache = ProductCache()
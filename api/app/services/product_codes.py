@@ -0,0 +1,82 @@
+# api/app/services/product_codes.py
+
+from typing import Dict, List
+
+from app.services.code_index import code_keys
+from app.utils.text import normalize_code
+
+# CTE que resolve uma busca por código usando a tabela product_codes e o
+# índice de normalize_code(sku). Gera "code_matches(product_id, match_rank)":
+#   1 = SKU exato, 2 = código OEM exato, 3 = prefixo, 4 = contém
+# Cada faixa só roda quando as anteriores não acham nada. Exato ("= ANY") e
+# prefixo ("LIKE 'X%'") são buscas nos B-trees text_pattern_ops; o
+# "LIKE '%X%'" (GIN de trigramas) fica para o fim e só com 3+ caracteres
+# (abaixo disso o trigrama varre o índice todo). A faixa exata é a mesma
+# do code_index (chaves de code_keys), então o fast path do índice devolve
+# o mesmo resultado desta consulta.
+# Parâmetros: :code_keys, :norm, :norm_prefix, :norm_term (ver code_match_params)
+CODE_MATCH_CTE = """
+    exact_hits AS (
+        SELECT id AS product_id, 1 AS match_rank
+        FROM products
+        WHERE normalize_code(sku) = ANY(CAST(:code_keys AS TEXT[]))
+        UNION ALL
+        SELECT product_id, 2
+        FROM product_codes
+        WHERE normalized_code = ANY(CAST(:code_keys AS TEXT[]))
+    ),
+    prefix_hits AS (
+        SELECT id AS product_id, 3 AS match_rank
+        FROM products
+        WHERE normalize_code(sku) LIKE :norm_prefix
+          AND NOT EXISTS (SELECT 1 FROM exact_hits)
+        UNION ALL
+        SELECT product_id, 3
+        FROM product_codes
+        WHERE normalized_code LIKE :norm_prefix
+          AND NOT EXISTS (SELECT 1 FROM exact_hits)
+    ),
+    code_hits AS (
+        SELECT product_id, match_rank FROM exact_hits
+        UNION ALL
+        SELECT product_id, match_rank FROM prefix_hits
+        UNION ALL
+        SELECT id, 4
+        FROM products
+        WHERE normalize_code(sku) LIKE :norm_term
+          AND char_length(:norm) >= 3
+          AND NOT EXISTS (SELECT 1 FROM exact_hits) AND NOT EXISTS (SELECT 1 FROM prefix_hits)
+        UNION ALL
+        SELECT product_id, 4
+        FROM product_codes
+        WHERE normalized_code LIKE :norm_term
+          AND char_length(:norm) >= 3
+          AND NOT EXISTS (SELECT 1 FROM exact_hits) AND NOT EXISTS (SELECT 1 FROM prefix_hits)
+    ),
+    code_matches AS (
+        SELECT product_id, MIN(match_rank) AS match_rank
+        FROM code_hits
+        GROUP BY product_id
+    )
+"""
+
+# Ordem de CODE_MATCH_CTE na faixa exata (SKU antes de OEM), para quando os
+# ids vêm do code_index (fast path). Parâmetro: :code_keys
+EXACT_ORDER_SQL = "normalize_code(p.sku) = ANY(CAST(:code_keys AS TEXT[])) DESC, p.title"
+
+def code_match_params(q: str) -> Dict:
+    """Parâmetros de CODE_MATCH_CTE para a query informada"""
+    normalized = normalize_code(q.strip())
+    return {
+        "code_keys": code_keys(q),
+        "norm": normalized,
+        "norm_prefix": f"{normalized}%",
+        "norm_term": f"%{normalized}%",
+    }
+
+def split_original_codes(original_codes_str: str) -> List[str]:
+    """Divide 'HY 1534017 / YA 580039672' nos códigos individuais (mesma regra do trigger)"""
+    if not original_codes_str or original_codes_str.strip() == '':
+        return []
+
+    return [code.strip() for code in original_codes_str.split(' / ') if code.strip()]
@@ -0,0 +1,151 @@
+# api/app/services/search_cache.py
+
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Optional, Tuple
+
+import orjson
+import redis
+import redis.asyncio as aioredis
+from fastapi.responses import Response
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_KEY = "catalog:version"
+TOTAL_HEADER = "X-Total-Count"
+
+# Depois de uma falha de conexão o Redis é ignorado por este tempo,
+# para a busca não pagar o timeout a cada request
+RETRY_AFTER_SECONDS = 30
+
+_client: Optional[redis.Redis] = None
+_async_client: Optional[aioredis.Redis] = None
+_unavailable_until = 0.0
+
+def get_redis() -> Optional[redis.Redis]:
+    """Cliente Redis compartilhado; None enquanto o Redis estiver fora"""
+    global _client
+    if time.monotonic() < _unavailable_until:
+        return None
+    if _client is None:
+        _client = redis.Redis.from_url(
+            settings.redis_url,
+            socket_timeout=settings.redis_timeout_seconds,
+            socket_connect_timeout=settings.redis_timeout_seconds,
+        )
+    return _client
+
+def get_async_redis() -> Optional[aioredis.Redis]:
+    """Cliente Redis assíncrono (endpoints async); mesma regra de indisponibilidade do síncrono"""
+    global _async_client
+    if time.monotonic() < _unavailable_until:
+        return None
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(
+            settings.redis_url,
+            socket_timeout=settings.redis_timeout_seconds,
+            socket_connect_timeout=settings.redis_timeout_seconds,
+        )
+    return _async_client
+
+async def close_async_redis() -> None:
+    """Shutdown: fecha as conexões do cliente assíncrono (presas ao event loop que vai fechar)"""
+    global _async_client
+    if _async_client is not None:
+        client, _async_client = _async_client, None
+        await client.aclose()
+
+def _mark_unavailable(e: Exception) -> None:
+    global _unavailable_until
+    _unavailable_until = time.monotonic() + RETRY_AFTER_SECONDS
+    logger.warning(f"Redis indisponível, cache desativado por {RETRY_AFTER_SECONDS}s: {e}")
+
+def bump_catalog_version() -> None:
+    """Invalida todo o cache de busca (entradas antigas ficam órfãs e expiram pelo TTL)"""
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.incr(CATALOG_VERSION_KEY)
+    except redis.RedisError as e:
+        _mark_unavailable(e)
+
+def cached_total(response: Response) -> Optional[int]:
+    """Total de resultados de uma resposta vinda do cache; None se não foi gravado"""
+    total = response.headers.get(TOTAL_HEADER)
+    return int(total) if total is not None else None
+
+class SearchCache:
+    """Cache de respostas de busca no Redis, versionado pela versão do catálogo"""
+
+    def __init__(self, ttl: int = settings.search_cache_ttl_seconds):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, endpoint: str, q: str, type: str = "", skip: int = 0, limit: int = 0, **extra) -> Tuple[Optional[Any], Optional[str]]:
+        """
+        Retorna (resposta em cache ou None, chave para gravar a resposta).
+        A chave carrega a versão do catálogo lida antes da consulta: se o
+        catálogo mudar no meio, a resposta é gravada numa versão que já não é lida.
+        Outros parâmetros da busca (filtros) entram na chave por extra. A
+        resposta em cache volta já como Response com o JSON gravado (e o
+        total de resultados, quando gravado, em X-Total-Count; ver cached_total).
+        """
+        client = get_async_redis() if settings.search_cache_enabled else None
+        if client is None:
+            return None, None
+
+        normalized_q = " ".join(q.lower().split())
+        extra_key = json.dumps(extra, sort_keys=True, default=str) if extra else ""
+        digest = hashlib.sha1(f"{normalized_q}|{type.lower()}|{skip}|{limit}|{extra_key}".encode()).hexdigest()
+        try:
+            version = (await client.get(CATALOG_VERSION_KEY) or b"0").decode()
+            key = f"search:{endpoint}:v{version}:{digest}"
+            cached = await client.get(key)
+        except redis.RedisError as e:
+            self.errors += 1
+            _mark_unavailable(e)
+            return None, None
+
+        if cached is None:
+            self.misses += 1
+            return None, key
+        self.hits += 1
+        headers = None
+        if not cached.startswith((b"{", b"[")):
+            # "<total>\n<json>": total gravado junto pelo set(total=...)
+            total, cached = cached.split(b"\n", 1)
+            headers = {TOTAL_HEADER: total.decode()}
+        return Response(content=cached, media_type="application/json", headers=headers), key
+
+    async def set(self, key: Optional[str], value: Any, total: Optional[int] = None) -> None:
+        """Grava a resposta; total (quantidade de resultados) volta no hit por cached_total"""
+        client = get_async_redis()
+        if key is None or client is None:
+            return
+        payload = orjson.dumps(value, default=str)
+        if total is not None:
+            payload = f"{total}\n".encode() + payload
+        try:
+            await client.set(key, payload, ex=self.ttl)
+        except redis.RedisError as e:
+            self.errors += 1
+            _mark_unavailable(e)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "ttl_seconds": self.ttl,
+        }
+
+search_cache = SearchCache()
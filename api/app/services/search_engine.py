@@ -0,0 +1,317 @@
+# api/app/services/search_engine.py
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.schemas.search import SearchExplanation, SearchFilters, SearchQuery, SearchType
+from app.services.code_index import code_index, code_keys, sku_keys
+from app.services.embeddings import EF_SEARCH_SQL, embed_query, vector_literal
+from app.services.facets import filter_sql
+from app.services.image_features import compute_features, fetch_query_image
+from app.services.image_index import image_index
+from app.services.statement_cache import statement
+from app.services.text_search import FTS_MATCH_SQL, FTS_RANK_SQL, fts_params
+from app.utils.text import extract_keywords, normalize_code, normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Sinal -> campo de Settings com o peso e campo de SearchExplanation
+SIGNAL_WEIGHTS = {
+    "code_exact": "search_code_exact_weight",
+    "code_fuzzy": "search_code_fuzzy_weight",
+    "text_sim": "search_text_weight",
+    "image_sim": "search_image_weight",
+    "app_boost": "search_app_weight",
+    "brand_boost": "search_brand_weight",
+}
+
+# Geradores de candidatos e sinais de reordenação por tipo de consulta
+GENERATORS = {
+    SearchType.codigo: ("code_exact", "code_fuzzy"),
+    SearchType.texto: ("text_sim",),
+    SearchType.imagem: ("image_sim",),
+    SearchType.hibrido: ("code_exact", "code_fuzzy", "text_sim"),
+}
+BOOSTS = {
+    SearchType.codigo: (),
+    SearchType.texto: ("app_boost", "brand_boost"),
+    SearchType.imagem: (),
+    SearchType.hibrido: ("app_boost", "brand_boost"),
+}
+
+# Similaridade por trigramas com os códigos OEM e SKUs; um código que
+# contém a query vale pelo menos a fração dele que a query cobre
+CODE_FUZZY_SQL = """
+    WITH code_hits AS (
+        SELECT product_id, code, normalized_code AS normalized
+        FROM product_codes
+        WHERE normalized_code % :norm OR normalized_code LIKE :norm_term
+        UNION ALL
+        SELECT id, sku, normalize_code(sku)
+        FROM products
+        WHERE normalize_code(sku) % :norm OR normalize_code(sku) LIKE :norm_term
+    ),
+    scored AS (
+        SELECT product_id, code,
+               GREATEST(
+                   similarity(normalized, :norm),
+                   CASE WHEN normalized LIKE :norm_term
+                        THEN length(:norm)::real / GREATEST(length(normalized), 1) ELSE 0 END
+               ) AS score
+        FROM code_hits
+    )
+    SELECT DISTINCT ON (product_id) product_id, code, score
+    FROM scored
+    ORDER BY product_id, score DESC
+"""
+
+CODE_EXACT_SQL = """
+    SELECT product_id, code FROM product_codes WHERE normalized_code = ANY(:keys)
+    UNION ALL
+    SELECT id, sku FROM products WHERE normalize_code(sku) = ANY(:keys)
+"""
+
+def text_signal_sql(semantic: bool) -> str:
+    """
+    Candidatos do FTS (e, se semantic, vizinhos no HNSW) com a maior entre
+    similaridade de cosseno e word_similarity com o título
+    """
+    nearest = """
+        UNION
+        (SELECT product_id FROM product_embeddings
+         ORDER BY embedding <=> CAST(:query_vector AS vector)
+         LIMIT :candidates)
+    """ if semantic else ""
+    cosine = "COALESCE(1 - (e.embedding <=> CAST(:query_vector AS vector)), 0)" if semantic else "0"
+    return f"""
+        WITH candidates AS (
+            (SELECT id AS product_id FROM products
+             WHERE {FTS_MATCH_SQL}
+             ORDER BY {FTS_RANK_SQL} DESC, id
+             LIMIT :candidates)
+            {nearest}
+        )
+        SELECT p.id AS product_id,
+               GREATEST({cosine}, word_similarity(:norm_exact, p.title_norm)) AS score
+        FROM candidates c
+        JOIN products p ON p.id = c.product_id
+        LEFT JOIN product_embeddings e ON e.product_id = p.id
+    """
+
+@dataclass
+class Hit:
+    row: object
+    confidence: int
+    nivel: str
+    explain: SearchExplanation
+
+@dataclass
+class EngineResult:
+    hits: List[Hit]
+    signals: List[str]
+    weights: Dict[str, float]
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+
+def signal_weights() -> Dict[str, float]:
+    return {signal: getattr(settings, name) for signal, name in SIGNAL_WEIGHTS.items()}
+
+def level(confidence: int) -> str:
+    return "alto" if confidence >= 70 else "medio" if confidence >= 40 else "baixo"
+
+class SearchEngine:
+    """
+    Busca unificada: roda só os geradores de sinal que a consulta pede,
+    combina os sinais pela média ponderada com os pesos de Settings e
+    mede o tempo de cada sinal
+    """
+
+    def __init__(self):
+        self._timings: Dict[str, List[float]] = {signal: [0, 0.0, 0.0] for signal in SIGNAL_WEIGHTS}
+        self._lock = threading.Lock()
+
+    async def search(self, db: AsyncSession, query: SearchQuery, columns: str) -> EngineResult:
+        consulta = query.consulta
+        options = query.opcoes
+        limit = options.max_resultados if options else 20
+        similar = options.incluir_similares if options else True
+        applications = options.incluir_aplicacoes if options else True
+        filters = options.filtros if options and options.filtros else SearchFilters()
+
+        # No híbrido os sinais de código só rodam se a consulta parece um código
+        looks_like_code = any(char.isdigit() for char in consulta.valor)
+        generators = [
+            signal for signal in GENERATORS[consulta.tipo]
+            if (signal != "code_fuzzy" or similar)
+            and (consulta.tipo != SearchType.hibrido or looks_like_code or not signal.startswith("code_"))
+        ]
+        boosts = [
+            signal for signal in BOOSTS[consulta.tipo]
+            if signal != "app_boost" or applications
+        ]
+        signals = generators + boosts
+        weights = signal_weights()
+        active_weight = sum(weights[signal] for signal in signals) or 1.0
+        timings: Dict[str, float] = {}
+
+        # Geradores: {product_id: (score 0-1, código casado)}
+        scores: Dict[str, Dict[int, Tuple[float, Optional[str]]]] = {}
+        for signal in generators:
+            started = time.perf_counter()
+            scores[signal] = await self._generate(signal, db, consulta.valor, similar, limit)
+            timings[signal] = self._record(signal, started)
+
+        candidate_ids = set()
+        for hits in scores.values():
+            candidate_ids.update(hits)
+        if not candidate_ids:
+            return EngineResult([], signals, weights, timings)
+
+        # min_conf é aplicado sobre a confiança final, não no SQL
+        params = {"ids": list(candidate_ids)}
+        conditions = filter_sql(filters.model_copy(update={"min_conf": None}), params)
+        rows = (await db.execute(statement(f"""
+            SELECT {columns}, p.applications
+            FROM products p
+            WHERE p.id = ANY(:ids) AND {conditions}
+        """), params)).fetchall()
+
+        keywords = set(extract_keywords(consulta.valor))
+        boost_scores: Dict[str, Dict[int, float]] = {}
+        for signal in boosts:
+            started = time.perf_counter()
+            boost = _app_boost if signal == "app_boost" else _brand_boost
+            boost_scores[signal] = {row.id: boost(row, keywords) for row in rows}
+            timings[signal] = self._record(signal, started)
+
+        min_confidence = max(int(round((consulta.confianca_min or 0) * 100)), filters.min_conf or 0)
+        hits = []
+        for row in rows:
+            explain = {}
+            contributions = {}
+            for signal in generators:
+                score, code = scores[signal].get(row.id, (0.0, None))
+                explain[signal] = round(score, 4)
+                if code and not explain.get("matched_code"):
+                    explain["matched_code"] = code
+                contributions[signal] = weights[signal] * score
+            for signal in boosts:
+                score = boost_scores[signal][row.id]
+                explain[signal] = round(score, 4)
+                contributions[signal] = weights[signal] * score
+
+            # match_type: o sinal que mais contribuiu
+            explain["match_type"] = max(contributions, key=contributions.get)
+            total = sum(contributions.values())
+
+            confidence = min(100, max(0, int(round(total / active_weight * 100))))
+            if confidence < min_confidence:
+                continue
+            hits.append(Hit(row, confidence, level(confidence), SearchExplanation(**explain)))
+
+        hits.sort(key=lambda hit: (-hit.confidence, hit.row.title or "", hit.row.id))
+        return EngineResult(hits[:limit], signals, weights, timings)
+
+    # ---- geradores ----
+
+    async def _generate(self, signal: str, db: AsyncSession, valor: str, similar: bool, limit: int) -> Dict[int, Tuple[float, Optional[str]]]:
+        if signal == "code_exact":
+            return await _code_exact(db, valor)
+        if signal == "code_fuzzy":
+            return await _code_fuzzy(db, valor)
+        if signal == "text_sim":
+            return await _text_sim(db, valor, similar)
+        # Download e hashes fora do event loop
+        return await asyncio.to_thread(_image_sim, valor, limit)
+
+    def _record(self, signal: str, started: float) -> float:
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            timing = self._timings[signal]
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = elapsed
+        return round(elapsed, 2)
+
+    def stats(self) -> Dict:
+        weights = signal_weights()
+        with self._lock:
+            return {
+                signal: {
+                    "weight": weights[signal],
+                    "calls": calls,
+                    "avg_ms": round(total / calls, 2) if calls else 0.0,
+                    "last_ms": round(last, 2),
+                }
+                for signal, (calls, total, last) in self._timings.items()
+            }
+
+async def _code_exact(db: AsyncSession, valor: str) -> Dict[int, Tuple[float, Optional[str]]]:
+    if code_index.ready:
+        keys = set(sku_keys(valor.strip()))
+        hits = {}
+        for product_id in code_index.lookup(valor):
+            sku = (code_index.product(product_id) or ("", ""))[0]
+            hits[product_id] = (1.0, sku if keys.intersection(sku_keys(sku or "")) else valor.strip())
+        return hits
+
+    rows = await db.execute(statement(CODE_EXACT_SQL), {"keys": code_keys(valor)})
+    return {row.product_id: (1.0, row.code) for row in rows}
+
+async def _code_fuzzy(db: AsyncSession, valor: str) -> Dict[int, Tuple[float, Optional[str]]]:
+    normalized = normalize_code(valor.strip())
+    if len(normalized) < 3:
+        return {}
+    rows = await db.execute(statement(CODE_FUZZY_SQL), {"norm": normalized, "norm_term": f"%{normalized}%"})
+    return {row.product_id: (float(row.score), row.code) for row in rows}
+
+async def _text_sim(db: AsyncSession, valor: str, similar: bool) -> Dict[int, Tuple[float, Optional[str]]]:
+    vector = embed_query(valor) if similar else None
+    params = {
+        **fts_params(valor),
+        "norm_exact": normalize_text(valor.strip()),
+        "candidates": settings.hybrid_candidates,
+    }
+    if vector is not None:
+        params["query_vector"] = vector_literal(vector)
+        await db.execute(statement(EF_SEARCH_SQL), {"candidates": settings.hybrid_candidates})
+    rows = await db.execute(statement(text_signal_sql(vector is not None)), params)
+    return {row.product_id: (max(0.0, float(row.score)), None) for row in rows}
+
+def _image_sim(valor: str, limit: int) -> Dict[int, Tuple[float, Optional[str]]]:
+    """valor é a URL de uma imagem de produto ou de um host liberado (ver fetch_query_image)"""
+    if not valor.startswith(("http://", "https://")):
+        raise ValueError("Busca por imagem espera a URL da imagem em valor (ou use POST /search/image)")
+    data = fetch_query_image(valor)
+    if data is None:
+        raise ValueError("Imagem indisponível, não permitida ou maior que o limite de upload")
+
+    features = compute_features(data)
+    return {
+        product_id: (max(0.0, 1 - distance), None)
+        for product_id, distance, _ in image_index.search(features, max(limit, settings.hybrid_candidates))
+    }
+
+# ---- sinais de reordenação ----
+
+def _app_boost(row, keywords: set) -> float:
+    """Fração das palavras da consulta que aparecem nas aplicações"""
+    if not keywords or not row.applications:
+        return 0.0
+    applications = set(extract_keywords(row.applications))
+    return len(keywords & applications) / len(keywords)
+
+def _brand_boost(row, keywords: set) -> float:
+    """1 quando a consulta cita a marca do produto"""
+    if not row.brand:
+        return 0.0
+    brand = extract_keywords(row.brand)
+    return 1.0 if brand and set(brand) <= keywords else 0.0
+
+search_engine = SearchEngine()
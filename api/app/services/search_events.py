@@ -0,0 +1,286 @@
+# api/app/services/search_events.py
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.trending import trending
+from app.utils.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# (occurred_at, event_type, query, target, product_id, results, source, product_doc)
+Event = Tuple[datetime, str, Optional[str], Optional[str], Optional[int], Optional[int], Optional[str], Optional[str]]
+
+INSERT_EVENTS_SQL = text("""
+    INSERT INTO search_events (occurred_at, event_type, query, query_norm, target, product_id, results, source)
+    VALUES (:occurred_at, :event_type, :query, :query_norm, :target, :product_id, :results, :source)
+""")
+
+# Só entra no rollup o que foi gravado há mais de ROLLUP_LAG: ids de lotes
+# de workers diferentes podem ficar visíveis fora de ordem
+ROLLUP_LAG = "30 seconds"
+
+ROLLUP_SQL = [
+    """
+    INSERT INTO search_stats_hourly (bucket, query_norm, query, searches, zero_results, clicks)
+    SELECT date_trunc('hour', occurred_at), query_norm, MIN(query),
+           COUNT(*) FILTER (WHERE event_type = 'search'),
+           COUNT(*) FILTER (WHERE event_type = 'search' AND results = 0),
+           COUNT(*) FILTER (WHERE event_type = 'suggestion_click')
+    FROM search_events
+    WHERE id > :since AND id <= :until AND query_norm IS NOT NULL AND query_norm <> ''
+    GROUP BY 1, 2
+    ON CONFLICT (bucket, query_norm) DO UPDATE SET
+        searches = search_stats_hourly.searches + EXCLUDED.searches,
+        zero_results = search_stats_hourly.zero_results + EXCLUDED.zero_results,
+        clicks = search_stats_hourly.clicks + EXCLUDED.clicks
+    """,
+    """
+    INSERT INTO search_stats_daily (day, query_norm, query, searches, zero_results, clicks)
+    SELECT occurred_at::date, query_norm, MIN(query),
+           COUNT(*) FILTER (WHERE event_type = 'search'),
+           COUNT(*) FILTER (WHERE event_type = 'search' AND results = 0),
+           COUNT(*) FILTER (WHERE event_type = 'suggestion_click')
+    FROM search_events
+    WHERE id > :since AND id <= :until AND query_norm IS NOT NULL AND query_norm <> ''
+    GROUP BY 1, 2
+    ON CONFLICT (day, query_norm) DO UPDATE SET
+        searches = search_stats_daily.searches + EXCLUDED.searches,
+        zero_results = search_stats_daily.zero_results + EXCLUDED.zero_results,
+        clicks = search_stats_daily.clicks + EXCLUDED.clicks
+    """,
+    """
+    INSERT INTO product_stats_daily (day, product_id, views, clicks)
+    SELECT occurred_at::date, product_id,
+           COUNT(*) FILTER (WHERE event_type = 'product_view'),
+           COUNT(*) FILTER (WHERE event_type = 'suggestion_click')
+    FROM search_events
+    WHERE id > :since AND id <= :until AND product_id IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (day, product_id) DO UPDATE SET
+        views = product_stats_daily.views + EXCLUDED.views,
+        clicks = product_stats_daily.clicks + EXCLUDED.clicks
+    """,
+]
+
+def query_key(query: Optional[str]) -> Optional[str]:
+    """Forma agregada da query: normalize_text com espaços colapsados"""
+    if query is None:
+        return None
+    return " ".join(normalize_text(query).split())
+
+def get_rollup_version(db: Session) -> int:
+    """Último evento já somado nos agregados (muda a cada rollup)"""
+    return db.execute(text("SELECT last_event_id FROM search_rollup_state WHERE id = 1")).scalar() or 0
+
+def product_popularity(db: Session, days: int = settings.product_popularity_days) -> Dict[int, int]:
+    """Visualizações + cliques por produto nos últimos days dias"""
+    rows = db.execute(text("""
+        SELECT product_id, SUM(views + clicks) AS score
+        FROM product_stats_daily
+        WHERE day >= current_date - :days
+        GROUP BY product_id
+    """), {"days": days})
+    return {row.product_id: int(row.score) for row in rows}
+
+class SearchEventLog:
+    """
+    Buscas, cliques em sugestões e visualizações de produto. record() só
+    põe o evento num buffer circular em memória (deque com maxlen: cheio,
+    o mais antigo é descartado); um loop em background grava em lotes
+    (INSERT de várias linhas) em search_events e, de tempos em tempos,
+    soma o que chegou nos agregados por hora/dia.
+    """
+
+    def __init__(self, buffer_size: int = settings.search_events_buffer_size):
+        self.buffer_size = buffer_size
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+        self.rolled_up = 0
+        self.last_rollup_ms = 0.0
+        self._buffer: Deque[Event] = deque(maxlen=buffer_size)
+        self._flush_lock = threading.Lock()
+
+    # ---- caminho da requisição ----
+
+    def record(
+        self,
+        event_type: str,
+        query: Optional[str] = None,
+        target: Optional[str] = None,
+        product_id: Optional[int] = None,
+        results: Optional[int] = None,
+        source: Optional[str] = None,
+        product_doc: Optional[str] = None,
+    ) -> None:
+        """Enfileira um evento; product_doc (visualização) tem o id extraído só no flush"""
+        # Contadores ao vivo no Redis (buscas/produtos em alta)
+        trending.record(event_type, query=query, results=results, product_doc=product_doc)
+        if not settings.search_events_enabled:
+            return
+        if len(self._buffer) >= self.buffer_size:
+            self.dropped += 1
+        self._buffer.append((datetime.now(timezone.utc), event_type, query, target, product_id, results, source, product_doc))
+        self.recorded += 1
+
+    # ---- background ----
+
+    def flush(self, db: Session) -> int:
+        """Grava o buffer em lotes de search_events_batch_size; retorna quantos eventos gravou"""
+        total = 0
+        with self._flush_lock:
+            # Só o que já estava no buffer: sob carga o loop não fica preso aqui
+            pending = len(self._buffer)
+            while total < pending and self._buffer:
+                batch = self._drain(min(settings.search_events_batch_size, pending - total))
+                started = time.perf_counter()
+                try:
+                    db.execute(INSERT_EVENTS_SQL, [self._row(event) for event in batch])
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    self.flush_errors += 1
+                    # Devolve o lote para a próxima tentativa (se ainda couber)
+                    self._buffer.extendleft(reversed(batch[:self.buffer_size - len(self._buffer)]))
+                    raise
+                self.last_flush_ms = (time.perf_counter() - started) * 1000
+                self.flushed += len(batch)
+                total += len(batch)
+        return total
+
+    def _drain(self, limit: int) -> List[Event]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._buffer.popleft())
+            except IndexError:
+                break
+        return batch
+
+    @staticmethod
+    def _row(event: Event) -> Dict:
+        occurred_at, event_type, query, target, product_id, results, source, product_doc = event
+        if product_id is None and product_doc is not None:
+            try:
+                product_id = int(orjson.loads(product_doc)["id"])
+            except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+                pass
+        return {
+            "occurred_at": occurred_at,
+            "event_type": event_type,
+            "query": query.strip() if query else query,
+            "query_norm": query_key(query),
+            "target": target,
+            "product_id": product_id,
+            "results": results,
+            "source": source,
+        }
+
+    def rollup(self, db: Session) -> int:
+        """Soma nos agregados os eventos ainda não somados; retorna quantos ids avançou"""
+        started = time.perf_counter()
+        # FOR UPDATE: com vários workers, um rollup por vez
+        since = db.execute(text("SELECT last_event_id FROM search_rollup_state WHERE id = 1 FOR UPDATE")).scalar() or 0
+        until = db.execute(
+            text(f"SELECT COALESCE(MAX(id), 0) FROM search_events WHERE inserted_at < now() - interval '{ROLLUP_LAG}'")
+        ).scalar() or 0
+        if until <= since:
+            db.rollback()
+            return 0
+
+        params = {"since": since, "until": until}
+        for sql in ROLLUP_SQL:
+            db.execute(text(sql), params)
+        db.execute(
+            text("UPDATE search_rollup_state SET last_event_id = :until, rolled_at = now() WHERE id = 1"),
+            params
+        )
+
+        # Retenção: eventos crus e agregados por hora são de curto prazo
+        db.execute(
+            text("DELETE FROM search_events WHERE id <= :until AND occurred_at < now() - make_interval(days => :days)"),
+            {"until": until, "days": settings.search_events_retention_days}
+        )
+        db.execute(
+            text("DELETE FROM search_stats_hourly WHERE bucket < now() - make_interval(days => :days)"),
+            {"days": settings.search_stats_hourly_retention_days}
+        )
+        db.commit()
+
+        self.rolled_up += until - since
+        self.last_rollup_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Rollup de eventos de busca: ids {since + 1}..{until}, {self.last_rollup_ms:.0f} ms")
+        return until - since
+
+    # ---- métricas ----
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": settings.search_events_enabled,
+            "buffered": len(self._buffer),
+            "buffer_size": self.buffer_size,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "rolled_up": self.rolled_up,
+            "last_rollup_ms": round(self.last_rollup_ms, 2),
+        }
+
+search_events = SearchEventLog()
+_flush_task: Optional[asyncio.Task] = None
+
+def _flush_search_events(rollup: bool = False) -> None:
+    db = SessionLocal()
+    try:
+        search_events.flush(db)
+        if rollup:
+            search_events.rollup(db)
+    finally:
+        db.close()
+
+async def start_search_events() -> None:
+    """Loop em background: flush do buffer a cada search_events_flush_seconds e rollup periódico"""
+    if not settings.search_events_enabled:
+        return
+
+    global _flush_task
+    _flush_task = asyncio.create_task(_flush_loop())
+
+async def stop_search_events() -> None:
+    """Shutdown: grava o que ainda está no buffer"""
+    if _flush_task is not None:
+        _flush_task.cancel()
+    if not settings.search_events_enabled:
+        return
+    try:
+        await asyncio.to_thread(_flush_search_events)
+    except Exception as e:
+        logger.error(f"Erro ao gravar eventos de busca: {e}")
+
+async def _flush_loop() -> None:
+    last_rollup = 0.0
+    while True:
+        await asyncio.sleep(settings.search_events_flush_seconds)
+        rollup = time.monotonic() - last_rollup >= settings.search_rollup_seconds
+        try:
+            await asyncio.to_thread(_flush_search_events, rollup)
+        except Exception as e:
+            logger.error(f"Erro ao gravar eventos de busca: {e}")
+        if rollup:
+            last_rollup = time.monotonic()
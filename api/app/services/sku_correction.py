@@ -0,0 +1,266 @@
+# api/app/services/sku_correction.py
+
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.code_index import (
+    FULL_RELOAD_THRESHOLD,
+    CatalogCursor,
+    catalog_changed,
+    changed_products,
+    get_catalog_cursor,
+    get_catalog_version,
+)
+from app.utils.text import bounded_edit_distance, normalize_code
+
+logger = logging.getLogger(__name__)
+
+class _Node:
+    __slots__ = ("key", "children", "max_edge")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.children: Dict[int, "_Node"] = {}
+        self.max_edge = 0
+
+class SkuCorrector:
+    """
+    Correção de SKUs digitados errado por BK-tree sobre normalize_code de
+    todos os SKUs do catálogo, com distância de Levenshtein.
+
+    Cada filho fica pendurado na distância exata até o pai; numa busca com
+    raio r a partir de um nó a distância d, só os filhos com aresta em
+    [d - r, d + r] podem ter resultado (desigualdade triangular). A distância
+    até cada nó é calculada com limite raio + maior aresta do nó: passando
+    disso nenhum filho serve e o cálculo para no meio.
+    """
+
+    def __init__(self, max_distance: int = settings.sku_correction_max_distance):
+        self.max_distance = max_distance
+        self.version = 0
+        self.cursor: CatalogCursor = (0, 0)
+        self.ready = False
+        self.loaded_at: Optional[float] = None
+        self.last_refresh_ms = 0.0
+        self.lookups = 0
+        self.lookup_us = 0.0
+        self.distance_calls = 0
+        self._root: Optional[_Node] = None
+        self._nodes = 0
+        # chave normalizada -> {product_id: SKU}; chaves sem produto continuam
+        # na árvore só como caminho (BK-tree não remove nós)
+        self._skus: Dict[str, Dict[int, str]] = {}
+        self._product_keys: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    # ---- consulta ----
+
+    def lookup(self, query: str, max_distance: Optional[int] = None, limit: int = 3) -> List[Tuple[str, int]]:
+        """
+        Até limit SKUs (SKU, distância) a distância 1..max_distance de query,
+        comparando as formas normalizadas; os mais próximos primeiro
+        """
+        key = normalize_code(query)
+        radius = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        if not self.ready or not key or radius < 1 or limit < 1:
+            return []
+
+        started = time.perf_counter()
+        calls = 0
+        # heap dos melhores com a distância negativa: o topo é o pior resultado
+        best: List[Tuple[int, str]] = []
+        with self._lock:
+            stack = [self._root] if self._root else []
+            while stack:
+                node = stack.pop()
+                calls += 1
+                distance = bounded_edit_distance(key, node.key, radius + node.max_edge, transpositions=False)
+                if 0 < distance <= radius and self._skus.get(node.key):
+                    heapq.heappush(best, (-distance, node.key))
+                    if len(best) > limit:
+                        heapq.heappop(best)
+                    if len(best) == limit:
+                        # Já há limit resultados: só interessa quem empata ou é melhor que o pior
+                        radius = -best[0][0]
+                # Filhos com aresta mais próxima de distance saem da pilha
+                # primeiro: acham resultados cedo e o raio encolhe antes
+                low, high = distance - radius, distance + radius
+                for edge in sorted(node.children, key=lambda edge: abs(edge - distance), reverse=True):
+                    if low <= edge <= high:
+                        stack.append(node.children[edge])
+
+            results = []
+            for negative_distance, node_key in sorted(best, key=lambda item: (-item[0], item[1])):
+                for sku in sorted(set(self._skus[node_key].values())):
+                    results.append((sku, -negative_distance))
+
+            self.lookups += 1
+            self.distance_calls += calls
+            self.lookup_us += (time.perf_counter() - started) * 1_000_000
+        return results[:limit]
+
+    # ---- carga ----
+
+    def load(self, db: Session) -> None:
+        """Carga completa a partir de products"""
+        started = time.perf_counter()
+        cursor = get_catalog_cursor(db)
+        version = get_catalog_version(db)
+        self.load_rows(db.execute(text("SELECT id, sku FROM products WHERE sku IS NOT NULL")), cursor, version)
+
+        self.last_refresh_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            f"Índice de correção de SKUs carregado: {len(self._skus)} chaves, {len(self._product_keys)} produtos, "
+            f"versão {version}, {self.last_refresh_ms:.0f} ms"
+        )
+
+    def load_rows(self, rows: Iterable, cursor: CatalogCursor = (0, 0), version: int = 0) -> None:
+        """Monta a árvore a partir das linhas (id, sku) e troca de uma vez"""
+        skus: Dict[str, Dict[int, str]] = {}
+        product_keys: Dict[int, str] = {}
+        for row in rows:
+            key = normalize_code(row.sku)
+            if key:
+                skus.setdefault(key, {})[row.id] = row.sku
+                product_keys[row.id] = key
+
+        root = None
+        for key in skus:
+            if root is None:
+                root = _Node(key)
+            else:
+                self._insert(root, key)
+
+        with self._lock:
+            self._root = root
+            self._nodes = len(skus)
+            self._skus = skus
+            self._product_keys = product_keys
+            self.version = version
+            self.cursor = cursor
+            self.ready = True
+            self.loaded_at = time.time()
+
+    def refresh(self, db: Session) -> int:
+        """Aplica as alterações de catalog_changes desde a última versão; retorna quantos produtos mudaram"""
+        if not self.ready:
+            self.load(db)
+            return len(self._product_keys)
+
+        if not catalog_changed(db, self.cursor):
+            return 0
+
+        started = time.perf_counter()
+        cursor = get_catalog_cursor(db)
+        version = get_catalog_version(db)
+        changed = changed_products(db, self.cursor)
+
+        # Log podado, muitas alterações ou árvore cheia de nós vazios: remonta do zero
+        if changed is None or len(changed) > FULL_RELOAD_THRESHOLD or self._nodes > 2 * max(len(self._skus), 1):
+            self.load(db)
+            return len(changed) if changed is not None else len(self._product_keys)
+
+        rows = db.execute(
+            text("SELECT id, sku FROM products WHERE id = ANY(:ids) AND sku IS NOT NULL"),
+            {"ids": changed}
+        ).fetchall()
+
+        with self._lock:
+            for product_id in changed:
+                old_key = self._product_keys.pop(product_id, None)
+                if old_key is not None:
+                    entry = self._skus[old_key]
+                    entry.pop(product_id, None)
+                    if not entry:
+                        del self._skus[old_key]
+            for row in rows:
+                key = normalize_code(row.sku)
+                if not key:
+                    continue
+                if key not in self._skus:
+                    self._skus[key] = {}
+                    if self._root is None:
+                        self._root = _Node(key)
+                        self._nodes += 1
+                    elif self._insert(self._root, key):
+                        self._nodes += 1
+                self._skus[key][row.id] = row.sku
+                self._product_keys[row.id] = key
+            self.version = version
+            self.cursor = cursor
+
+        self.last_refresh_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Índice de correção de SKUs atualizado: {len(changed)} produtos, versão {version}")
+        return len(changed)
+
+    def _insert(self, root: _Node, key: str) -> bool:
+        """Pendura key na árvore; False se o nó já existia (chave que tinha ficado sem produto)"""
+        node = root
+        while True:
+            distance = bounded_edit_distance(key, node.key, max(len(key), len(node.key)), transpositions=False)
+            if distance == 0:
+                return False
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _Node(key)
+                if distance > node.max_edge:
+                    node.max_edge = distance
+                return True
+            node = child
+
+    # ---- métricas ----
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "version": self.version,
+            "keys": len(self._skus),
+            "nodes": self._nodes,
+            "products": len(self._product_keys),
+            "max_edit_distance": self.max_distance,
+            "lookups": self.lookups,
+            "avg_lookup_us": round(self.lookup_us / self.lookups, 1) if self.lookups else 0.0,
+            "avg_distance_calls": round(self.distance_calls / self.lookups, 1) if self.lookups else 0.0,
+            "last_refresh_ms": round(self.last_refresh_ms, 2),
+            "loaded_at": self.loaded_at,
+        }
+
+sku_corrector = SkuCorrector()
+_refresh_task: Optional[asyncio.Task] = None
+
+def _refresh_sku_corrector() -> None:
+    db = SessionLocal()
+    try:
+        sku_corrector.refresh(db)
+    finally:
+        db.close()
+
+async def start_sku_corrector() -> None:
+    """Carrega a BK-tree no startup e mantém um refresh incremental em background"""
+    if not settings.sku_correction_enabled:
+        return
+
+    try:
+        await asyncio.to_thread(_refresh_sku_corrector)
+    except Exception as e:
+        logger.error(f"Erro ao carregar índice de correção de SKUs: {e}")
+
+    global _refresh_task
+    _refresh_task = asyncio.create_task(_refresh_loop())
+
+async def _refresh_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.sku_correction_refresh_seconds)
+        try:
+            await asyncio.to_thread(_refresh_sku_corrector)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar índice de correção de SKUs: {e}")
@@ -0,0 +1,302 @@
+# api/app/services/spell_index.py
+
+import asyncio
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.code_index import (
+    FULL_RELOAD_THRESHOLD,
+    CatalogCursor,
+    catalog_changed,
+    changed_products,
+    get_catalog_cursor,
+    get_catalog_version,
+)
+from app.utils.text import bounded_edit_distance, extract_keywords, normalize_text
+
+logger = logging.getLogger(__name__)
+
+def product_terms(title: Optional[str], description: Optional[str]) -> Counter:
+    """Palavras (extract_keywords, sem números/códigos) de título e descrição, com contagem"""
+    return Counter(
+        word for word in extract_keywords(f"{title or ''} {description or ''}")
+        if word.isalpha()
+    )
+
+def deletes(word: str, max_distance: int, prefix_length: int) -> Set[str]:
+    """Variações do prefixo da palavra com até max_distance letras removidas (inclui o próprio prefixo)"""
+    prefix = word[:prefix_length]
+    result = {prefix}
+    frontier = {prefix}
+    for _ in range(max_distance):
+        frontier = {
+            candidate[:i] + candidate[i + 1:]
+            for candidate in frontier if len(candidate) > 1
+            for i in range(len(candidate))
+        } - result
+        result |= frontier
+    return result
+
+class SpellIndex:
+    """
+    Correção ortográfica por deleções simétricas (SymSpell) sobre o
+    vocabulário de títulos e descrições, ponderado pela frequência de cada
+    palavra no catálogo.
+
+    Cada palavra do vocabulário é indexada pelas variações do seu prefixo com
+    até max_distance letras removidas; na consulta as mesmas deleções da
+    palavra digitada levam direto aos candidatos, e só eles passam pela
+    distância de edição.
+    """
+
+    def __init__(
+        self,
+        max_distance: int = settings.spell_max_edit_distance,
+        prefix_length: int = settings.spell_prefix_length,
+    ):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.version = 0
+        self.cursor: CatalogCursor = (0, 0)
+        self.ready = False
+        self.loaded_at: Optional[float] = None
+        self.last_refresh_ms = 0.0
+        self.lookups = 0
+        self.corrections = 0
+        self.lookup_us = 0.0
+        self._terms: Dict[str, int] = {}
+        self._deletes: Dict[str, List[str]] = {}
+        self._product_terms: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+
+    # ---- consulta ----
+
+    def lookup(self, word: str) -> Optional[Tuple[str, int, int]]:
+        """(palavra do vocabulário, distância, frequência) mais próxima de word, ou None"""
+        if not self.ready or not word:
+            return None
+
+        started = time.perf_counter()
+        count = self._terms.get(word)
+        if count is not None:
+            best = (word, 0, count)
+        else:
+            # Palavras curtas: uma troca só, senão tudo vira sugestão
+            max_distance = 1 if len(word) <= 4 else self.max_distance
+            best = None
+            seen = set()
+            # Menos letras removidas primeiro: achando cedo um candidato
+            # próximo, o limite da distância de edição cai para os demais
+            for variation in sorted(deletes(word, max_distance, self.prefix_length), key=len, reverse=True):
+                for term in self._deletes.get(variation, ()):
+                    if term in seen:
+                        continue
+                    seen.add(term)
+                    limit = best[1] if best else max_distance
+                    if abs(len(term) - len(word)) > limit:
+                        continue
+                    distance = bounded_edit_distance(word, term, limit)
+                    if distance > limit:
+                        continue
+                    term_count = self._terms.get(term, 0)
+                    if best is None or distance < best[1] or (distance == best[1] and term_count > best[2]):
+                        best = (term, distance, term_count)
+
+        with self._lock:
+            self.lookups += 1
+            self.lookup_us += (time.perf_counter() - started) * 1_000_000
+        return best
+
+    def correct(self, query: str) -> Optional[str]:
+        """
+        Query com as palavras desconhecidas trocadas pela sugestão do
+        vocabulário (normalizada, sem acentos), ou None se nada mudou.
+        Números, códigos e stopwords ficam como estão.
+        """
+        if not self.ready:
+            return None
+
+        words = re.findall(r'\w+', normalize_text(query))
+        corrected = []
+        changed = False
+        for word in words:
+            suggestion = self.lookup(word) if word.isalpha() and extract_keywords(word) else None
+            if suggestion and suggestion[1] > 0:
+                corrected.append(suggestion[0])
+                changed = True
+            else:
+                corrected.append(word)
+
+        if not changed:
+            return None
+        with self._lock:
+            self.corrections += 1
+        return " ".join(corrected)
+
+    # ---- carga ----
+
+    def load(self, db: Session) -> None:
+        """Carga completa a partir de products"""
+        started = time.perf_counter()
+        # Cursor lido antes dos dados: o que mudar durante a carga é reaplicado no próximo refresh
+        cursor = get_catalog_cursor(db)
+        version = get_catalog_version(db)
+        self.load_rows(db.execute(text("SELECT id, title, description FROM products")), cursor, version)
+
+        self.last_refresh_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            f"Dicionário ortográfico carregado: {len(self._terms)} palavras, {len(self._deletes)} deleções, "
+            f"versão {version}, {self.last_refresh_ms:.0f} ms"
+        )
+
+    def load_rows(self, rows: Iterable, cursor: CatalogCursor = (0, 0), version: int = 0) -> None:
+        """Monta o dicionário a partir das linhas (id, title, description) e troca de uma vez"""
+        product_data: Dict[int, Counter] = {}
+        for row in rows:
+            product_data[row.id] = product_terms(row.title, row.description)
+
+        terms: Counter = Counter()
+        for counts in product_data.values():
+            terms.update(counts)
+        deletes_index: Dict[str, List[str]] = {}
+        self._index_terms(deletes_index, terms)
+
+        with self._lock:
+            self._terms = {sys.intern(term): count for term, count in terms.items()}
+            self._deletes = deletes_index
+            self._product_terms = product_data
+            self.version = version
+            self.cursor = cursor
+            self.ready = True
+            self.loaded_at = time.time()
+
+    def refresh(self, db: Session) -> int:
+        """Aplica as alterações de catalog_changes desde a última versão; retorna quantos produtos mudaram"""
+        if not self.ready:
+            self.load(db)
+            return len(self._product_terms)
+
+        if not catalog_changed(db, self.cursor):
+            return 0
+
+        started = time.perf_counter()
+        cursor = get_catalog_cursor(db)
+        version = get_catalog_version(db)
+        changed = changed_products(db, self.cursor)
+
+        if changed is None or len(changed) > FULL_RELOAD_THRESHOLD:
+            self.load(db)
+            return len(changed) if changed is not None else len(self._product_terms)
+
+        rows = db.execute(
+            text("SELECT id, title, description FROM products WHERE id = ANY(:ids)"),
+            {"ids": changed}
+        ).fetchall()
+        new_terms = {row.id: product_terms(row.title, row.description) for row in rows}
+
+        with self._lock:
+            # Só palavras que entram ou saem do vocabulário mexem nas deleções
+            added, removed = Counter(), Counter()
+            for product_id in changed:
+                removed.update(self._product_terms.pop(product_id, Counter()))
+            for product_id, counts in new_terms.items():
+                self._product_terms[product_id] = counts
+                added.update(counts)
+
+            appeared = []
+            for term in set(added) | set(removed):
+                before = self._terms.get(term, 0)
+                after = before + added[term] - removed[term]
+                if after > 0:
+                    self._terms[sys.intern(term)] = after
+                    if before == 0:
+                        appeared.append(term)
+                elif before > 0:
+                    del self._terms[term]
+                    self._unindex_term(term)
+            self._index_terms(self._deletes, appeared)
+            self.version = version
+            self.cursor = cursor
+
+        self.last_refresh_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Dicionário ortográfico atualizado: {len(changed)} produtos, versão {version}")
+        return len(changed)
+
+    def _index_terms(self, index: Dict[str, List[str]], terms: Iterable[str]) -> None:
+        for term in terms:
+            term = sys.intern(term)
+            for variation in deletes(term, self.max_distance, self.prefix_length):
+                entry = index.get(variation)
+                if entry is None:
+                    index[sys.intern(variation)] = [term]
+                else:
+                    entry.append(term)
+
+    def _unindex_term(self, term: str) -> None:
+        for variation in deletes(term, self.max_distance, self.prefix_length):
+            entry = self._deletes.get(variation)
+            if entry is None:
+                continue
+            if term in entry:
+                entry.remove(term)
+            if not entry:
+                del self._deletes[variation]
+
+    # ---- métricas ----
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "version": self.version,
+            "terms": len(self._terms),
+            "deletes": len(self._deletes),
+            "products": len(self._product_terms),
+            "max_edit_distance": self.max_distance,
+            "prefix_length": self.prefix_length,
+            "lookups": self.lookups,
+            "corrections": self.corrections,
+            "avg_lookup_us": round(self.lookup_us / self.lookups, 1) if self.lookups else 0.0,
+            "last_refresh_ms": round(self.last_refresh_ms, 2),
+            "loaded_at": self.loaded_at,
+        }
+
+spell_index = SpellIndex()
+_refresh_task: Optional[asyncio.Task] = None
+
+def _refresh_spell_index() -> None:
+    db = SessionLocal()
+    try:
+        spell_index.refresh(db)
+    finally:
+        db.close()
+
+async def start_spell_index() -> None:
+    """Carrega o dicionário no startup e mantém um refresh incremental em background"""
+    if not settings.spell_index_enabled:
+        return
+
+    try:
+        await asyncio.to_thread(_refresh_spell_index)
+    except Exception as e:
+        logger.error(f"Erro ao carregar dicionário ortográfico: {e}")
+
+    global _refresh_task
+    _refresh_task = asyncio.create_task(_refresh_loop())
+
+async def _refresh_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.spell_index_refresh_seconds)
+        try:
+            await asyncio.to_thread(_refresh_spell_index)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar dicionário ortográfico: {e}")
@@ -0,0 +1,92 @@
+# api/app/services/statement_cache.py
+
+import threading
+from functools import lru_cache
+from typing import Dict
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import default
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import TextClause
+
+from app.core.config import settings
+from app.core.database import async_engine
+
+# As consultas montadas por ranked_search_sql & cia. têm um conjunto fixo de
+# formatos (tipo de busca x filtros ativos); valores variáveis vão sempre em
+# parâmetros (listas via ANY(:param)). Assim o mesmo texto SQL se repete,
+# o TextClause sai deste cache, o SQLAlchemy reaproveita a compilação e o
+# asyncpg reaproveita o prepared statement (e o plano) da conexão.
+
+@lru_cache(maxsize=settings.statement_cache_size)
+def statement(sql: str) -> TextClause:
+    """TextClause em cache para um texto SQL"""
+    return text(sql)
+
+_CACHE_KINDS = {
+    default.CACHE_HIT: "hits",
+    default.CACHE_MISS: "misses",
+    default.CACHING_DISABLED: "disabled",
+    default.NO_CACHE_KEY: "no_cache_key",
+    default.NO_DIALECT_SUPPORT: "no_dialect_support",
+}
+
+class StatementCacheStats:
+    """Contadores do cache de compilação do SQLAlchemy no engine assíncrono"""
+
+    def __init__(self, max_shapes: int = 10_000):
+        self.counts = {kind: 0 for kind in _CACHE_KINDS.values()}
+        self.max_shapes = max_shapes
+        self._shapes = set()
+        self._lock = threading.Lock()
+
+    def on_execute(self, conn, cursor, sql, parameters, context, executemany) -> None:
+        kind = _CACHE_KINDS.get(getattr(context, "cache_hit", None))
+        with self._lock:
+            if kind:
+                self.counts[kind] += 1
+            if len(self._shapes) < self.max_shapes:
+                self._shapes.add(hash(sql))
+
+    def stats(self) -> Dict:
+        builder = statement.cache_info()
+        with self._lock:
+            compiled = dict(self.counts)
+            shapes = len(self._shapes)
+        looked_up = compiled["hits"] + compiled["misses"]
+        return {
+            "statements": {
+                "hits": builder.hits,
+                "misses": builder.misses,
+                "size": builder.currsize,
+                "hit_rate": round(builder.hits / (builder.hits + builder.misses), 4) if builder.hits + builder.misses else 0.0,
+            },
+            "compiled": {
+                **compiled,
+                "hit_rate": round(compiled["hits"] / looked_up, 4) if looked_up else 0.0,
+            },
+            "distinct_sql": shapes,
+        }
+
+async def prepared_plan_stats(db: AsyncSession) -> Dict:
+    """
+    Prepared statements da conexão que atende a requisição (pg_prepared_statements
+    é por sessão): quantos existem e quantas execuções usaram plano genérico
+    (reaproveitado) ou custom (planejado de novo)
+    """
+    row = (await db.execute(statement("""
+        SELECT COUNT(*) AS prepared,
+               COALESCE(SUM(generic_plans), 0) AS generic_plans,
+               COALESCE(SUM(custom_plans), 0) AS custom_plans
+        FROM pg_prepared_statements
+    """))).first()
+    executions = row.generic_plans + row.custom_plans
+    return {
+        "prepared": row.prepared,
+        "generic_plans": row.generic_plans,
+        "custom_plans": row.custom_plans,
+        "generic_rate": round(row.generic_plans / executions, 4) if executions else 0.0,
+    }
+
+statement_cache_stats = StatementCacheStats()
+event.listen(async_engine.sync_engine, "after_cursor_execute", statement_cache_stats.on_execute)
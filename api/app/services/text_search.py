@@ -0,0 +1,74 @@
+# api/app/services/text_search.py
+
+import re
+from typing import Dict
+
+from app.utils.text import normalize_code, normalize_text
+
+# Configuração criada na migração 0003 (portuguese + unaccent)
+TS_CONFIG = "portuguese_unaccent"
+
+# Ranking full-text sobre products.search_vector (GIN). Qualquer palavra casa
+# (:q_any); quem tem todas (:q_all) ou a frase no título vem primeiro e
+# ts_rank_cd desempata.
+FTS_RANK_SQL = f"""
+    ts_rank_cd(search_vector, websearch_to_tsquery('{TS_CONFIG}', :q_any))
+    + CASE WHEN search_vector @@ websearch_to_tsquery('{TS_CONFIG}', :q_all) THEN 1 ELSE 0 END
+    + CASE WHEN title_norm LIKE :norm_term THEN 1 ELSE 0 END
+"""
+
+# Trechos digitados ("bomba agu") também casam via trigramas em title_norm
+FTS_MATCH_SQL = f"""
+    (search_vector @@ websearch_to_tsquery('{TS_CONFIG}', :q_any)
+     OR title_norm LIKE :norm_term)
+"""
+
+def fts_params(q: str) -> Dict[str, str]:
+    """Parâmetros de FTS_RANK_SQL/FTS_MATCH_SQL para a query informada"""
+    words = re.findall(r'\w+', q)
+    return {
+        "q_all": q.strip(),
+        "q_any": " or ".join(words),
+        "norm_term": f"%{normalize_text(q.strip())}%",
+    }
+
+# Busca por trecho de palavra ("altern") usando os índices de trigramas de
+# title_norm, description_norm, normalize_text(brand), normalize_code(sku) e
+# product_codes. Gera "substring_hits(product_id)".
+SUBSTRING_MATCH_CTE = """
+    substring_hits AS (
+        SELECT id AS product_id
+        FROM products
+        WHERE title_norm LIKE :norm_term
+           OR description_norm LIKE :norm_term
+           OR normalize_code(sku) LIKE :code_term
+           OR normalize_text(brand) LIKE :norm_term
+        UNION
+        SELECT product_id
+        FROM product_codes
+        WHERE normalized_code LIKE :code_term
+    )
+"""
+
+# Ordenação para SUBSTRING_MATCH_CTE (alias "p" para products)
+SUBSTRING_ORDER_SQL = """
+    CASE
+        WHEN p.title_norm = :norm_exact THEN 1
+        WHEN p.title_norm LIKE :norm_prefix THEN 2
+        WHEN normalize_code(p.sku) LIKE :code_term THEN 3
+        WHEN normalize_text(p.brand) LIKE :norm_term THEN 4
+        ELSE 5
+    END,
+    word_similarity(:norm_exact, p.title_norm) DESC,
+    p.title
+"""
+
+def substring_params(q: str) -> Dict[str, str]:
+    """Parâmetros de SUBSTRING_MATCH_CTE/SUBSTRING_ORDER_SQL"""
+    normalized = normalize_text(q.strip())
+    return {
+        "norm_exact": normalized,
+        "norm_prefix": f"{normalized}%",
+        "norm_term": f"%{normalized}%",
+        "code_term": f"%{normalize_code(q.strip())}%",
+    }
@@ -0,0 +1,244 @@
+# api/app/services/trending.py
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import orjson
+import redis
+
+from app.core.config import settings
+from app.services.search_cache import _mark_unavailable, get_async_redis, get_redis
+from app.utils.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Um incremento: soma o peso nas d linhas do count-min sketch, usa o mínimo
+# como estimativa da contagem e grava essa estimativa no sorted set, que
+# guarda só os max_members maiores (os demais seguem estimados no sketch e
+# voltam ao set quando passam do menor).
+# KEYS: sorted set, sketch (hash), nomes para exibição (hash)
+# ARGV: membro, peso, max_members, ttl, exibição, campos do sketch...
+INCREMENT_LUA = """
+local estimate = nil
+for i = 6, #ARGV do
+    local value = tonumber(redis.call('HINCRBYFLOAT', KEYS[2], ARGV[i], ARGV[2]))
+    if estimate == nil or value < estimate then
+        estimate = value
+    end
+end
+redis.call('ZADD', KEYS[1], estimate, ARGV[1])
+if redis.call('ZCARD', KEYS[1]) > tonumber(ARGV[3]) then
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, 0)
+end
+if ARGV[5] ~= '' then
+    redis.call('HSET', KEYS[3], ARGV[1], ARGV[5])
+    redis.call('EXPIRE', KEYS[3], ARGV[4])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return estimate
+"""
+
+def sketch_fields(member: str, depth: int, width: int) -> List[str]:
+    """Uma coluna por linha do sketch, de um único hash do membro"""
+    digest = hashlib.blake2b(member.encode(), digest_size=4 * depth).digest()
+    return [
+        f"{row}:{int.from_bytes(digest[4 * row:4 * row + 4], 'little') % width}"
+        for row in range(depth)
+    ]
+
+class Trending:
+    """
+    Buscas e produtos em alta, com decaimento exponencial, no Redis.
+
+    Decaimento "para frente": cada evento soma 2^((t - início da época) /
+    meia-vida), então um sorted set nunca precisa ser reescalado; a cada
+    época (trending_epoch_half_lives meias-vidas) começam chaves novas. A
+    leitura pega o top-k da época atual e da anterior (O(log N + k) cada) e
+    reescala as duas para o instante atual.
+
+    record() só enfileira em memória; um loop em background agrupa o que
+    chegou e manda tudo num pipeline (sem esperar por nada na requisição).
+    """
+
+    def __init__(self):
+        self.half_life = settings.trending_half_life_seconds
+        self.epoch_seconds = settings.trending_half_life_seconds * settings.trending_epoch_half_lives
+        self.recorded = 0
+        self.flushed = 0
+        self.increments = 0
+        self.errors = 0
+        self.last_flush_ms = 0.0
+        self._pending: Deque[Tuple[str, str]] = deque(maxlen=settings.trending_buffer_size)
+        self._script = None
+        self._flush_lock = threading.Lock()
+
+    # ---- caminho da requisição ----
+
+    def record(self, event_type: str, query: Optional[str] = None, results: Optional[int] = None,
+               product_doc: Optional[str] = None) -> None:
+        """
+        Busca com resultado, clique em sugestão e visualização de produto;
+        busca sem contagem conhecida (results None) não entra
+        """
+        if not settings.trending_enabled:
+            return
+        if event_type == "product_view" and product_doc is not None:
+            self._pending.append(("products", product_doc))
+        elif query and (event_type == "suggestion_click" or (event_type == "search" and results)):
+            self._pending.append(("queries", query))
+        else:
+            return
+        self.recorded += 1
+
+    # ---- chaves e pesos ----
+
+    def _epoch(self, now: float) -> int:
+        return int(now // self.epoch_seconds)
+
+    def _keys(self, kind: str, epoch: int) -> Tuple[str, str, str]:
+        return (f"trending:{kind}:{epoch}", f"trending:{kind}:cms:{epoch}", f"trending:{kind}:names:{epoch}")
+
+    def _weight(self, now: float, epoch: int) -> float:
+        return 2 ** ((now - epoch * self.epoch_seconds) / self.half_life)
+
+    # ---- background ----
+
+    def flush(self) -> int:
+        """Manda o que está pendente num pipeline; retorna quantos incrementos enviou"""
+        with self._flush_lock:
+            pending = len(self._pending)
+            if not pending:
+                return 0
+            counts: Counter = Counter()
+            names: Dict[Tuple[str, str], str] = {}
+            for _ in range(pending):
+                kind, value = self._pending.popleft()
+                member, name = self._member(kind, value)
+                if member:
+                    counts[(kind, member)] += 1
+                    names[(kind, member)] = name
+
+            client = get_redis()
+            if client is None:
+                return 0
+            if self._script is None:
+                self._script = client.register_script(INCREMENT_LUA)
+
+            started = time.perf_counter()
+            now = time.time()
+            epoch = self._epoch(now)
+            weight = self._weight(now, epoch)
+            ttl = int(2 * self.epoch_seconds + self.half_life)
+            pipe = client.pipeline(transaction=False)
+            for (kind, member), count in counts.items():
+                self._script(
+                    keys=self._keys(kind, epoch),
+                    args=[
+                        member, weight * count, settings.trending_max_members, ttl, names[(kind, member)],
+                        *sketch_fields(member, settings.trending_cms_depth, settings.trending_cms_width),
+                    ],
+                    client=pipe,
+                )
+            try:
+                pipe.execute(raise_on_error=False)
+            except redis.RedisError as e:
+                self.errors += 1
+                _mark_unavailable(e)
+                return 0
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+            self.flushed += pending
+            self.increments += len(counts)
+            return len(counts)
+
+    @staticmethod
+    def _member(kind: str, value: str) -> Tuple[Optional[str], str]:
+        """(membro agregado, nome para exibição)"""
+        if kind == "queries":
+            return " ".join(normalize_text(value).split()) or None, value.strip()
+        try:
+            doc = orjson.loads(value)
+        except orjson.JSONDecodeError:
+            return None, ""
+        sku = doc.get("sku")
+        return sku, doc.get("title") or ""
+
+    # ---- leitura ----
+
+    async def top(self, kind: str, k: int) -> Optional[List[Dict]]:
+        """k maiores contagens decaídas (normalizadas para agora); None se o Redis estiver fora"""
+        client = get_async_redis()
+        if client is None:
+            return None
+
+        now = time.time()
+        epoch = self._epoch(now)
+        try:
+            pipe = client.pipeline(transaction=False)
+            for e in (epoch, epoch - 1):
+                pipe.zrevrange(self._keys(kind, e)[0], 0, k - 1, withscores=True)
+            current, previous = await pipe.execute()
+            members = list(dict.fromkeys(member for member, _ in current + previous))
+            display = {}
+            if members:
+                pipe = client.pipeline(transaction=False)
+                for e in (epoch, epoch - 1):
+                    pipe.hmget(self._keys(kind, e)[2], *members)
+                for values in await pipe.execute():
+                    for member, value in zip(members, values):
+                        if value is not None:
+                            display.setdefault(member, value)
+        except redis.RedisError as e:
+            self.errors += 1
+            _mark_unavailable(e)
+            return None
+
+        scores: Counter = Counter()
+        for rows, e in ((current, epoch), (previous, epoch - 1)):
+            scale = 1 / self._weight(now, e)
+            for member, score in rows:
+                scores[member] += score * scale
+
+        return [
+            {"member": member.decode(), "name": display.get(member, member).decode(), "score": round(score, 3)}
+            for member, score in scores.most_common(k)
+        ]
+
+    # ---- métricas ----
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": settings.trending_enabled,
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "increments": self.increments,
+            "errors": self.errors,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "half_life_seconds": self.half_life,
+            "epoch_seconds": self.epoch_seconds,
+        }
+
+trending = Trending()
+_flush_task: Optional[asyncio.Task] = None
+
+async def start_trending() -> None:
+    """Loop em background que manda os incrementos pendentes para o Redis"""
+    if not settings.trending_enabled:
+        return
+
+    global _flush_task
+    _flush_task = asyncio.create_task(_flush_loop())
+
+async def _flush_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.trending_flush_seconds)
+        try:
+            await asyncio.to_thread(trending.flush)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar buscas em alta: {e}")
@@ -0,0 +1,28 @@
+import json
+from typing import List
+
+def parse_image_urls(image_urls_str: str) -> List[str]:
+    """Lista de URLs de products.image_urls (JSON ou separadas por vírgula)"""
+    if not image_urls_str:
+        return []
+    
+    try:
+        if image_urls_str.startswith('[') and image_urls_str.endswith(']'):
+            urls = json.loads(image_urls_str)
+            return [url.strip() for url in urls if url.strip()]
+        else:
+            urls = []
+            for url in image_urls_str.split(','):
+                clean_url = url.strip().strip('"').strip("'").strip()
+                clean_url = clean_url.replace('%22', '').replace('%27', '')
+                if clean_url:
+                    urls.append(clean_url)
+            return urls
+    except json.JSONDecodeError:
+        urls = []
+        for url in image_urls_str.split(','):
+            clean_url = url.strip().strip('"').strip("'").strip()
+            clean_url = clean_url.replace('%22', '').replace('%27', '')
+            if clean_url:
+                urls.append(clean_url)
+        return urls
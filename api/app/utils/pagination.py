@@ -0,0 +1,31 @@
+import base64
+import hashlib
+import hmac
+
+from app.core.config import settings
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(settings.secret_key.encode(), payload.encode(), hashlib.sha256).hexdigest()
+    return digest[:16]
+
+def encode_cursor(last_id: int) -> str:
+    """Gera cursor opaco (último id visto + assinatura HMAC)"""
+    payload = str(int(last_id))
+    token = f"{payload}.{_sign(payload)}"
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    """Valida o cursor e retorna o último id visto; ValueError se inválido"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload, signature = base64.urlsafe_b64decode(padded.encode()).decode().split(".", 1)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+    if not hmac.compare_digest(signature, _sign(payload)) or not payload.isdigit():
+        raise ValueError("Cursor inválido")
+    return int(payload)
+
+def clamp_limit(limit: int) -> int:
+    """Aplica o limite máximo de itens por página"""
+    return max(1, min(limit, settings.max_page_size))
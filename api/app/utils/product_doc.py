@@ -0,0 +1,14 @@
+import orjson
+
+# products.product_doc (migração 0007): o produto já no formato da API,
+# como texto JSON. ::text evita que o driver decodifique o JSON.
+PRODUCT_DOC_COLUMN = "p.product_doc::text AS product_doc"
+
+def product_json(doc: str, **extra) -> orjson.Fragment:
+    """
+    product_doc pronto para ORJSONResponse, com campos extras (confidence,
+    explain...) emendados no fim do objeto sem decodificar o documento
+    """
+    if not extra:
+        return orjson.Fragment(doc)
+    return orjson.Fragment(doc[:doc.rindex("}")] + ", " + orjson.dumps(extra).decode()[1:])
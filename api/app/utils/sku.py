@@ -0,0 +1,60 @@
+import re
+from typing import List
+
+class SKUNormalizer:
+    """Normalizador de SKU para Python backend"""
+    
+    @staticmethod
+    def normalize_sku(input_sku: str) -> List[str]:
+        """Normaliza SKU em diferentes variações"""
+        if not input_sku:
+            return []
+        
+        variations = []
+        clean = input_sku.strip().upper()
+        variations.append(clean)
+        
+        # RV401031 → RV0401.0031
+        if re.match(r'^RV\d{7,8}$', clean):
+            digits = clean[2:]
+            if len(digits) == 7:
+                formatted = f"RV{digits[:4]}.{digits[4:]}"
+                variations.append(formatted)
+                # Com zero à esquerda
+                with_zero = f"RV0{digits[:3]}.{digits[3:]}"
+                variations.append(with_zero)
+            elif len(digits) == 8:
+                formatted = f"RV{digits[:4]}.{digits[4:]}"
+                variations.append(formatted)
+        
+        # Adicionar/remover pontos
+        if '.' in clean:
+            without_dots = clean.replace('.', '')
+            variations.append(without_dots)
+        elif re.match(r'^RV\d{8}$', clean):
+            digits = clean[2:]
+            with_dot = f"RV{digits[:4]}.{digits[4:]}"
+            variations.append(with_dot)
+        
+        return list(set(variations))
+    
+    @staticmethod
+    def levenshtein_distance(s1: str, s2: str) -> int:
+        """Calcula distância de Levenshtein"""
+        if len(s1) < len(s2):
+            return SKUNormalizer.levenshtein_distance(s2, s1)
+        
+        if len(s2) == 0:
+            return len(s1)
+        
+        previous_row = list(range(len(s2) + 1))
+        for i, c1 in enumerate(s1):
+            current_row = [i + 1]
+            for j, c2 in enumerate(s2):
+                insertions = previous_row[j + 1] + 1
+                deletions = current_row[j] + 1
+                substitutions = previous_row[j] + (c1 != c2)
+                current_row.append(min(insertions, deletions, substitutions))
+            previous_row = current_row
+        
+        return previous_row[-1]
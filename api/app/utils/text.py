@@ -29,3 +29,58 @@ def extract_keywords(text: str, min_length: int = 3) -> List[str]:
     words = re.findall(r'\b\w+\b', normalized)
     
     return [word for word in words if len(word) >= min_length and word not in stopwords]
+
+def bounded_edit_distance(a: str, b: str, max_distance: int, transpositions: bool = True) -> int:
+    """
+    Distância de edição (com transposição de letras vizinhas) entre a e b,
+    parando assim que passa de max_distance; nesse caso retorna max_distance + 1.
+    Com transpositions=False é a Levenshtein pura, que é uma métrica
+    (desigualdade triangular) e pode ser usada em BK-tree.
+    """
+    if a == b:
+        return 0
+    too_far = max_distance + 1
+    if abs(len(a) - len(b)) > max_distance:
+        return too_far
+
+    # Início e fim em comum não mudam a distância
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return len(b) if len(b) <= max_distance else too_far
+
+    previous_previous = None
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [too_far] * (len(b) + 1)
+        current[0] = i if i <= max_distance else too_far
+        row_min = current[0]
+        char = a[i - 1]
+        # Fora da faixa diagonal de largura max_distance a distância já estourou
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            value = previous[j - 1] if char == b[j - 1] else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if (transpositions and previous_previous is not None and j > 1 and char == b[j - 2] and a[i - 2] == b[j - 1]
+                    and previous_previous[j - 2] + 1 < value):
+                value = previous_previous[j - 2] + 1
+            if value > too_far:
+                value = too_far
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return too_far
+        previous_previous, previous = previous, current
+
+    return previous[len(b)]
@@ -1,48 +1,48 @@
-from typing import List
+from typing import List, Optional
 from celery import current_task
 
+from app.services.embeddings import sync_embeddings
+from app.services.image_features import process_images as process_image_features
 from app.workers.celery import celery_app
 
 @celery_app.task(bind=True)
-def generate_embeddings(self, product_id: str):
-    """Gera embeddings para busca vetorial de um produto"""
+def generate_embeddings(self, product_id: Optional[str] = None):
+    """
+    Gera embeddings para busca vetorial de um produto, ou de todo o catálogo
+    quando product_id não é informado. Só recalcula o que mudou.
+    """
     try:
-        # Mock implementation - em produção usaria sentence-transformers
-        current_task.update_state(
-            state="PROGRESS",
-            meta={"current": 50, "total": 100, "status": "Gerando embeddings..."}
-        )
+        def report(stats):
+            current_task.update_state(
+                state="PROGRESS",
+                meta={"current": stats["scanned"], "updated": stats["updated"], "status": "Gerando embeddings..."}
+            )
         
-        # Simular processamento
-        import time
-        time.sleep(2)
+        product_ids = [int(product_id)] if product_id is not None else None
+        stats = sync_embeddings(product_ids, progress=report)
         
-        return {"status": "success", "product_id": product_id}
+        return {"status": "success", "product_id": product_id, **stats}
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 @celery_app.task(bind=True)
-def process_images(self, image_paths: List[str]):
-    """Processa imagens para extração de características"""
+def process_images(self, image_paths: Optional[List[str]] = None):
+    """
+    Processa imagens para extração de características (pHash, dHash e
+    descritor de cor/forma). Sem image_paths processa uploads/ e as imagens
+    dos produtos.
+    """
     try:
-        processed = []
-        total = len(image_paths)
-        
-        for i, image_path in enumerate(image_paths):
+        def report(stats):
             current_task.update_state(
                 state="PROGRESS",
-                meta={"current": i+1, "total": total, "status": f"Processando {image_path}..."}
+                meta={**stats, "status": f"Processando imagem {stats['current']} de {stats['total']}..."}
             )
-            
-            # Mock processing
-            processed.append({
-                "path": image_path,
-                "status": "processed",
-                "features": []
-            })
         
-        return {"status": "success", "processed": processed}
+        stats = process_image_features(image_paths, progress=report)
+        
+        return {"status": "success", **stats}
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text
 from app.core.database import get_db
 from app.models.product import Product
+from app.services.search_cache import bump_catalog_version
 
 def import_pricing_data(file_path: str):
     """Versão simplificada e mais robusta do importador"""
@@ -65,6 +66,7 @@ def import_pricing_data(file_path: str):
                 db.rollback()  # Rollback apenas desta operação
                 continue
         
+        bump_catalog_version()
         print("Importação concluída!")
         print(f"Estatísticas:")
         print(f"- Total de linhas: {stats['total_rows']}")
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+from app.services.autocomplete import Autocomplete
+
+PRODUCTS = [
+    # (sku, título, popularidade)
+    ("RV0402.0020", "ALTERNADOR GM 2.4L HYSTER", 5),
+    ("RV0402.0031", "ALTERNADOR TOYOTA 1FZ", 9),
+    ("RV0236.0042", "FILTRO COMBUSTIVEL CLARK", 1),
+    ("RV0236.0001", "FILTRO DE AR MAZDA", 3),
+]
+
+
+def make_autocomplete(products=PRODUCTS, top_k=20, heavy=2):
+    """Snapshot sem banco; a popularidade entra como completeness, sem acessos"""
+    autocomplete = Autocomplete(top_k=top_k, heavy=heavy)
+    autocomplete.build_rows(
+        [
+            SimpleNamespace(id=product_id, sku=sku, title=title, completeness=popularity)
+            for product_id, (sku, title, popularity) in enumerate(products, start=1)
+        ],
+        codes=[],
+        hits={},
+    )
+    return autocomplete
+
+
+def texts(suggestions):
+    return [suggestion["text"] for suggestion in suggestions]
+
+
+def test_code_prefix_ignores_punctuation_and_ranks_by_popularity():
+    autocomplete = make_autocomplete()
+    assert texts(autocomplete.complete("rv0402", limit=2)) == ["RV0402.0031", "RV0402.0020"]
+    assert texts(autocomplete.complete("RV-0402.003", limit=5)) == ["RV0402.0031"]
+
+
+def test_heavy_prefix_uses_precomputed_top_k():
+    autocomplete = make_autocomplete(heavy=2)
+    table = autocomplete._snapshot.codes
+    assert "R" in table.top and "RV0" in table.top
+    assert texts(autocomplete.complete("RV", limit=1)) == ["RV0402.0031"]
+
+
+def test_precomputed_and_scanned_prefixes_agree():
+    precomputed = make_autocomplete(heavy=1)
+    scanned = make_autocomplete(heavy=1000)
+    for query in ("rv", "rv02", "rv0236", "alt", "filtro", "filtro d", "ar"):
+        assert precomputed.complete(query, limit=10) == scanned.complete(query, limit=10)
+
+
+def test_title_and_last_word_completion():
+    autocomplete = make_autocomplete()
+    suggestions = autocomplete.complete("filtro de", limit=10)
+    assert "FILTRO DE AR MAZDA" in texts(suggestions)
+    # Última palavra completada com o começo da query na frente
+    assert "filtro combustivel" in texts(autocomplete.complete("filtro comb", limit=10))
+
+
+def test_suggestion_format():
+    suggestion = make_autocomplete().complete("RV0236.0042", limit=1)[0]
+    assert suggestion == {
+        "text": "RV0236.0042",
+        "type": "partial",
+        "confidence": 1.0,
+        "metadata": {"kind": "sku", "title": "FILTRO COMBUSTIVEL CLARK"},
+    }
+
+
+def test_short_or_unknown_query():
+    autocomplete = make_autocomplete()
+    assert autocomplete.complete("r") == []
+    assert autocomplete.complete("zz") == []
+    assert Autocomplete().complete("rv") == []
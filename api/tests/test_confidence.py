@@ -0,0 +1,187 @@
+import json
+import random
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.database import engine
+from app.services.confidence import (
+    LEVELS, check_search_query, confidence_params, confidence_score_sql, score_batch
+)
+
+WORDS = ["ab", "abc", "AB-12", "filtro", "Filtro de ar", "ar", "x1", "óleo", "bosch", "0986"]
+
+
+def reference_confidence(product, search_query, search_type):
+    """calculate_confidence_score de antes do cálculo em lote (referência)"""
+    score = 0
+    reasons = []
+    search_lower = search_query.lower().strip()
+
+    sku = str(product.get("sku", "")).lower()
+    if search_type == "codigo" or search_type == "CODIGO":
+        if sku == search_lower:
+            score += 45
+            reasons.append("SKU exato")
+        elif search_lower in sku or sku in search_lower:
+            score += 25
+            reasons.append("SKU parcial")
+
+    original_codes = str(product.get("original_codes", "")).lower()
+    if original_codes and search_lower in original_codes:
+        if f" {search_lower} " in f" {original_codes} ":
+            score += 50
+            reasons.append("Código OEM exato")
+        else:
+            score += 35
+            reasons.append("Código OEM parcial")
+
+    title = str(product.get("title", "")).lower()
+    description = str(product.get("description", "")).lower()
+
+    if search_type == "texto" or search_type == "TEXTO":
+        if search_lower == title:
+            score += 40
+            reasons.append("Título exato")
+        elif search_lower in title:
+            if len(search_lower) > 3:
+                score += 25
+                reasons.append("Título contém termo")
+            else:
+                score += 15
+                reasons.append("Termo encontrado no título")
+
+        if search_lower in description:
+            if len(search_lower) > 5:
+                score += 15
+                reasons.append("Descrição contém termo")
+            else:
+                score += 8
+                reasons.append("Termo na descrição")
+
+        if search_lower in sku:
+            score += 20
+            reasons.append("SKU relacionado")
+
+    brand = product.get("brand")
+    if brand:
+        brand_name = brand.lower()
+        if search_lower in brand_name or brand_name in search_lower:
+            score += 12
+            reasons.append("Marca correspondente")
+
+    if product.get("images") and len(product["images"]) > 0:
+        score += 8
+        reasons.append("Tem imagens")
+
+    if description and len(description) > 100:
+        score += 5
+        reasons.append("Descrição detalhada")
+
+    if not title or len(title) < 10:
+        score -= 10
+        reasons.append("Título incompleto")
+
+    level = "alto" if score >= 70 else "medio" if score >= 40 else "baixo"
+    return {"level": level, "score": min(max(score, 0), 100), "reasons": reasons}
+
+
+def random_text(rng, max_words):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, max_words)))
+
+
+def random_products(rng, n):
+    products = []
+    for _ in range(n):
+        description = random_text(rng, 4)
+        if rng.random() < 0.2:
+            description = (description + " ") * 30
+        products.append({
+            "sku": rng.choice(["", "AB-12", "ab", "RV0402.0020", "x1"]),
+            "title": random_text(rng, 3),
+            "description": description,
+            "brand": rng.choice(["", "Bosch", "ab", "Filtro"]),
+            "original_codes": random_text(rng, 3),
+            "image_urls": rng.choice(["", "[]", json.dumps(["a.jpg"])]),
+        })
+    return products
+
+
+def random_queries(rng, n):
+    return [random_text(rng, 2) or "ab" for _ in range(n)] + [" AB-12 ", "Filtro de ar"]
+
+
+def batch(products, q, search_type):
+    return score_batch(
+        q,
+        search_type,
+        skus=[p["sku"] for p in products],
+        titles=[p["title"] for p in products],
+        descriptions=[p["description"] for p in products],
+        brands=[p["brand"] for p in products],
+        original_codes=[p["original_codes"] for p in products],
+        has_images=[p["image_urls"] not in ("", "[]") for p in products],
+    )
+
+
+def reference(product, q, search_type):
+    images = json.loads(product["image_urls"]) if product["image_urls"] else []
+    return reference_confidence({**product, "images": images}, q, search_type)
+
+
+@pytest.mark.parametrize("search_type", ["codigo", "texto", "hibrido", "CODIGO"])
+def test_score_batch_matches_reference(search_type):
+    rng = random.Random(7)
+    products = random_products(rng, 300)
+    for q in random_queries(rng, 40):
+        result = batch(products, q, search_type)
+        for i, product in enumerate(products):
+            assert result.confidence(i) == reference(product, q, search_type), (q, product)
+
+
+def test_empty_sku_is_partial_match_for_codes():
+    products = [{"sku": "", "title": "Filtro de ar", "description": "", "brand": "", "original_codes": "", "image_urls": ""}]
+    assert "SKU parcial" in batch(products, "x1", "codigo").confidence(0)["reasons"]
+
+
+@pytest.mark.parametrize("q", ["", "   ", "\t"])
+def test_blank_query_is_rejected(q):
+    with pytest.raises(HTTPException) as exc:
+        check_search_query(q)
+    assert exc.value.status_code == 400
+    with pytest.raises(ValueError):
+        confidence_params(q)
+    with pytest.raises(ValueError):
+        batch(random_products(random.Random(1), 3), q, "texto")
+
+
+@pytest.fixture(scope="module")
+def connection():
+    try:
+        conn = engine.connect()
+    except SQLAlchemyError:
+        pytest.skip("Postgres indisponível")
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("search_type", ["codigo", "texto", "hibrido"])
+def test_confidence_sql_matches_batch(connection, search_type):
+    rng = random.Random(11)
+    products = random_products(rng, 200)
+    columns = ("sku", "title", "description", "brand", "original_codes", "image_urls")
+    query = text(f"""
+        SELECT {confidence_score_sql(search_type)} AS raw_score
+        FROM unnest({", ".join(f"CAST(:{column} AS TEXT[])" for column in columns)})
+             WITH ORDINALITY AS p({", ".join(columns)}, n)
+        ORDER BY p.n
+    """)
+    arrays = {column: [p[column] for p in products] for column in columns}
+    for q in random_queries(rng, 20):
+        raw_scores = connection.execute(query, {**arrays, **confidence_params(q)}).scalars().all()
+        result = batch(products, q, search_type)
+        for i, raw in enumerate(raw_scores):
+            assert min(max(raw, 0), 100) == result.scores[i], (q, products[i])
+            assert LEVELS[(raw >= 40) + (raw >= 70)] == LEVELS[result.levels[i]]
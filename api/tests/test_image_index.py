@@ -0,0 +1,140 @@
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services.image_features import DESCRIPTOR_SIZE, ImageFeatures, to_signed64
+from app.services.image_index import (
+    CHUNK_BITS, DESCRIPTOR_WEIGHT, DHASH_WEIGHT, PHASH_WEIGHT, ImageIndex, hamming
+)
+
+
+def make_index(images, product_ids=None):
+    """Índice a partir de linhas de image_features; images: [ImageFeatures]"""
+    index = ImageIndex()
+    index.load_rows([
+        SimpleNamespace(
+            product_id=product_id,
+            phash=to_signed64(image.phash),
+            dhash=to_signed64(image.dhash),
+            descriptor=image.descriptor.tolist(),
+        )
+        for image, product_id in zip(images, product_ids or range(len(images)))
+    ])
+    return index
+
+
+def flip(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def random_image(rng):
+    descriptor = np.array([rng.random() for _ in range(DESCRIPTOR_SIZE)], dtype=np.float32)
+    return ImageFeatures(phash=rng.getrandbits(64), dhash=rng.getrandbits(64), descriptor=descriptor / descriptor.sum())
+
+
+def similar_image(rng, image, max_bits):
+    """Outra foto do mesmo objeto: pHash e dHash mudam independentes"""
+    descriptor = image.descriptor + np.array([rng.gauss(0, 0.02) for _ in range(DESCRIPTOR_SIZE)], dtype=np.float32)
+    return ImageFeatures(
+        phash=flip(image.phash, rng.sample(range(64), rng.randint(0, max_bits))),
+        dhash=flip(image.dhash, rng.sample(range(64), rng.randint(0, max_bits))),
+        descriptor=np.clip(descriptor, 0, None),
+    )
+
+
+def brute_force(index, query, limit):
+    """Melhor distância combinada por produto, comparando com todas as imagens"""
+    phash = hamming(index._phash, query.phash) / 64
+    dhash = hamming(index._dhash, query.dhash) / 64
+    descriptor = np.minimum(
+        np.linalg.norm(index._descriptors - query.descriptor, axis=1) / np.sqrt(DESCRIPTOR_SIZE) * 2, 1.0
+    )
+    distance = PHASH_WEIGHT * phash + DHASH_WEIGHT * dhash + DESCRIPTOR_WEIGHT * descriptor
+    best = {}
+    for product_id, value in zip(index._product_ids.tolist(), distance.tolist()):
+        best[product_id] = min(best.get(product_id, value), value)
+    return sorted(best.values())[:limit]
+
+
+def test_hamming():
+    hashes = np.array([0, 1, (1 << 64) - 1], dtype=np.uint64)
+    assert hamming(hashes, 0).tolist() == [0, 1, 64]
+
+
+def test_near_duplicates_are_found():
+    rng = random.Random(1)
+    images = [random_image(rng) for _ in range(500)]
+    index = make_index(images)
+    for bits in (0, 1, 5, 10, 15):
+        target = rng.randrange(len(images))
+        image = images[target]
+        query = ImageFeatures(flip(image.phash, rng.sample(range(64), bits)), image.dhash, image.descriptor)
+        product_id, _, details = index.search(query, limit=1)[0]
+        assert product_id == target
+        assert details["phash_distance"] == bits
+
+
+def test_matches_brute_force():
+    rng = random.Random(2)
+    images = [random_image(rng) for _ in range(300)]
+    # Grupos de imagens parecidas, como fotos do mesmo produto
+    images += [similar_image(rng, images[i], 12) for i in range(100) for _ in range(3)]
+    product_ids = list(range(300)) + [i for i in range(100) for _ in range(3)]
+    index = make_index(images, product_ids)
+    for _ in range(50):
+        query = similar_image(rng, rng.choice(images), 20)
+        for limit in (1, 5, 20):
+            found = [distance for _, distance, _ in index.search(query, limit=limit)]
+            assert found == pytest.approx(brute_force(index, query, limit))
+
+
+def test_ranking_uses_combined_distance():
+    rng = random.Random(3)
+    query = random_image(rng)
+    # Mais perto no pHash, mas dHash e descritor opostos
+    decoy = ImageFeatures(
+        flip(query.phash, range(4)),
+        query.dhash ^ ((1 << 64) - 1),
+        np.full(DESCRIPTOR_SIZE, 1.0, dtype=np.float32),
+    )
+    # 10 bits trocados em cada bloco do pHash, o resto igual
+    match = ImageFeatures(
+        flip(query.phash, [bit for bit in range(64) if bit % CHUNK_BITS < 10]),
+        query.dhash,
+        query.descriptor,
+    )
+    index = make_index([random_image(rng) for _ in range(50)] + [decoy, match])
+    results = index.search(query, limit=1)
+    assert results[0][0] == 51
+    assert [distance for _, distance, _ in results] == pytest.approx(brute_force(index, query, 1))
+
+
+def test_far_queries_widen_the_radius():
+    rng = random.Random(4)
+    images = [random_image(rng) for _ in range(50)]
+    index = make_index(images)
+    # 10 bits trocados em cada bloco: nenhum bloco fica a até 3 bits do original
+    query = ImageFeatures(
+        flip(images[7].phash, [bit for bit in range(64) if bit % CHUNK_BITS < 10]),
+        images[7].dhash,
+        images[7].descriptor,
+    )
+    found = [distance for _, distance, _ in index.search(query, limit=3)]
+    assert found == pytest.approx(brute_force(index, query, 3))
+
+
+def test_one_result_per_product():
+    descriptor = np.zeros(DESCRIPTOR_SIZE, dtype=np.float32)
+    images = [ImageFeatures(value, value, descriptor) for value in (0, 1, 3, (1 << 64) - 1)]
+    index = make_index(images, product_ids=[10, 10, 11, 12])
+    results = index.search(images[0], limit=3)
+    assert [product_id for product_id, _, _ in results] == [10, 11, 12]
+    assert results[0][1] == 0.0
+
+
+def test_empty_index():
+    assert ImageIndex().search(random_image(random.Random(5))) == []
@@ -0,0 +1,40 @@
+import base64
+
+import pytest
+
+from app.core.config import settings
+from app.utils.pagination import clamp_limit, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    for last_id in (0, 1, 42, 2_147_483_647, 10 ** 15):
+        cursor = encode_cursor(last_id)
+        assert "=" not in cursor
+        assert decode_cursor(cursor) == last_id
+
+
+def test_tampered_cursor_is_rejected():
+    payload = base64.urlsafe_b64decode(encode_cursor(41) + "==").decode()
+    _, signature = payload.split(".")
+    forged = base64.urlsafe_b64encode(f"42.{signature}".encode()).decode().rstrip("=")
+    with pytest.raises(ValueError):
+        decode_cursor(forged)
+
+
+@pytest.mark.parametrize("cursor", ["", "abc", "!!!", base64.urlsafe_b64encode(b"42").decode()])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_cursor_depends_on_secret_key(monkeypatch):
+    cursor = encode_cursor(7)
+    monkeypatch.setattr(settings, "secret_key", settings.secret_key + "-other")
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_clamp_limit():
+    assert clamp_limit(0) == 1
+    assert clamp_limit(20) == 20
+    assert clamp_limit(10 ** 9) == settings.max_page_size
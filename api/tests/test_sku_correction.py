@@ -0,0 +1,65 @@
+import random
+from types import SimpleNamespace
+
+from app.services.sku_correction import SkuCorrector
+from app.utils.text import bounded_edit_distance, normalize_code
+
+
+def make_corrector(skus, max_distance=3):
+    """Árvore de um produto por SKU, ids a partir de 1"""
+    corrector = SkuCorrector(max_distance=max_distance)
+    corrector.load_rows([SimpleNamespace(id=product_id, sku=sku) for product_id, sku in enumerate(skus, start=1)])
+    return corrector
+
+
+def brute_force(corrector, query, max_distance):
+    key = normalize_code(query)
+    return sorted(
+        (distance, sku)
+        for node_key, products in corrector._skus.items()
+        for sku in set(products.values())
+        if 0 < (distance := bounded_edit_distance(key, node_key, max_distance, transpositions=False)) <= max_distance
+    )
+
+
+def test_finds_closest_skus_first():
+    corrector = make_corrector(["RV0402.0020", "RV0401.0020", "RV0236.0042", "XX9999"])
+    assert corrector.lookup("RV0402.0021", limit=2) == [("RV0402.0020", 1), ("RV0401.0020", 2)]
+    # Só pontuação diferente: mesma chave normalizada, distância 0 não é correção
+    assert corrector.lookup("RV-0402-0020", limit=1) == [("RV0401.0020", 1)]
+
+
+def test_matches_brute_force_on_random_catalog():
+    rng = random.Random(7)
+    skus = {f"RV{rng.randint(0, 9999):04d}.{rng.randint(0, 99):04d}" for _ in range(400)}
+    corrector = make_corrector(sorted(skus))
+    for _ in range(40):
+        query = f"RV{rng.randint(0, 9999):04d}.{rng.randint(0, 99):04d}"
+        for max_distance in (1, 2, 3):
+            expected = brute_force(corrector, query, max_distance)
+            found = corrector.lookup(query, max_distance=max_distance, limit=len(skus))
+            assert sorted((distance, sku) for sku, distance in found) == expected
+
+
+def test_limit_keeps_the_nearest():
+    rng = random.Random(11)
+    skus = sorted({f"AB{rng.randint(0, 999):03d}" for _ in range(200)})
+    corrector = make_corrector(skus)
+    for query in ("AB123", "AB999", "AB0"):
+        expected = brute_force(corrector, query, 3)
+        found = corrector.lookup(query, limit=3)
+        assert len(found) == min(3, len(expected))
+        # Mesmas distâncias que os 3 melhores da força bruta (empates podem trocar de SKU)
+        assert [distance for _, distance in found] == [distance for distance, _ in expected[:3]]
+
+
+def test_removed_sku_stays_only_as_path():
+    corrector = make_corrector(["ABC100", "ABC101", "ABC200"])
+    key = corrector._product_keys.pop(2)
+    del corrector._skus[key]
+    assert corrector.lookup("ABC102", limit=5) == [("ABC100", 1), ("ABC200", 2)]
+
+
+def test_not_ready_or_empty_query():
+    assert SkuCorrector().lookup("RV0402") == []
+    assert make_corrector(["RV0402"]).lookup("---") == []
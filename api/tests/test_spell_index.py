@@ -0,0 +1,88 @@
+import random
+from types import SimpleNamespace
+
+from app.services.spell_index import SpellIndex, deletes
+from app.utils.text import bounded_edit_distance
+
+
+def edit_distance(a, b, transpositions=True):
+    """Referência: matriz completa (OSA com transpositions, Levenshtein sem)"""
+    rows = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a) + 1):
+        rows[i][0] = i
+    for j in range(len(b) + 1):
+        rows[0][j] = j
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            rows[i][j] = min(rows[i - 1][j] + 1, rows[i][j - 1] + 1, rows[i - 1][j - 1] + cost)
+            if transpositions and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                rows[i][j] = min(rows[i][j], rows[i - 2][j - 2] + 1)
+    return rows[len(a)][len(b)]
+
+
+def make_index(terms, max_distance=2, prefix_length=7):
+    """Dicionário de um produto por palavra, com a palavra repetida count vezes no título"""
+    index = SpellIndex(max_distance=max_distance, prefix_length=prefix_length)
+    index.load_rows([
+        SimpleNamespace(id=i, title=" ".join([term] * count), description=None)
+        for i, (term, count) in enumerate(terms.items())
+    ])
+    return index
+
+
+def test_bounded_edit_distance_matches_brute_force():
+    rng = random.Random(3)
+    for _ in range(2000):
+        a = "".join(rng.choice("abc") for _ in range(rng.randint(0, 7)))
+        b = "".join(rng.choice("abc") for _ in range(rng.randint(0, 7)))
+        for transpositions in (True, False):
+            expected = edit_distance(a, b, transpositions)
+            for max_distance in range(5):
+                assert bounded_edit_distance(a, b, max_distance, transpositions) == min(expected, max_distance + 1)
+
+
+def test_transposition_counts_once():
+    assert bounded_edit_distance("filtro", "fitlro", 2) == 1
+    assert bounded_edit_distance("filtro", "fitlro", 2, transpositions=False) == 2
+
+
+def test_deletes_of_prefix():
+    assert deletes("abc", 1, 7) == {"abc", "bc", "ac", "ab"}
+    assert deletes("alternador", 1, 3) == {"alt", "lt", "at", "al"}
+
+
+def test_lookup_matches_brute_force():
+    rng = random.Random(5)
+    vocabulary = {"".join(rng.choice("abcde") for _ in range(rng.randint(3, 9))): rng.randint(1, 50) for _ in range(300)}
+    index = make_index(vocabulary, prefix_length=20)
+    for _ in range(200):
+        word = "".join(rng.choice("abcde") for _ in range(rng.randint(3, 9)))
+        max_distance = 1 if len(word) <= 4 else 2
+        candidates = [
+            (edit_distance(word, term), -count, term)
+            for term, count in vocabulary.items()
+            if edit_distance(word, term) <= max_distance
+        ]
+        found = index.lookup(word)
+        if not candidates:
+            assert found is None
+            continue
+        distance, negative_count, _ = min(candidates)
+        # Mesma distância e frequência que o melhor da força bruta (empates podem trocar de palavra)
+        assert found is not None and (found[1], -found[2]) == (distance, negative_count)
+
+
+def test_correct_query():
+    index = make_index({"alternador": 40, "filtro": 30, "combustivel": 10, "cabo": 5})
+    assert index.correct("altenador") == "alternador"
+    assert index.correct("Filtro de combustivl 12V") == "filtro de combustivel 12v"
+    assert index.correct("filtro alternador") is None
+
+
+def test_refresh_removes_unindexed_terms():
+    index = make_index({"alternador": 1, "alternadores": 1})
+    index._terms.pop("alternador")
+    index._unindex_term("alternador")
+    assert index.lookup("alternadr") is None
+    assert index.lookup("alternadore")[0] == "alternadores"
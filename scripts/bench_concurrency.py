@@ -0,0 +1,72 @@
+# scripts/bench_concurrency.py
+# Execute: python scripts/bench_concurrency.py [--url http://localhost:8000] [--requests 200]
+#
+# Mede throughput e latência de endpoints de busca com 1, 2, 4, 8, 16 e 32
+# requisições simultâneas. Com o banco assíncrono o throughput deve crescer
+# com a concorrência em vez de ficar parado no de uma requisição por vez.
+# Rode com SEARCH_CACHE_ENABLED=false na API para medir o banco e não o Redis.
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+QUERIES = [
+    ("/api/v1/search/search", {"q": "filtro", "type": "texto"}),
+    ("/api/v1/search/search", {"q": "filtro de ar", "type": "texto"}),
+    ("/api/v1/search/search", {"q": "RV0402", "type": "codigo"}),
+    ("/api/v1/search/normalized", {"q": "alternador", "type": "texto"}),
+    ("/api/v1/suggestions/suggestions", {"q": "RV04"}),
+]
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, total: int) -> dict:
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            path, params = QUERIES[i % len(QUERIES)]
+            started = time.perf_counter()
+            try:
+                response = await client.get(path, params=params)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "rps": total / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "errors": errors,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--levels", default="1,2,4,8,16,32")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=64, max_keepalive_connections=64)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as client:
+        # Aquecimento (pool de conexões, índices em memória)
+        await run_level(client, 4, 20)
+
+        print(f"{'concorrência':>12} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'erros':>6}")
+        for level in (int(value) for value in args.levels.split(",")):
+            result = await run_level(client, level, args.requests)
+            print(f"{result['concurrency']:>12} {result['rps']:>8.1f} {result['p50']:>8.1f} {result['p95']:>8.1f} {result['errors']:>6}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -11,12 +11,12 @@ CREATE EXTENSION IF NOT EXISTS unaccent;
 
 -- Function to normalize codes (remove hyphens, spaces, etc.)
 CREATE OR REPLACE FUNCTION normalize_code(input_code TEXT)
-RETURNS TEXT AS \$\$
+RETURNS TEXT AS $$
 BEGIN
     -- Remove hyphens, spaces, dots and convert to uppercase
-    RETURN REGEXP_REPLACE(UPPER(COALESCE(input_code, '')), '[-\\s\\.]', '', 'g');
+    RETURN REGEXP_REPLACE(UPPER(COALESCE(input_code, '')), '[-\s\.]', '', 'g');
 END;
-\$\$ LANGUAGE plpgsql IMMUTABLE;
+$$ LANGUAGE plpgsql IMMUTABLE;
 
 -- Create some basic configuration data
 INSERT INTO brands (id, name, active, created_at) VALUES